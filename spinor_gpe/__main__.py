@@ -0,0 +1,138 @@
+"""Command-line interface of the spinor_gpe package.
+
+Usage, e.g.::
+
+    python -m spinor_gpe bench --cases fft step --grids 64x64 256x256 \\
+        --devices cpu --threads 1 4 --output bench.json
+    python -m spinor_gpe bench-fit bench_data/
+    python -m spinor_gpe bench-compare bench.json --baseline baseline.json
+    python -m spinor_gpe watch telemetry/ udp://:9999
+
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+
+from spinor_gpe.pspinor import bench_tools as btools
+from spinor_gpe.pspinor import bench_analysis_tools as batools
+from spinor_gpe.pspinor import telemetry_tools as tmtools
+
+
+def parse_grid(text):
+    """Parse a mesh grid size of the form 'NXxNY', or 'N' for a square."""
+    sizes = [int(n) for n in text.lower().split('x')]
+    if len(sizes) == 1:
+        sizes *= 2
+    if len(sizes) != 2:
+        raise argparse.ArgumentTypeError(f"Invalid grid size `{text}`.")
+    return tuple(sizes)
+
+
+def bench(args):
+    """Run the `bench` subcommand."""
+    report = btools.run_suite(args.cases, args.grids, args.devices,
+                              args.precisions, args.threads,
+                              verbose=not args.quiet)
+    output = args.output
+    if output is None:
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        output = f"bench_{socket.gethostname()}_{stamp}.json"
+    btools.save_results(report, output)
+    print(f"Benchmark results saved to {os.path.abspath(output)}")
+
+
+def bench_fit(args):
+    """Run the `bench-fit` subcommand."""
+    table = batools.load_table(*args.files)
+    fits = batools.fit_scaling(table, args.case)
+    print(batools.format_fits(fits))
+    if args.plot:
+        fig, _ = batools.plot_scaling(table, fits, args.case)
+        fig.savefig(args.plot, bbox_inches='tight')
+
+
+def bench_compare(args):
+    """Run the `bench-compare` subcommand; fails if there are regressions."""
+    rows = batools.compare(batools.load_table(*args.files),
+                           batools.load_table(*args.baseline), args.case,
+                           args.threshold, args.min_change)
+    print(batools.format_comparison(rows))
+    if args.plot:
+        fig, _ = batools.plot_comparison(rows)
+        fig.savefig(args.plot, bbox_inches='tight')
+    return int(any(row['status'] == 'regression' for row in rows))
+
+
+def watch(args):
+    """Run the `watch` subcommand."""
+    tmtools.watch(args.sources, args.interval, args.once)
+
+
+def main(argv=None):
+    """Entry point of the command-line interface."""
+    parser = argparse.ArgumentParser(prog='python -m spinor_gpe')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    bench_parser = commands.add_parser(
+        'bench', help="Benchmark the core operations and write JSON results.")
+    bench_parser.add_argument('--cases', nargs='+', choices=list(btools.CASES),
+                              default=None, help="Default: all cases.")
+    bench_parser.add_argument('--grids', nargs='+', type=parse_grid,
+                              default=None,
+                              help="Mesh grid sizes, e.g. 64x64 or 128. "
+                              "Default: 64 to 512.")
+    bench_parser.add_argument('--devices', nargs='+', default=None,
+                              help="Default: cpu, and cuda if available.")
+    bench_parser.add_argument('--precisions', nargs='+',
+                              choices=['double', 'single'], default=None,
+                              help="Default: double.")
+    bench_parser.add_argument('--threads', nargs='+', type=int, default=None,
+                              help="CPU thread counts. Default: current.")
+    bench_parser.add_argument('--output', '-o', default=None,
+                              help="Output JSON file.")
+    bench_parser.add_argument('--quiet', '-q', action='store_true')
+    bench_parser.set_defaults(func=bench)
+
+    fit_parser = commands.add_parser(
+        'bench-fit', help="Fit the scaling of benchmark times with grid size.")
+    fit_parser.add_argument('files', nargs='+',
+                            help="Result files, directories or patterns.")
+    fit_parser.add_argument('--case', default='step')
+    fit_parser.add_argument('--plot', default=None,
+                            help="Save a scaling plot to this file.")
+    fit_parser.set_defaults(func=bench_fit)
+
+    compare_parser = commands.add_parser(
+        'bench-compare', help="Flag regressions against a baseline run.")
+    compare_parser.add_argument('files', nargs='+',
+                                help="Result files of the run to check.")
+    compare_parser.add_argument('--baseline', nargs='+', required=True,
+                                help="Result files of the baseline run.")
+    compare_parser.add_argument('--case', default='step')
+    compare_parser.add_argument('--threshold', type=float, default=3.0,
+                                help="Significance threshold [MAD].")
+    compare_parser.add_argument('--min-change', type=float, default=0.05,
+                                help="Minimum relative change flagged.")
+    compare_parser.add_argument('--plot', default=None,
+                                help="Save a comparison plot to this file.")
+    compare_parser.set_defaults(func=bench_compare)
+
+    watch_parser = commands.add_parser(
+        'watch', help="Show the live telemetry of running propagations.")
+    watch_parser.add_argument('sources', nargs='+',
+                              help="Telemetry JSONL files, directories or "
+                              "patterns, or udp://host:port to listen on.")
+    watch_parser.add_argument('--interval', type=float, default=1.0,
+                              help="Refresh interval [s].")
+    watch_parser.add_argument('--once', action='store_true',
+                              help="Print the table once and exit.")
+    watch_parser.set_defaults(func=watch)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
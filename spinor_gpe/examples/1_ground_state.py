@@ -128,7 +128,8 @@ ps = spin.PSpinor(DATA_PATH, overwrite=True,  # Initialize PSpinor object
                   g_sc=G_SC,
                   pop_frac=(0.5, 0.5),
                   r_sizes=(8, 8),
-                  mesh_points=(64, 64))
+                  mesh_points=(64, 64),
+                  save_tf=True)
 
 ps.coupling_setup(wavel=790.1e-9, kin_shift=False)
 
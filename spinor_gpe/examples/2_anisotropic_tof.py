@@ -138,7 +138,8 @@ ps = spin.PSpinor(DATA_PATH, overwrite=True,
                   phase_factor=1,  # Complex unit phase factor on down spin
                   pop_frac=(0.5, 0.5),
                   r_sizes=(32, 32),
-                  mesh_points=(512, 512))
+                  mesh_points=(512, 512),
+                  save_tf=True)
 
 ps.coupling_setup(wavel=790.1e-9)
 
@@ -139,7 +139,8 @@ ps = spin.PSpinor(DATA_PATH, overwrite=True,
                   g_sc=G_SC,
                   pop_frac=POP_FRAC,
                   r_sizes=(16, 16),
-                  mesh_points=(256, 256))
+                  mesh_points=(256, 256),
+                  save_tf=True)
 
 ps.coupling_setup(wavel=790.1e-9, kin_shift=True)
 
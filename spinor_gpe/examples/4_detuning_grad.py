@@ -130,7 +130,8 @@ ps = spin.PSpinor(DATA_PATH, overwrite=True,  # Initialize PSpinor object
                   g_sc=G_SC,
                   pop_frac=(0.5, 0.5),
                   r_sizes=(16, 16),
-                  mesh_points=(256, 256))
+                  mesh_points=(256, 256),
+                  save_tf=True)
 
 ps.coupling_setup(wavel=804e-9, kin_shift=True)
 
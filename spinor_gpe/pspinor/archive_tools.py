@@ -0,0 +1,192 @@
+"""archive_tools.py module.
+
+Tools for reading the sampled-wavefunction archives written during
+propagation, i.e. the `trial_data/psik_sampled%s_`folder_name`.npz files.
+
+Archives of the full momentum-space wavefunction store it as 'psiks'.
+Archives of reduced samples (see ``sampling_tools.Sampler``) store them as
+'samples', along with their 'space', 'quantity', 'extent' and 'decimate'.
+Archives compressed by ``pod_tools.compress`` store either as a POD basis
+and per-frame coefficients; their frames are reconstructed on reading.
+
+"""
+import zipfile
+
+import numpy as np
+
+
+def sample_key(path):
+    """Get the name of the sampled array in an archive, 'psiks' or 'samples'.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive.
+
+    """
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+    if 'pod_key.npy' in names:
+        with np.load(path) as archive:
+            return str(archive['pod_key'])
+    return 'psiks' if 'psiks.npy' in names else 'samples'
+
+
+def is_compressed(path):
+    """Check whether an archive is compressed to a POD basis.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive.
+
+    """
+    with zipfile.ZipFile(path) as archive:
+        return 'pod_basis.npy' in archive.namelist()
+
+
+def sample_info(path):
+    """Get the description of the samples in an archive.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive.
+
+    Returns
+    -------
+    info : :obj:`dict`
+        The sampled 'space' ('r' or 'k') and 'quantity' ('field', 'dens' or
+        'phase'), and, for reduced samples, the 'extent' of the sampled
+        window and the 'decimate' factors along the (y, x) grid axes.
+
+    """
+    if sample_key(path) == 'psiks':
+        return {'space': 'k', 'quantity': 'field'}
+    with np.load(path) as archive:
+        return {key: archive[key][()]
+                for key in ['space', 'quantity', 'extent', 'decimate']}
+
+
+def sample_shape(path, key='psiks'):
+    """Get the shape of the sampled array stored in an archive.
+
+    Only the header of the array is read.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive.
+    key : :obj:`str`, default='psiks'
+        The name of the sampled array inside the archive.
+
+    Returns
+    -------
+    shape : :obj:`tuple` of :obj:`int`
+        The shape of the sampled array; the first axis indexes the frames.
+
+    """
+    if is_compressed(path):
+        n_frames = _member_shape(path, 'pod_coeffs')[0]
+        return (n_frames, *_member_shape(path, 'pod_basis')[1:])
+    return _member_shape(path, key)
+
+
+def sample_count(path, key='psiks'):
+    """Get the number of frames stored in a sampled archive.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive.
+    key : :obj:`str`, default='psiks'
+        The name of the sampled array inside the archive.
+
+    Returns
+    -------
+    n_frames : :obj:`int`
+        The length of the first axis of the sampled array.
+
+    """
+    return sample_shape(path, key)[0]
+
+
+def iter_samples(path, key='psiks', start=0, stop=None):
+    """Iterate over the frames of a sampled archive, one frame at a time.
+
+    Only a single frame is held in memory at any time, so arbitrarily long
+    archives can be processed. The archive members are read sequentially
+    from the zip file; this works for both :func:`numpy.savez` and
+    :func:`numpy.savez_compressed` archives. The frames of a POD-compressed
+    archive are reconstructed from its basis, which is held in memory.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive.
+    key : :obj:`str`, default='psiks'
+        The name of the sampled array inside the archive.
+    start : :obj:`int`, default=0
+        Index of the first frame to yield.
+    stop : :obj:`int`, optional
+        Index one past the last frame to yield. Defaults to all frames.
+
+    Yields
+    ------
+    frame : NumPy :obj:`array`
+        A single sampled frame, e.g. the list-like (2, Ny, Nx) array of the
+        momentum-space wavefunction components.
+
+    """
+    if is_compressed(path):
+        yield from _iter_reconstructed(path, start, stop)
+        return
+    with zipfile.ZipFile(path) as archive:
+        with archive.open(key + '.npy') as fobj:
+            shape, dtype = _read_header(fobj)
+            if stop is None:
+                stop = shape[0]
+            frame_shape = shape[1:]
+            n_bytes = int(np.prod(frame_shape)) * dtype.itemsize
+            if start > 0:
+                fobj.seek(fobj.tell() + start * n_bytes)
+            for _ in range(start, min(stop, shape[0])):
+                buffer = fobj.read(n_bytes)
+                yield np.frombuffer(buffer, dtype=dtype).reshape(frame_shape)
+
+
+def _member_shape(path, key):
+    """Read the shape of an array in an archive from its header."""
+    with zipfile.ZipFile(path) as archive:
+        with archive.open(key + '.npy') as fobj:
+            shape, _ = _read_header(fobj)
+    return shape
+
+
+def _iter_reconstructed(path, start=0, stop=None):
+    """Iterate over the reconstructed frames of a POD-compressed archive."""
+    with np.load(path) as archive:
+        basis = archive['pod_basis']
+        coeffs = archive['pod_coeffs'][start:stop]
+    for coeff in coeffs:
+        yield np.tensordot(coeff, basis, axes=1)
+
+
+def _read_header(fobj):
+    """Read the .npy header of an open archive member.
+
+    Returns
+    -------
+    shape : :obj:`tuple` of :obj:`int`
+        The shape of the stored array.
+    dtype : NumPy :obj:`dtype`
+        The data type of the stored array.
+
+    """
+    version = np.lib.format.read_magic(fobj)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(fobj)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(fobj)
+    assert not fortran, "Fortran-ordered sampled arrays are not supported."
+    return shape, dtype
@@ -0,0 +1,362 @@
+"""bench_analysis_tools.py module.
+
+Analysis of benchmark results: ingestion of any number of result files into
+one table, fits of the scaling of the execution time with the grid size, and
+detection of performance regressions against a baseline run.
+
+A table is a :obj:`dict` of equal-length NumPy arrays, one per column of
+`COLUMNS`, with one row per successful measurement.
+
+"""
+import glob
+import os
+
+import numpy as np
+from matplotlib import pyplot as plt
+from scipy.optimize import curve_fit
+
+from spinor_gpe.pspinor import bench_tools as btools
+
+#: The columns of a benchmark table.
+COLUMNS = ['source', 'hostname', 'revision', 'timestamp', 'case', 'device',
+           'precision', 'threads', 'nx', 'ny', 'points', 'median', 'mad',
+           'min', 'n_repeats']
+
+#: The columns that identify a measurement, e.g. to match it to a baseline.
+KEYS = ['case', 'device', 'precision', 'threads', 'nx', 'ny', 'points']
+
+#: The columns that identify a scaling series of a single machine.
+SERIES = ['hostname', 'device', 'precision', 'threads']
+
+
+def power(x, a, b):
+    """Power model - used in fitting."""
+    return a * x**b
+
+
+def line(x, a, b):
+    """Linear model - used in fitting."""
+    return a * x + b
+
+
+def _json_rows(file_name):
+    """Table rows of a report saved with ``bench_tools.save_results``."""
+    report = btools.load_results(file_name)
+    env = report['environment']
+    rows = []
+    for rec in report['results']:
+        if rec['status'] != 'ok':
+            continue
+        rows.append({'source': file_name, 'hostname': env['hostname'],
+                     'revision': env.get('git_revision') or '',
+                     'timestamp': env['timestamp'], 'case': rec['case'],
+                     'device': rec['device'], 'precision': rec['precision'],
+                     'threads': rec['threads'], 'nx': rec['grid'][0],
+                     'ny': rec['grid'][1], 'points': rec['points'],
+                     'median': rec['median'], 'mad': rec['mad'],
+                     'min': rec['min'], 'n_repeats': rec['n_repeats']})
+    return rows
+
+
+def _npz_rows(file_name):
+    """Table rows of a legacy `computer_device[_case].npz` result file.
+
+    These files store the log2 of the number of grid points, but not the
+    grid shape, so 'nx' and 'ny' are set to 0.
+
+    """
+    with np.load(file_name) as data:
+        computer, device = str(data['computer']), str(data['device'])
+        size, n_repeats = data['size'], data['n_repeats']
+        med, med_ab_dev = data['med'], data['mad']
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    case = stem[len(f'{computer}_{device}'):].strip('_').rstrip('0123456789')
+    rows = []
+    for log_n, n_rep, median, dev in zip(size, n_repeats, med, med_ab_dev):
+        if median == 0:  # Unfilled entries of an interrupted sweep
+            continue
+        rows.append({'source': file_name, 'hostname': computer,
+                     'revision': '', 'timestamp': '',
+                     'case': case or 'step', 'device': device,
+                     'precision': 'double', 'threads': 0, 'nx': 0, 'ny': 0,
+                     'points': int(round(2**log_n)), 'median': median,
+                     'mad': dev, 'min': np.nan, 'n_repeats': int(n_rep)})
+    return rows
+
+
+def load_table(*paths):
+    """Ingest benchmark result files into a single table.
+
+    Parameters
+    ----------
+    *paths : :obj:`str`
+        Result files, directories (all the .json and .npz files within), or
+        glob patterns. Both the JSON reports of ``bench_tools.save_results``
+        and the legacy .npz files of the original benchmark scripts are read.
+
+    Returns
+    -------
+    table : :obj:`dict` of NumPy :obj:`array`
+        The combined table; see `COLUMNS`.
+
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, '*.json'))
+                            + glob.glob(os.path.join(path, '*.npz')))
+        else:
+            files += sorted(glob.glob(path)) or [path]
+
+    rows = []
+    for file_name in files:
+        if file_name.endswith('.npz'):
+            rows += _npz_rows(file_name)
+        else:
+            rows += _json_rows(file_name)
+    return _to_table(rows)
+
+
+def _to_table(rows):
+    """Convert a :obj:`list` of row :obj:`dict` into a table."""
+    table = {col: np.array([row[col] for row in rows]) for col in COLUMNS}
+    for col in ['threads', 'nx', 'ny', 'points', 'n_repeats']:
+        table[col] = table[col].astype(int)
+    for col in ['median', 'mad', 'min']:
+        table[col] = table[col].astype(float)
+    return table
+
+
+def select(table, **criteria):
+    """Select the rows of `table` matching all of the column `criteria`.
+
+    For example, ``select(table, case='step', device='cuda')``.
+
+    """
+    mask = np.ones(len(table['case']), dtype=bool)
+    for col, val in criteria.items():
+        mask &= table[col] == val
+    return {col: vals[mask] for col, vals in table.items()}
+
+
+def _groups(table, cols):
+    """Iterate over the (key, sub-table) groups of unique values of `cols`."""
+    keys = sorted({tuple(v.item() for v in row)
+                   for row in zip(*[table[c] for c in cols])})
+    for key in keys:
+        yield key, select(table, **dict(zip(cols, key)))
+
+
+def latest(table, cols=None):
+    """Keep only the most recent measurement of every combination of `cols`.
+
+    By default, `cols` are the `KEYS` and the 'hostname'.
+
+    """
+    cols = KEYS + ['hostname'] if cols is None else cols
+    order = np.argsort(table['timestamp'], kind='stable')[::-1]
+    _, first = np.unique(np.stack([table[k][order].astype(str)
+                                   for k in cols], axis=1),
+                         axis=0, return_index=True)
+    idx = np.sort(order[first]) if len(order) else order
+    return {col: vals[idx] for col, vals in table.items()}
+
+
+def fit_scaling(table, case='step'):
+    """Fit the scaling of the execution time with the number of grid points.
+
+    For every machine, device, precision and thread count, the median
+    times are fit, weighted by their MAD, to a power law ``a * N**b`` and to
+    a line ``a * N + b``, where N is the number of grid points. Typically,
+    CPU times follow a power law with b slightly above 1, while GPU times
+    are linear once the device is saturated.
+
+    Parameters
+    ----------
+    table : :obj:`dict` of NumPy :obj:`array`
+        The benchmark table.
+    case : :obj:`str`, default='step'
+        The benchmark case to fit.
+
+    Returns
+    -------
+    fits : :obj:`list` of :obj:`dict`
+        The `SERIES` keys of every fit series, along with 'case',
+        'n_points', the fitted parameters 'power' (a, b) and 'line' (a, b),
+        and their standard errors 'power_err' and 'line_err'. Series with
+        fewer than three grid sizes are not fit.
+
+    """
+    fits = []
+    for key, series in _groups(latest(select(table, case=case)), SERIES):
+        if len(np.unique(series['points'])) < 3:
+            continue
+        n_pts, med = series['points'].astype(float), series['median']
+        sigma = series['mad'] if np.all(series['mad'] > 0) else None
+
+        slope, offset = np.polyfit(np.log(n_pts), np.log(med), 1)
+        p_pow, c_pow = curve_fit(power, n_pts, med, sigma=sigma,
+                                 p0=(np.exp(offset), slope), maxfev=10000)
+        p_lin, c_lin = curve_fit(line, n_pts, med, sigma=sigma)
+        fits.append(dict(zip(SERIES, key), case=case,
+                         n_points=len(n_pts),
+                         power=p_pow.tolist(),
+                         power_err=np.sqrt(np.diag(c_pow)).tolist(),
+                         line=p_lin.tolist(),
+                         line_err=np.sqrt(np.diag(c_lin)).tolist()))
+    return fits
+
+
+def compare(run, baseline, case='step', threshold=3.0, min_change=0.05):
+    """Compare the time per grid point of a run against a baseline.
+
+    The measurements are matched by `KEYS`, using the latest measurement of
+    each. A change is significant if the difference of the medians exceeds
+    `threshold` times the combined MAD of the single-call times, and the
+    relative change exceeds `min_change`. Using the spread of the single
+    calls, rather than the much smaller standard error of the median, keeps
+    the comparison robust to the run-to-run noise of a shared machine.
+
+    Parameters
+    ----------
+    run : :obj:`dict` of NumPy :obj:`array`
+        The benchmark table of the run to check.
+    baseline : :obj:`dict` of NumPy :obj:`array`
+        The benchmark table of the reference run.
+    case : :obj:`str`, default='step'
+        The benchmark case to compare.
+    threshold : :obj:`float`, default=3.0
+        The significance threshold, in units of the combined MAD.
+    min_change : :obj:`float`, default=0.05
+        The minimum relative change considered significant.
+
+    Returns
+    -------
+    rows : :obj:`list` of :obj:`dict`
+        For every matched measurement, its `KEYS`, the
+        baseline and run times per grid point 'base' and 'new' [s], their
+        'ratio', the significance 'z', and the 'status' {'regression',
+        'improvement', 'ok'}.
+
+    """
+    base = latest(select(baseline, case=case), KEYS)
+    base_idx = {tuple(row): i for i, row in
+                enumerate(zip(*[base[k] for k in KEYS]))}
+    new = latest(select(run, case=case), KEYS)
+
+    rows = []
+    for i, key in enumerate(zip(*[new[k] for k in KEYS])):
+        if key not in base_idx:
+            continue
+        j = base_idx[key]
+        diff = new['median'][i] - base['median'][j]
+        sigma = np.hypot(new['mad'][i], base['mad'][j])
+        z_val = diff / sigma if sigma > 0 else np.sign(diff) * np.inf
+        ratio = new['median'][i] / base['median'][j]
+        if z_val > threshold and ratio - 1 > min_change:
+            status = 'regression'
+        elif z_val < -threshold and 1 - ratio > min_change:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append(dict(zip(KEYS, [k.item() for k in key]),
+                         base=base['median'][j] / key[-1],
+                         new=new['median'][i] / key[-1],
+                         ratio=ratio, z=z_val, status=status))
+    return sorted(rows, key=lambda r: (r['device'], r['precision'],
+                                       r['threads'], r['points']))
+
+
+def format_fits(fits):
+    """Format the results of `fit_scaling` as a text table."""
+    lines = [f"{'series':<36}{'n':>4}{'a [s]':>12}{'b':>14}"
+             f"{'slope [ns/pt]':>16}"]
+    for fit in fits:
+        name = (f"{fit['hostname']}/{fit['device']}/{fit['precision']}/"
+                f"{fit['threads']}")
+        lines.append(f"{name:<36}{fit['n_points']:>4}"
+                     f"{fit['power'][0]:>12.3e}"
+                     f"{fit['power'][1]:>7.3f}+-{fit['power_err'][1]:<5.3f}"
+                     f"{fit['line'][0] * 1e9:>16.3f}")
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    """Format the results of `compare` as a text table."""
+    lines = [f"{'device':<8}{'prec.':<8}{'thr.':>5}{'grid':>12}"
+             f"{'base [ns/pt]':>14}{'new [ns/pt]':>13}{'ratio':>8}{'z':>8}"
+             "  status"]
+    for row in rows:
+        grid = f"{row['nx']}x{row['ny']}" if row['nx'] else str(row['points'])
+        lines.append(f"{row['device']:<8}{row['precision']:<8}"
+                     f"{row['threads']:>5}{grid:>12}{row['base'] * 1e9:>14.3f}"
+                     f"{row['new'] * 1e9:>13.3f}{row['ratio']:>8.3f}"
+                     f"{row['z']:>8.1f}  {row['status']}")
+    n_reg = sum(row['status'] == 'regression' for row in rows)
+    lines.append(f"{len(rows)} measurements compared; {n_reg} regressions.")
+    return '\n'.join(lines)
+
+
+def plot_scaling(table, fits=None, case='step', ax=None):
+    """Plot the median times against the number of grid points.
+
+    Parameters
+    ----------
+    table : :obj:`dict` of NumPy :obj:`array`
+        The benchmark table.
+    fits : :obj:`list` of :obj:`dict`, optional
+        Fits from `fit_scaling`, drawn as power-law lines.
+    case : :obj:`str`, default='step'
+        The benchmark case to plot.
+    ax : :obj:`matplotlib.axes.Axes`, optional
+        The axes on which to plot; by default a new figure is created.
+
+    Returns
+    -------
+    fig : :obj:`matplotlib.figure.Figure`
+    ax : :obj:`matplotlib.axes.Axes`
+
+    """
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(5, 4))
+    fig = ax.figure
+    fit_dict = {tuple(fit[k] for k in SERIES): fit for fit in (fits or [])}
+    for key, series in _groups(latest(select(table, case=case)), SERIES):
+        order = np.argsort(series['points'])
+        n_pts = series['points'][order]
+        marks = ax.errorbar(n_pts, series['median'][order],
+                            yerr=series['mad'][order], fmt='o', ms=4,
+                            capsize=2, label='/'.join(map(str, key)))
+        if key in fit_dict:
+            n_lin = np.logspace(np.log10(n_pts[0]), np.log10(n_pts[-1]))
+            ax.plot(n_lin, power(n_lin, *fit_dict[key]['power']), '-',
+                    color=marks[0].get_color())
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('Grid points')
+    ax.set_ylabel(f'Time per call of `{case}` [s]')
+    ax.legend(fontsize=7)
+    return fig, ax
+
+
+def plot_comparison(rows, ax=None):
+    """Plot the run / baseline time ratios from `compare`.
+
+    Regressions are marked in red, and improvements in green.
+
+    """
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(5, 3))
+    fig = ax.figure
+    colors = {'regression': 'tab:red', 'improvement': 'tab:green',
+              'ok': 'tab:gray'}
+    for status, color in colors.items():
+        sel = [row for row in rows if row['status'] == status]
+        ax.plot([row['points'] for row in sel], [row['ratio'] for row in sel],
+                'o', color=color, label=status)
+    ax.axhline(1, color='k', ls='--', lw=1)
+    ax.set_xscale('log')
+    ax.set_xlabel('Grid points')
+    ax.set_ylabel('Time ratio, run / baseline')
+    ax.legend(fontsize=7)
+    return fig, ax
@@ -0,0 +1,342 @@
+"""bench_tools.py module.
+
+Parameterized benchmarks of the core operations of the package. A benchmark
+run sweeps every combination of grid size, device, floating-point precision
+and CPU thread count, timing each of the requested cases:
+
+* 'fft'       : ``tensor_tools.fft_2d`` of the real-space wavefunction;
+* 'ifft'      : ``tensor_tools.ifft_2d`` of the momentum-space wavefunction;
+* 'had'       : Hadamard (elementwise) product of an energy grid with the
+  wavefunction;
+* 'step'      : ``TensorPropagator.full_step``;
+* 'prop'      : a whole ``TensorPropagator.prop_loop`` of `PROP_STEPS` steps;
+* 'eng'       : ``TensorPropagator.eng_expect``;
+* 'sample_io' : a `PROP_STEPS`-step ``prop_loop`` that samples and saves the
+  wavefunction every `SAMPLE_RATE` steps;
+* 'movie'     : ``PropResult.make_movie`` of a short sampled propagation
+  (skipped if FFmpeg is unavailable).
+
+The results are written as JSON, together with the metadata of the
+environment, so that they can be compared across machines and revisions.
+
+"""
+import gc
+import json
+import os
+import tempfile
+import timeit
+import warnings
+
+import numpy as np
+import torch
+from scipy.stats import median_abs_deviation as mad
+
+from spinor_gpe.pspinor import pspinor as spin
+from spinor_gpe.pspinor import tensor_propagator as tprop
+from spinor_gpe.pspinor import tensor_tools as ttools
+from spinor_gpe.pspinor import profiling_tools as pftools
+from spinor_gpe.pspinor import memory_tools as mtools
+from spinor_gpe.pspinor import movie_tools as mvtools
+
+#: The mesh grid sizes of the full benchmark sweep.
+GRIDS = [(64, 64), (64, 128), (128, 128), (128, 256), (256, 256),
+         (256, 512), (512, 512), (512, 1024), (1024, 1024), (1024, 2048),
+         (2048, 2048), (2048, 4096), (4096, 4096)]
+
+#: The mesh grid sizes of a default (e.g. nightly) benchmark run.
+DEFAULT_GRIDS = [(64, 64), (128, 128), (256, 256), (512, 512)]
+
+#: The number of time steps in the 'prop', 'sample_io' and 'movie' cases.
+PROP_STEPS = 20
+
+#: The sampling interval [steps] in the 'sample_io' and 'movie' cases.
+SAMPLE_RATE = 2
+
+#: The benchmark system; the same as in the `spinor_gpe/benchmarks` scripts.
+W = 2 * np.pi * 50
+SYSTEM = {'atom_num': 1e2,
+          'omeg': {'x': W, 'y': W, 'z': 40 * W},
+          'g_sc': {'uu': 1, 'dd': 1, 'ud': 1.04},
+          'pop_frac': (0.5, 0.5),
+          'r_sizes': (8, 8)}
+
+T_STEP = 1 / 50  #: The imaginary time step of the benchmark propagations.
+
+
+def _case_fft(env):
+    psi = ttools.ifft_2d(env['prop'].psik, env['prop'].space['dr'])
+    return lambda: ttools.fft_2d(psi, env['prop'].space['dr'])
+
+
+def _case_ifft(env):
+    return lambda: ttools.ifft_2d(env['prop'].psik, env['prop'].space['dr'])
+
+
+def _case_had(env):
+    oper, psik = env['prop'].kin_eng_spin, env['prop'].psik
+    return lambda: [o * p for o, p in zip(oper, psik)]
+
+
+def _case_step(env):
+    return env['prop'].full_step
+
+
+def _case_prop(env):
+    prop = env['new_prop']()
+    return lambda: prop.prop_loop(PROP_STEPS)
+
+
+def _case_eng(env):
+    return lambda: env['prop'].eng_expect(env['prop'].psik)
+
+
+def _case_sample_io(env):
+    prop = env['new_prop'](is_sampling=True,
+                           n_samples=PROP_STEPS // SAMPLE_RATE)
+    return lambda: prop.prop_loop(PROP_STEPS)
+
+
+def _case_movie(env):
+    if mvtools.ffmpeg_path() is None:
+        return None
+    prop = env['new_prop'](is_sampling=True,
+                           n_samples=PROP_STEPS // SAMPLE_RATE)
+    result = prop.prop_loop(PROP_STEPS)
+    result.paths = env['pspinor'].paths
+    result.time_scale = env['pspinor'].time_scale
+    result.space = env['pspinor'].space
+    return lambda: result.make_movie(progress=False)
+
+
+#: The available benchmark cases. Each one takes the benchmark environment
+#: and returns the callable to be timed, or None if it cannot be run here.
+CASES = {'fft': _case_fft,
+         'ifft': _case_ifft,
+         'had': _case_had,
+         'step': _case_step,
+         'prop': _case_prop,
+         'eng': _case_eng,
+         'sample_io': _case_sample_io,
+         'movie': _case_movie}
+
+#: Cases that are slow enough that a few repetitions suffice.
+SLOW_CASES = {'prop', 'sample_io', 'movie'}
+
+
+def time_call(func, device='cpu', min_repeats=10, max_repeats=1000):
+    """Time repeated single calls of `func`.
+
+    As in the original benchmark scripts, the number of repetitions is set
+    by ``timeit.Timer.autorange``, here bounded by `min_repeats` and
+    `max_repeats`.
+
+    Parameters
+    ----------
+    func : callable
+        The function to time, without arguments.
+    device : :obj:`str`, default='cpu'
+        The device on which `func` runs; CUDA devices are synchronized after
+        every call so that the asynchronous kernels are included.
+    min_repeats : :obj:`int`, default=10
+        The minimum number of timed calls.
+    max_repeats : :obj:`int`, default=1000
+        The maximum number of timed calls.
+
+    Returns
+    -------
+    times : :obj:`list` of :obj:`float`
+        The duration [s] of each call.
+
+    """
+    if torch.device(device).type == 'cuda':
+        def call():
+            func()
+            torch.cuda.synchronize()
+    else:
+        call = func
+    timer = timeit.Timer(call)
+    n_repeats = min(max(timer.autorange()[0], min_repeats), max_repeats)
+    return timer.repeat(n_repeats, 1)
+
+
+def _setup(grid, device, precision, data_path):
+    """Create the `PSpinor` and `TensorPropagator` of a benchmark point."""
+    pspinor = spin.PSpinor(data_path, overwrite=True, mesh_points=grid,
+                           mem_check='raise', **SYSTEM)
+    pspinor.coupling_setup(wavel=790.1e-9, kin_shift=False)
+
+    # Skip grids that would not fit, rather than running out of memory.
+    estimate = pspinor.estimate_memory(device, PROP_STEPS // SAMPLE_RATE,
+                                       precision)
+    mtools.check_memory(estimate['host'] - estimate['breakdown']['pspinor'],
+                        mtools.available_memory('cpu'), 'raise',
+                        f"Benchmarking {grid} points (host)")
+    if estimate['device']:
+        mtools.check_memory(estimate['device'],
+                            mtools.available_memory(device), 'raise',
+                            f"Benchmarking {grid} points ({device})")
+
+    def new_prop(**kwargs):
+        return tprop.TensorPropagator(pspinor, T_STEP, PROP_STEPS, device,
+                                      precision=precision, progress=False,
+                                      **kwargs)
+
+    prop = new_prop()
+    prop.prop_loop(1)
+    return {'pspinor': pspinor, 'prop': prop, 'new_prop': new_prop}
+
+
+def run_suite(cases=None, grids=None, devices=None, precisions=None,
+              threads=None, data_path=None, verbose=True):
+    """Run a sweep of benchmarks.
+
+    The grids are run in order of increasing size. If a grid fails, e.g. if
+    it is estimated not to fit in memory, the larger grids are skipped for
+    that device, precision and thread count.
+
+    Parameters
+    ----------
+    cases : :obj:`iterable` of :obj:`str`, optional
+        The names of the benchmark cases (see `CASES`). Defaults to all.
+    grids : :obj:`iterable` of :obj:`tuple`, optional
+        The mesh grid sizes (x, y). Defaults to `DEFAULT_GRIDS`.
+    devices : :obj:`iterable` of :obj:`str`, optional
+        The devices, e.g. {'cpu', 'cuda'}. Defaults to 'cpu', and 'cuda' if
+        available. Unavailable CUDA devices are skipped.
+    precisions : :obj:`iterable` of :obj:`str`, optional
+        The floating-point precisions, {'double', 'single'}. Defaults to
+        'double'.
+    threads : :obj:`iterable` of :obj:`int`, optional
+        The numbers of CPU threads to sweep on CPU devices, set with
+        ``tensor_tools.set_threads``. Defaults to the current setting.
+    data_path : :obj:`str`, optional
+        Absolute path of the scratch data directory. Defaults to a temporary
+        directory that is removed afterwards.
+    verbose : :obj:`bool`, default=True
+        Option to print a line for every measurement.
+
+    Returns
+    -------
+    report : :obj:`dict`
+        'environment', the metadata from
+        ``profiling_tools.environment_info``; 'config', the sweep
+        parameters; and 'results', a :obj:`list` with a record for every
+        measurement: 'case', 'grid', 'points', 'device', 'precision',
+        'threads', 'status' {'ok', 'skipped', 'error'}, and, for successful
+        measurements, 'n_repeats', 'median', 'mad', 'min' and 'times' [s].
+
+    """
+    # pylint: disable=too-many-arguments, too-many-locals
+    cases = list(CASES) if cases is None else list(cases)
+    unknown = set(cases) - set(CASES)
+    assert not unknown, (f"Unknown benchmark cases {unknown}. Available "
+                         f"cases are: {set(CASES)}.")
+    grids = sorted([tuple(g) for g in (grids or DEFAULT_GRIDS)],
+                   key=np.prod)
+    if devices is None:
+        devices = ['cpu'] + (['cuda'] if torch.cuda.is_available() else [])
+    precisions = list(precisions or ['double'])
+    default_threads = torch.get_num_threads()
+    default_workers = ttools.FFT_WORKERS
+    threads = list(threads or [default_threads])
+
+    is_cuda = any(torch.device(device).type == 'cuda' for device in devices)
+    report = {'environment': pftools.environment_info(is_cuda),
+              'config': {'cases': cases, 'grids': grids, 'devices': devices,
+                         'precisions': precisions, 'threads': threads,
+                         'prop_steps': PROP_STEPS, 't_step': T_STEP,
+                         'system': SYSTEM},
+              'results': []}
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if data_path is None:
+                data_path = os.path.join(tmp_dir, 'bench') + os.sep
+            for device in devices:
+                if (torch.device(device).type == 'cuda'
+                        and not torch.cuda.is_available()):
+                    warnings.warn(f"Skipping device `{device}`; CUDA is not "
+                                  "available.")
+                    continue
+                is_cpu = torch.device(device).type == 'cpu'
+                sweep = threads if is_cpu else [default_threads]
+                for precision in precisions:
+                    for n_threads in sweep:
+                        ttools.set_threads(n_threads)
+                        point = {'device': device, 'precision': precision,
+                                 'threads': n_threads}
+                        report['results'] += _run_grids(
+                            cases, grids, point, data_path, verbose)
+    finally:
+        ttools.set_threads(default_threads)
+        ttools.FFT_WORKERS = default_workers
+    return report
+
+
+def _run_grids(cases, grids, point, data_path, verbose):
+    """Run all `cases` over increasing `grids` at one sweep point."""
+    records = []
+    for i, grid in enumerate(grids):
+        base = dict(point, grid=list(grid), points=int(np.prod(grid)))
+        env = None
+        try:
+            env = _setup(grid, point['device'], point['precision'],
+                         data_path)
+            for case in cases:
+                func = CASES[case](env)
+                if func is None:
+                    records.append(dict(base, case=case, status='skipped'))
+                    continue
+                times = time_call(func, point['device'],
+                                  3 if case in SLOW_CASES else 10,
+                                  10 if case in SLOW_CASES else 1000)
+                records.append(dict(base, case=case, status='ok',
+                                    n_repeats=len(times),
+                                    median=float(np.median(times)),
+                                    mad=float(mad(times, scale='normal')),
+                                    min=float(np.min(times)), times=times))
+                if verbose:
+                    print(f"{case:<10} {grid[0]:>5}x{grid[1]:<5} "
+                          f"{point['device']:<7} {point['precision']:<7} "
+                          f"{point['threads']:>3} threads: "
+                          f"{records[-1]['median'] * 1e3:10.4f} ms")
+        except (RuntimeError, MemoryError) as ex:
+            # Typically out of memory; the larger grids would fail too.
+            print(f"Grid {grid} failed on {point['device']}: {ex}")
+            done = {rec['case'] for rec in records
+                    if rec['grid'] == list(grid)}
+            records += [dict(base, case=case, status='error', error=str(ex))
+                        for case in cases if case not in done]
+            records += [dict(point, grid=list(g), points=int(np.prod(g)),
+                             case=case, status='skipped')
+                        for g in grids[i + 1:] for case in cases]
+            break
+        finally:
+            del env
+            gc.collect()
+            if torch.device(point['device']).type == 'cuda':
+                torch.cuda.empty_cache()
+    return records
+
+
+def save_results(report, file_name):
+    """Save a benchmark report as JSON.
+
+    Parameters
+    ----------
+    report : :obj:`dict`
+        The report returned by `run_suite`.
+    file_name : :obj:`str`
+        The output file path. Missing directories are created.
+
+    """
+    directory = os.path.dirname(os.path.abspath(file_name))
+    os.makedirs(directory, exist_ok=True)
+    with open(file_name, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=1)
+
+
+def load_results(file_name):
+    """Load a benchmark report saved with `save_results`."""
+    with open(file_name, encoding='utf-8') as file:
+        return json.load(file)
@@ -0,0 +1,119 @@
+"""grid_tools.py module.
+
+Sizing of the real- and momentum-space grids from the physical scales of
+the condensate, and checks of how much of a wavefunction reaches the edges
+of its grids.
+
+A grid resolves a wavefunction when its real-space density is negligible
+at the boundary, and its momentum-space density is negligible at the edges
+of `k_sizes`. The first is estimated from the Thomas-Fermi radius and the
+width of the density's edge layer in the trap; the second from the
+healing length, the chemical potential, and the Raman recoil momentum.
+
+"""
+import numpy as np
+
+from spinor_gpe.pspinor import plotting_tools as ptools
+from spinor_gpe.pspinor import tensor_tools as ttools
+
+
+def fft_size(n_min, pow2=False):
+    """Get the smallest FFT-friendly number of mesh points.
+
+    Parameters
+    ----------
+    n_min : :obj:`int` or :obj:`float`
+        The minimum number of points.
+    pow2 : :obj:`bool`, default=False
+        Option to only return powers of two; otherwise the size is an even
+        number with no prime factors larger than 5.
+
+    Returns
+    -------
+    size : :obj:`int`
+        The number of points, at least 2.
+
+    """
+    size = max(int(np.ceil(n_min)), 2)
+    if pow2:
+        return 1 << (size - 1).bit_length()
+    size += size % 2
+    while True:
+        rest = size
+        for factor in (2, 3, 5):
+            while rest % factor == 0:
+                rest //= factor
+        if rest == 1:
+            return size
+        size += 2
+
+
+def edge_layer(rad_tf, slope, edge_tol=1e-6):
+    """Estimate the distance beyond the Thomas-Fermi radius to a grid edge.
+
+    Near the Thomas-Fermi radius, the density falls off like the square of
+    an Airy function, ~exp(-4/3 * s**(3/2)), over an edge layer of width
+    delta = (2 * `slope`)**(-1/3) [1]_.
+
+    Parameters
+    ----------
+    rad_tf : :obj:`float`
+        The Thomas-Fermi radius along the axis [a_x].
+    slope : :obj:`float`
+        The slope of the trapping potential at `rad_tf` [hbar*omeg_x/a_x].
+    edge_tol : :obj:`float`, default=1e-6
+        The density at the grid edge, relative to the peak density.
+
+    Returns
+    -------
+    half_size : :obj:`float`
+        The half size of the grid along the axis [a_x].
+
+    References
+    ----------
+    .. [1] F. Dalfovo, L. Pitaevskii, and S. Stringari, Phys. Rev. A 54,
+       4213 (1996).
+
+    """
+    delta = (2 * slope)**(-1 / 3)
+    return rad_tf + delta * (0.75 * np.log(1 / edge_tol))**(2 / 3)
+
+
+def outer_weight(dens, band=0.1):
+    """Compute the fraction of the atoms in the outer band of a grid.
+
+    Parameters
+    ----------
+    dens : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+        The centered real- or momentum-space densities of the components.
+    band : :obj:`float`, default=0.1
+        The width of the band along each axis, as a fraction of the grid.
+
+    Returns
+    -------
+    weight : :obj:`float` or PyTorch :obj:`Tensor`
+        The fraction of the total density outside of the central
+        (1 - `band`) of the grid.
+
+    """
+    inner = ptools.center_slices(dens[0].shape, 1 / (1 - band))[0]
+    total = sum(d.sum() for d in dens)
+    return 1 - sum(d[inner].sum() for d in dens) / total
+
+
+def edge_weight(psi, band=0.1):
+    """Compute the fraction of atoms at the boundary of the real-space grid.
+
+    See `outer_weight`; `psi` is the real-space wavefunction.
+
+    """
+    return outer_weight(ttools.density(psi), band)
+
+
+def tail_weight(psik, band=0.1):
+    """Compute the fraction of atoms in the tail of the momentum spectrum.
+
+    See `outer_weight`; `psik` is the centered momentum-space wavefunction.
+
+    """
+    return outer_weight(ttools.density(psik), band)
@@ -0,0 +1,260 @@
+"""health_tools.py module.
+
+A watchdog of the numerical health of a propagation. Every `rate` time
+steps it checks, on the device and with a single transfer to the host:
+
+* that the wavefunction is finite;
+* in real time, the drift of the norm and of the energy since the first
+  check, both of which are conserved by the split-step propagation;
+* the fraction of atoms at the boundary of the real-space grid and in the
+  tail of the momentum spectrum; see ``grid_tools``.
+
+A time step that is too large, or a grid that is too small or too coarse,
+shows up in these checks long before the wavefunction overflows. On a
+failure, the propagation either continues with a warning, is aborted at the
+last healthy checkpoint, or is rewound to it and continued with half the
+time step.
+
+"""
+import warnings
+
+import numpy as np
+import torch
+
+from spinor_gpe.pspinor import grid_tools as gtools
+from spinor_gpe.pspinor import tensor_tools as ttools
+
+#: The default thresholds of the checks.
+TOLERANCES = {'norm': 1e-6, 'energy': 1e-3, 'edge': 1e-3, 'tail': 1e-3}
+
+#: The actions on a failed check.
+ACTIONS = ('warn', 'abort', 'halve')
+
+
+# pylint: disable=too-many-arguments
+def energy(psik, psi, space, kin_eng_spin, pot_eng_spin, coupling, g_sc,
+           expon=0.0):
+    """Compute the energy of a pseudospinor wavefunction on the device.
+
+    Unlike ``TensorPropagator.eng_expect``, the kinetic energy is computed
+    in momentum space, which needs no phase unwrapping; this is the energy
+    that is conserved by real-time propagation.
+
+    Parameters
+    ----------
+    psik : :obj:`list` of PyTorch :obj:`Tensor`
+        The centered momentum-space wavefunction.
+    psi : :obj:`list` of PyTorch :obj:`Tensor`
+        The real-space wavefunction.
+    space : :obj:`dict` of PyTorch :obj:`Tensor`
+        Contains the volume elements 'dv_r' and 'dv_k'.
+    kin_eng_spin : :obj:`list` of PyTorch :obj:`Tensor`
+        The centered kinetic energy grids.
+    pot_eng_spin : :obj:`list` of PyTorch :obj:`Tensor`
+        The potential energy grids.
+    coupling : PyTorch :obj:`Tensor`
+        The coupling grid.
+    g_sc : :obj:`dict` of :obj:`float`
+        The interaction strengths, {'uu', 'dd', 'ud'}.
+    expon : PyTorch :obj:`Tensor` or :obj:`float`, default=0.0
+        The exponential argument of the coupling off-diagonals.
+
+    Returns
+    -------
+    eng : PyTorch :obj:`Tensor`
+        The total energy, [hbar*omeg_x].
+
+    """
+    densk = ttools.density(psik)
+    dens = ttools.density(psi)
+    kin = sum((k * d).sum() for k, d in zip(kin_eng_spin, densk))
+    pot = sum((v * d).sum() for v, d in zip(pot_eng_spin, dens))
+    int_e = (g_sc['uu'] * dens[0]**2 / 2 + g_sc['dd'] * dens[1]**2 / 2
+             + g_sc['ud'] * dens[0] * dens[1]).sum()
+    coupl_e = (coupling * (torch.conj(psi[0]) * psi[1]
+                           * torch.exp(-1.0j * expon)).real).sum()
+    return kin * space['dv_k'] + (pot + int_e + coupl_e) * space['dv_r']
+
+
+class Watchdog:
+    """Checks the numerical health of a propagation.
+
+    Attributes
+    ----------
+    rate : :obj:`int`
+        How often, in time steps, the checks are evaluated.
+    action : :obj:`str`
+        The action on a failed check, {'warn', 'abort', 'halve'}.
+    tols : :obj:`dict` of :obj:`float`
+        The thresholds of the checks, {'norm', 'energy', 'edge', 'tail'}.
+    retries : :obj:`int`
+        The most times the time step is halved before aborting.
+    is_real : :obj:`bool`
+        Whether the propagation is in real time, where the norm and the
+        energy drifts are checked.
+    checkpoint : :obj:`dict` or None
+        The step 'step' and a device copy of the centered 'psik' at the last
+        healthy check.
+    reference : :obj:`dict` of :obj:`float`
+        The norm factor and the energy at the first check after a time
+        step, i.e. of the normalized wavefunction.
+    report : :obj:`dict`
+        The outcome: the 'status' {'ok', 'recovered', 'aborted'}, the
+        'failures' with the step, checks and values of each, the number of
+        'substeps' per time step, and the path to the saved 'checkpoint'.
+
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, rate, action='abort', tols=None, retries=3,
+                 is_real=True):
+        """Set up the checks.
+
+        Parameters
+        ----------
+        rate : :obj:`int`
+            Check every `rate` time steps.
+        action : :obj:`str`, default='abort'
+            On a failed check, 'warn' and continue; 'abort' the propagation
+            at the last healthy checkpoint; or rewind to it and 'halve' the
+            time step, then abort after `retries` halvings. Without a
+            healthy checkpoint, 'abort' and 'halve' abort at once.
+        tols : :obj:`dict` of :obj:`float`, optional
+            Thresholds replacing those in `TOLERANCES`.
+        retries : :obj:`int`, default=3
+            The most times the time step is halved.
+        is_real : :obj:`bool`, default=True
+            Whether the propagation is in real time.
+
+        """
+        assert action in ACTIONS, (f"The health action must be one of "
+                                   f"{ACTIONS}.")
+        self.rate = max(int(rate), 1)
+        self.action = action
+        self.tols = {**TOLERANCES, **(tols or {})}
+        self.retries = retries
+        self.is_real = is_real
+        self.checkpoint = None
+        self.reference = {}
+        self.report = {'status': 'ok', 'failures': [], 'substeps': 1,
+                       'checkpoint': None}
+
+    @classmethod
+    def from_kwargs(cls, n_steps, is_real, kwargs):
+        """Create a `Watchdog` from the `health_*` propagation options.
+
+        Returns None if `health_action` is not given. See
+        ``tensor_propagator.TensorPropagator``.
+
+        """
+        action = kwargs.get('health_action', None)
+        if action is None:
+            return None
+        return cls(kwargs.get('health_rate', max(n_steps // 100, 1)), action,
+                   kwargs.get('health_tol', None),
+                   kwargs.get('health_retries', 3), is_real)
+
+    def measure(self, prop):
+        """Evaluate the health metrics of a propagator's wavefunction.
+
+        Parameters
+        ----------
+        prop : :obj:`TensorPropagator`
+            The propagator.
+
+        Returns
+        -------
+        values : :obj:`dict` of :obj:`float`
+            The 'finite' flag, the relative 'norm' and 'energy' drifts, and
+            the 'edge' and 'tail' weights.
+
+        """
+        psik = prop.psik
+        psi = ttools.ifft_nd(psik, delta_r=prop.space['dr'])
+        # There is no norm factor before the first step
+        norm = prop.norm_factor
+        if norm is None:
+            norm = torch.tensor(np.nan)
+        metrics = [torch.isfinite(torch.stack(psik)).all(), norm,
+                   energy(psik, psi, prop.space, prop.kin_eng_spin,
+                          prop.pot_eng_spin, prop.coupling, prop.g_sc,
+                          prop.expon),
+                   gtools.edge_weight(psi), gtools.tail_weight(psik)]
+        # A single device-to-host transfer
+        finite, norm, eng, edge, tail = torch.stack(
+            [torch.as_tensor(m, device=prop.device).real.double()
+             for m in metrics]).tolist()
+        # The references are taken once the wavefunction is normalized,
+        # which may change its energy, e.g. after `shift_momentum`.
+        if prop.norm_factor is not None:
+            self.reference.setdefault('norm', norm)
+            self.reference.setdefault('energy', eng)
+        drifts = {'norm': 0.0, 'energy': 0.0}
+        if self.reference:
+            drifts = {key: abs(val / self.reference[key] - 1)
+                      for key, val in [('norm', norm), ('energy', eng)]}
+        return {'finite': bool(finite and np.isfinite(eng)), **drifts,
+                'edge': edge, 'tail': tail}
+
+    def check(self, prop, step):
+        """Check the wavefunction and act on a failure.
+
+        A healthy wavefunction is kept as the checkpoint. On a failure, the
+        propagator's wavefunction is restored from the checkpoint unless the
+        action is 'warn', and its number of substeps is doubled if the
+        action is 'halve'.
+
+        Parameters
+        ----------
+        prop : :obj:`TensorPropagator`
+            The propagator.
+        step : :obj:`int`
+            The current time step.
+
+        Returns
+        -------
+        resume : :obj:`int` or None
+            The step to continue the propagation from; None to continue from
+            `step`, or -1 to abort.
+
+        """
+        values = self.measure(prop)
+        failed = [] if values['finite'] else ['finite']
+        checked = ['edge', 'tail'] + ['norm', 'energy'] * self.is_real
+        # A NaN value fails its check, too
+        failed += [key for key in checked
+                   if not values[key] <= self.tols[key]]
+        if not failed:
+            self.checkpoint = {'step': step,
+                               'psik': [pk.clone() for pk in prop.psik]}
+            return None
+
+        self.report['failures'].append({'step': step, 'checks': failed,
+                                        'values': values})
+        message = (f"At step {step}, the propagation failed the {failed} "
+                   f"health checks: {values}.")
+        if self.action == 'warn':
+            if len(self.report['failures']) == 1:
+                warnings.warn(message + " Continuing.", RuntimeWarning)
+            return None
+        if self.checkpoint is None:
+            # The first check failed; there is no healthy state to rewind to.
+            self.report['status'] = 'aborted'
+            warnings.warn(message + f" Aborting at step {step}.",
+                          RuntimeWarning)
+            return -1
+
+        prop.psik = self.checkpoint['psik']
+        if (self.action == 'halve'
+                and self.report['substeps'] < 2**self.retries):
+            self.report['substeps'] *= 2
+            self.report['status'] = 'recovered'
+            prop.set_substeps(self.report['substeps'])
+            warnings.warn(message + " Halving the time step, from step "
+                          f"{self.checkpoint['step']}.", RuntimeWarning)
+            return self.checkpoint['step']
+
+        self.report['status'] = 'aborted'
+        warnings.warn(message + " Aborting at step "
+                      f"{self.checkpoint['step']}.", RuntimeWarning)
+        return -1
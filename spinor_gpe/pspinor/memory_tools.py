@@ -0,0 +1,368 @@
+"""memory_tools.py module.
+
+Estimates of the peak host and device memory of a simulation, made before
+any of the grids are allocated.
+
+The estimates count the full-size grids held by each object, in units of
+one grid of float64 values (host), or of the propagation's real and complex
+dtypes (device). The transient counts were measured on CPU for the current
+split-step implementation; they include the temporaries of a time step, and
+of the energy evaluation at the end of a propagation. Memory held by the
+allocator's cache, and by the CUDA context itself, is not included.
+
+Given the grids of a `PSpinor`, its energy, coupling and detuning grids,
+and their evolution operators, are sized by the values they actually hold,
+which for separable grids (see ``separable_tools``) are far fewer than the
+grid points. Otherwise, they are counted as full grids, and the estimates
+are upper bounds.
+
+"""
+import os
+import sys
+import warnings
+
+import numpy as np
+import torch
+
+from spinor_gpe.pspinor import separable_tools as sptools
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+#: Full float64 grids held on the host by a `PSpinor` whose grids are not
+#: known: the potential and kinetic energy grids, the coupling and detuning
+#: grids, and the complex `psi` and `psik` (2 each). The meshes are sparse.
+PSPINOR_GRIDS = 12
+
+#: Extra float64 grids while the Thomas-Fermi wavefunction is computed.
+PSPINOR_INIT = 6
+
+#: Extra float64 grids of the spin-dependent kinetic energy of a coupled
+#: `PSpinor`.
+COUPLING_GRIDS = 2
+
+#: Complex grids held on the device by a `TensorPropagator`, if the grids
+#: of the `PSpinor` are not known: the kinetic, potential and coupling
+#: evolution operators of the inner and outer time steps (14), the
+#: wavefunction (2), and the step workspace (5).
+PROP_COMPLEX = 21
+
+#: Real grids held on the device by a `TensorPropagator`, if the grids of
+#: the `PSpinor` are not known: the kinetic (2), potential (2) and coupling
+#: (1) energies, and the density workspace (2).
+PROP_REAL = 7
+
+#: Complex device grids of the temporaries of a single time step, i.e. the
+#: FFT scratch space.
+STEP_COMPLEX = 2
+
+#: Float64 host grids of the final energy evaluation and results.
+RESULT_GRIDS = 32
+
+#: Float64 host grids of the complex `psi` and `psik` of a `PSpinor`, when
+#: its other grids are sized individually.
+PSPINOR_WAVE = 8
+
+#: Complex device grids of the wavefunction (2) and the step workspace (5),
+#: when the operators of a `TensorPropagator` are sized individually.
+PROP_WAVE_COMPLEX = 7
+
+#: Real device grids of the density workspace, when the energies of a
+#: `TensorPropagator` are sized individually.
+PROP_WAVE_REAL = 2
+
+#: Complex coupling operator grids per time step: the diagonal, and the two
+#: off-diagonals.
+COUPLING_OPS = 3
+
+PRECISIONS = {'double': (16, 8), 'single': (8, 4)}
+
+
+def estimate_memory(mesh_points, precision='double', device='cpu',
+                    is_coupling=False, rot_coupling=True, n_samples=0,
+                    sample_bytes=None, grids=None):
+    """Estimate the peak memory of creating and propagating a `PSpinor`.
+
+    Parameters
+    ----------
+    mesh_points : :obj:`iterable` of :obj:`int`
+        The number of grid points along the x- and y-axes, respectively.
+    precision : :obj:`str`, default='double'
+        The floating-point precision of the propagation, {'double',
+        'single'}.
+    device : :obj:`str`, default='cpu'
+        The propagation device. On CPU, the device memory is host memory.
+    is_coupling : :obj:`bool`, default=False
+        Whether the `PSpinor` has coupling set up.
+    rot_coupling : :obj:`bool`, default=True
+        Whether the coupling is in a rotating reference frame; otherwise a
+        grid of coupling phases is also held on the device.
+    n_samples : :obj:`int`, default=0
+        The number of wavefunctions sampled during the propagation.
+    sample_bytes : :obj:`int`, optional
+        The size of each sample [bytes]. Defaults to the full, complex
+        wavefunction.
+    grids : :obj:`dict`, optional
+        The grids of a known `PSpinor`: 'kin_eng_spin' and 'pot_eng_spin',
+        the :obj:`list` of the energy grids of each spin component,
+        'coupling', and 'other', a :obj:`list` of any other grids it holds.
+        They are sized by the values they hold; by default, they are
+        counted as full grids.
+
+    Returns
+    -------
+    estimate : :obj:`dict`
+        The peak 'host' and 'device' memory [bytes], and the 'breakdown' of
+        the contributions: 'pspinor' (host grids of the `PSpinor`),
+        'pspinor_init' (its transient peak while it is created),
+        'propagator' (device grids of the `TensorPropagator`), 'step'
+        (device temporaries of a time step), 'sampling' (host sample
+        buffer), and 'result' (host grids of the energy evaluation and
+        results).
+
+    """
+    # pylint: disable=too-many-arguments
+    points = int(np.prod(mesh_points))
+    cplx, real = PRECISIONS[precision]
+    host_grid = 8 * points
+
+    if sample_bytes is None:
+        sample_bytes = 2 * 16 * points
+    if grids is None:
+        pspinor = (PSPINOR_GRIDS + COUPLING_GRIDS * is_coupling) * host_grid
+        propagator = points * (PROP_COMPLEX * cplx
+                               + (PROP_REAL + (not rot_coupling)) * real)
+    else:
+        energies = grids['kin_eng_spin'] + grids['pot_eng_spin']
+        held = {id(grid): grid for grid in
+                energies + [grids['coupling']] + grids.get('other', [])}
+        pspinor = PSPINOR_WAVE * host_grid + sum(
+            _nbytes(grid) for grid in held.values())
+        # The inner and outer time steps each have their own operators.
+        eng_values = sum(_values(grid) for grid in energies)
+        coupl_values = _values(grids['coupling'], is_compact=True)
+        propagator = (
+            points * (PROP_WAVE_COMPLEX * cplx
+                      + (PROP_WAVE_REAL + (not rot_coupling)) * real)
+            + 2 * (eng_values + COUPLING_OPS * coupl_values) * cplx
+            + (eng_values + coupl_values) * real)
+    breakdown = {
+        'pspinor': pspinor,
+        'pspinor_init': pspinor + PSPINOR_INIT * host_grid,
+        'propagator': propagator,
+        'step': points * STEP_COMPLEX * cplx,
+        'sampling': n_samples * sample_bytes,
+        'result': RESULT_GRIDS * host_grid}
+
+    device_peak = breakdown['propagator'] + breakdown['step']
+    host_peak = max(breakdown['pspinor_init'],
+                    pspinor + breakdown['sampling'] + breakdown['result'])
+    if torch.device(device).type == 'cpu':
+        host_peak += device_peak
+        device_peak = 0
+    return {'host': host_peak, 'device': device_peak,
+            'breakdown': breakdown}
+
+
+def _values(grid, is_compact=False):
+    """Count the values held for a grid, or for its separable terms.
+
+    With `is_compact`, a :obj:`SepSum` is counted as its compact grid; see
+    ``separable_tools.SepSum.compact``.
+
+    """
+    if not isinstance(grid, sptools.SepSum):
+        return int(np.prod(np.shape(grid)))
+    shapes = [tuple(term.shape) for term in grid.terms]
+    if is_compact:
+        return int(np.prod(np.broadcast_shapes(*shapes)))
+    return sum(int(np.prod(shape)) for shape in shapes)
+
+
+def _nbytes(grid):
+    """Get the memory [bytes] held by a grid, or by its separable terms."""
+    if isinstance(grid, sptools.SepSum):
+        return grid.nbytes
+    return np.asarray(grid).nbytes
+
+
+def available_memory(device='cpu'):
+    """Get the memory [bytes] currently available on `device`.
+
+    For the host, this is 'MemAvailable' from /proc/meminfo where it
+    exists, or else the free physical memory. Returns None if it cannot be
+    determined.
+
+    """
+    if torch.device(device).type == 'cuda':
+        if not torch.cuda.is_available():
+            return None
+        if hasattr(torch.cuda, 'mem_get_info'):
+            return torch.cuda.mem_get_info(device)[0]
+        total = torch.cuda.get_device_properties(device).total_memory
+        return total - torch.cuda.memory_reserved(device)
+
+    try:
+        with open('/proc/meminfo', encoding='ascii') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def current_memory(device='cpu'):
+    """Get the memory [bytes] currently used by this process.
+
+    Returns
+    -------
+    used : :obj:`dict`
+        The resident set size of the process on the 'host', from
+        /proc/self/statm (None where it does not exist), and the memory
+        allocated by PyTorch on a CUDA 'device' (None otherwise).
+
+    """
+    host = None
+    try:
+        with open('/proc/self/statm', encoding='ascii') as statm:
+            host = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    device_used = None
+    if torch.device(device).type == 'cuda' and torch.cuda.is_available():
+        device_used = torch.cuda.memory_allocated(device)
+    return {'host': host, 'device': device_used}
+
+
+def reset_peak_memory(device='cpu'):
+    """Reset the peak memory counters of this process, where possible.
+
+    The peak resident set size of the host is reset through
+    /proc/self/clear_refs (Linux), and the peak allocated memory of a CUDA
+    `device` through PyTorch. These counters are shared by all the code of
+    the process, so the reset is only made on request.
+
+    Returns
+    -------
+    is_reset : :obj:`bool`
+        Whether the host peak was reset; otherwise `peak_memory` reports the
+        peak over the lifetime of the process.
+
+    """
+    if torch.device(device).type == 'cuda' and torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats(device)
+    try:
+        with open('/proc/self/clear_refs', 'w',
+                  encoding='ascii') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def peak_memory(device='cpu'):
+    """Get the peak memory [bytes] used by this process.
+
+    Returns
+    -------
+    peak : :obj:`dict`
+        The peak resident set size of the process on the 'host', since the
+        last `reset_peak_memory` where it is supported (None if it cannot be
+        determined), and the peak memory allocated by PyTorch on a CUDA
+        'device' (None otherwise).
+
+    """
+    host = None
+    try:
+        with open('/proc/self/status', encoding='ascii') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    host = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if host is None and resource is not None:
+        # Kilobytes on Linux, bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        host = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    device_peak = None
+    if torch.device(device).type == 'cuda' and torch.cuda.is_available():
+        device_peak = torch.cuda.max_memory_allocated(device)
+    return {'host': host, 'device': device_peak}
+
+
+def check_memory(required, available, action='warn', what='The simulation'):
+    """Warn, or raise an error, if `required` memory exceeds `available`.
+
+    Parameters
+    ----------
+    required : :obj:`int`
+        The estimated memory requirement [bytes].
+    available : :obj:`int` or None
+        The memory budget [bytes]. If None, no check is made.
+    action : :obj:`str`, default='warn'
+        {'warn', 'raise', 'ignore'}
+    what : :obj:`str`, optional
+        Description of the allocation, for the message.
+
+    Raises
+    ------
+    MemoryError
+        If `action` is 'raise' and the requirement exceeds the budget.
+
+    """
+    if action == 'ignore' or available is None or required <= available:
+        return
+    message = (f"{what} is estimated to need {required / 2**20:.0f} MiB, but "
+               f"only {available / 2**20:.0f} MiB are available.")
+    if action == 'raise':
+        raise MemoryError(message)
+    warnings.warn(message, ResourceWarning)
+
+
+def max_mesh_points(budget, device='cpu', precision='double', aspect=1,
+                    **kwargs):
+    """Find the largest mesh grid that fits within a memory budget.
+
+    The grids have power-of-two sizes, (n, n * `aspect`).
+
+    Parameters
+    ----------
+    budget : :obj:`int`
+        The memory budget [bytes] of `device`. On CPU this is the host
+        memory; on other devices, the host requirement is not checked.
+    device : :obj:`str`, default='cpu'
+        The propagation device.
+    precision : :obj:`str`, default='double'
+        The floating-point precision of the propagation.
+    aspect : :obj:`int` or :obj:`float`, default=1
+        The power-of-two ratio of the y- to x-axis grid points.
+
+    Other Parameters
+    ----------------
+    is_coupling, rot_coupling, n_samples
+        See `estimate_memory`.
+
+    Returns
+    -------
+    mesh_points : :obj:`tuple` of :obj:`int` or None
+        The largest fitting (x, y) grid, or None if even the smallest
+        (2, 2 * `aspect`) grid does not fit.
+
+    """
+    is_cpu = torch.device(device).type == 'cpu'
+    best = None
+    n_x = 2
+    while n_x * max(aspect, 1) <= 2**20:
+        mesh = (n_x, max(int(n_x * aspect), 2))
+        est = estimate_memory(mesh, precision, device, **kwargs)
+        if est['host' if is_cpu else 'device'] > budget:
+            break
+        best = mesh
+        n_x *= 2
+    return best
@@ -0,0 +1,257 @@
+"""movie_tools.py module.
+
+A pipeline for rendering movies of the sampled wavefunctions.
+
+The sampled frames are read from the archive in batches, transformed to real
+space and downsampled to display resolution on the propagation device. The
+small display grids are then rendered to RGB images in a pool of worker
+processes, and piped as raw video into a single ffmpeg process.
+
+"""
+import itertools
+import multiprocessing as mp
+import os
+import shutil
+import subprocess
+
+import matplotlib as mpl
+import numpy as np
+import torch
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from tqdm import tqdm
+
+from spinor_gpe.pspinor import archive_tools as atools
+from spinor_gpe.pspinor import plotting_tools as ptools
+from spinor_gpe.pspinor import tensor_tools as ttools
+
+#: The figure and images of a frame renderer, one per process.
+_RENDERER = {}
+
+
+def ffmpeg_path():
+    """Get the path to the ffmpeg executable, or None if it is unavailable.
+
+    The executable is the one set for matplotlib animations, in
+    ``matplotlib.rcParams['animation.ffmpeg_path']``.
+
+    """
+    return shutil.which(mpl.rcParams['animation.ffmpeg_path'])
+
+
+def downsample(grids, resolution=256):
+    """Area-average the last two axes of `grids` to at most `resolution`.
+
+    Parameters
+    ----------
+    grids : PyTorch :obj:`Tensor`
+        Real (..., Ny, Nx) grids.
+    resolution : :obj:`int`, default=256
+        The display resolution; grids are averaged over blocks of an integer
+        number of points, until neither axis is larger.
+
+    Returns
+    -------
+    averaged : PyTorch :obj:`Tensor`
+        The averaged grids. Trailing points that do not fill a whole block
+        are dropped.
+
+    """
+    kernel = [-(-size // resolution) for size in grids.shape[-2:]]
+    if kernel == [1, 1]:
+        return grids
+    shape = grids.shape
+    flat = grids.reshape(-1, 1, *shape[-2:])
+    averaged = torch.nn.functional.avg_pool2d(flat, kernel)
+    return averaged.reshape(*shape[:-2], *averaged.shape[-2:])
+
+
+def display_frames(path, delta_r, resolution=256, zoom=1.0, device='cpu',
+                   batch_size=16):
+    """Yield the display-resolution densities and phases of sampled frames.
+
+    Frames are read and transformed in batches of `batch_size`, with a
+    single host-to-device and device-to-host transfer per batch.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive of sampled momentum-space wavefunctions.
+    delta_r : NumPy :obj:`array`
+        The real-space x- and y-mesh spacings.
+    resolution : :obj:`int`, default=256
+        The maximum display resolution along each axis.
+    zoom : :obj:`float`, default=1.0
+        A zoom factor; the momentum-space densities are cropped to the
+        central 1 / `zoom` of the grid before they are downsampled.
+    device : :obj:`str`, default='cpu'
+        The device on which the frames are transformed.
+    batch_size : :obj:`int`, default=16
+        The number of frames transformed at once.
+
+    Yields
+    ------
+    frame : :obj:`dict` of :obj:`list` of NumPy :obj:`array`
+        The keys are {'r', 'ph', 'k'}: the real-space densities and phases,
+        and the momentum-space densities, of both spin components.
+
+    """
+    # pylint: disable=too-many-arguments
+    normalization = ttools.prod(delta_r) / (2 * np.pi)
+    samples = atools.iter_samples(path)
+    while True:
+        batch = list(itertools.islice(samples, batch_size))
+        if not batch:
+            return
+        psik = torch.as_tensor(np.stack(batch), dtype=torch.complex64,
+                               device=device)
+        psi = torch.fft.ifftn(torch.fft.ifftshift(psik, dim=(-2, -1)),
+                              dim=(-2, -1)) / normalization
+
+        dens = downsample(ttools.norm_sq(psi), resolution)
+        # The phase of the area-averaged wavefunction
+        psi = torch.complex(downsample(psi.real, resolution),
+                            downsample(psi.imag, resolution))
+        phase = torch.angle(psi)
+        peak = dens.amax(dim=(-2, -1), keepdim=True)
+        phase[dens < peak * 1e-6] = 0
+        psik = psik[(..., *ptools.center_slices(psik.shape[-2:], zoom)[0])]
+        densk = downsample(ttools.norm_sq(psik), resolution)
+
+        grids = {'r': ttools.to_numpy(dens), 'ph': ttools.to_numpy(phase),
+                 'k': ttools.to_numpy(densk)}
+        for i in range(len(batch)):
+            yield {key: list(val[i]) for key, val in grids.items()}
+
+
+def _init_renderer(frame, extents, cmap, dpi, norm_val):
+    """Create the figure of a frame renderer, in the current process."""
+    # pylint: disable=too-many-arguments
+    fig = Figure(figsize=ptools.SPINS_FIG_SIZE, dpi=dpi)
+    FigureCanvasAgg(fig)
+    plots = ptools.draw_spins(fig, frame['r'], frame['ph'], frame['k'],
+                              extents, cmap)
+    _RENDERER.update({'fig': fig, 'plots': plots, 'norm_val': norm_val})
+
+
+def _render(frame):
+    """Render a frame to the raw bytes of an RGB image."""
+    plots = _RENDERER['plots']
+    for key in frame:
+        for plot, grid in zip(plots[key], frame[key]):
+            plot.set_data(grid)
+    for key in ['r', 'k']:
+        vmax = sum(np.max(grid) for grid in frame[key])
+        vmax /= _RENDERER['norm_val']
+        for plot in plots[key]:
+            plot.set_clim(0, vmax)
+    canvas = _RENDERER['fig'].canvas
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[..., :3].tobytes()
+
+
+def render_movie(path, file_name, delta_r, extents, cmap='viridis', zoom=1.0,
+                 norm_val=1.0, **kwargs):
+    """Render a movie of the sampled wavefunctions' densities and phases.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive of sampled momentum-space wavefunctions.
+    file_name : :obj:`str`
+        Path of the movie file to write.
+    delta_r : NumPy :obj:`array`
+        The real-space x- and y-mesh spacings.
+    extents : :obj:`dict` of :obj:`iterable`
+        The full real- and momentum-space extents; see
+        ``plotting_tools.plot_spins``.
+    cmap : :obj:`str`, default='viridis'
+        Color map name for the real- and momentum-space density plots.
+    zoom : :obj:`float`, default=1.0
+        A zoom factor for the k-space density plot.
+    norm_val : :obj:`float`, default=1.0
+        The colormaps are normalized to the sum of the spin components' peak
+        densities, divided by `norm_val`.
+
+    Other Parameters
+    ----------------
+    fps : :obj:`int`, optional
+        Frame rate of the movie. Default is 5.
+    dpi : :obj:`int`, optional
+        Resolution of the movie frames [dots per inch]. Default is 100.
+    resolution : :obj:`int`, optional
+        The maximum number of points along each axis of the displayed grids.
+        Default is 256.
+    device : :obj:`str`, optional
+        The device on which the frames are transformed. Default is 'cpu'.
+    n_workers : :obj:`int`, optional
+        The number of rendering processes. Default is the number of CPUs.
+        Frames are rendered in this process where worker processes cannot
+        be forked.
+    progress : :obj:`bool`, optional
+        Shows a progress bar. Default is True.
+
+    Returns
+    -------
+    file_name : :obj:`str` or None
+        The path of the movie, or None if ffmpeg is not available.
+
+    """
+    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-locals
+    ffmpeg = ffmpeg_path()
+    if ffmpeg is None:
+        return None
+    dpi = kwargs.get('dpi', 100)
+    n_workers = kwargs.get('n_workers', os.cpu_count())
+    if 'fork' not in mp.get_all_start_methods():
+        n_workers = 1
+    batch_size = 4 * n_workers
+
+    frames = display_frames(path, delta_r, kwargs.get('resolution', 256),
+                            zoom, kwargs.get('device', 'cpu'), batch_size)
+    first = next(frames)
+    # The k-space grids are already cropped to the zoomed region.
+    shape = atools.sample_shape(path)
+    extents = dict(extents, k=ptools.zoom_extent(extents['k'], shape[-2:],
+                                                 zoom))
+    init_args = (first, extents, cmap, dpi, norm_val)
+    _init_renderer(*init_args)
+    width, height = _RENDERER['fig'].canvas.get_width_height()
+
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo',
+               '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+               '-r', str(kwargs.get('fps', 5)), '-i', '-',
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+               '-c:v', 'libx264', '-pix_fmt', 'yuv420p', file_name]
+    progress = tqdm(total=shape[0], disable=not kwargs.get('progress', True))
+    batches = iter(lambda: list(itertools.islice(frames, batch_size)), [])
+    batches = itertools.chain([[first]], batches)
+
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as proc:
+        if n_workers > 1:
+            with mp.get_context('fork').Pool(n_workers, _init_renderer,
+                                             init_args) as pool:
+                # The next batch is transformed while this one renders.
+                pending = None
+                for batch in batches:
+                    rendering = pool.map_async(_render, batch)
+                    if pending is not None:
+                        _write(proc, pending.get(), progress)
+                    pending = rendering
+                _write(proc, pending.get(), progress)
+        else:
+            for batch in batches:
+                _write(proc, [_render(frame) for frame in batch], progress)
+        proc.stdin.close()
+    progress.close()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, command)
+    return file_name
+
+
+def _write(proc, images, progress):
+    """Write a batch of rendered images to the ffmpeg process."""
+    for image in images:
+        proc.stdin.write(image)
+    progress.update(len(images))
@@ -0,0 +1,190 @@
+"""observable_tools.py module.
+
+Observables that can be evaluated on the device during propagation. Each
+observable is a callable with the signature ``func(psi, psik, space)``,
+where `psi` and `psik` are the :obj:`list` of real- and momentum-space
+wavefunction :obj:`Tensor` components, and `space` is the propagator's
+:obj:`dict` of spatial tensors (see ``tensor_propagator.TensorPropagator``).
+It returns a :obj:`Tensor` (or a :obj:`float`) of fixed shape.
+
+"""
+import torch
+
+from spinor_gpe.pspinor import grid_tools as gtools
+from spinor_gpe.pspinor import tensor_tools as ttools
+
+
+def _meshes(space):
+    """Get the real-space meshes of the grid's axes, x first."""
+    return [space[key] for key in ['x_mesh', 'y_mesh'] if key in space]
+
+
+def center_of_mass(psi, psik, space):
+    """Compute the center of mass of each spin component.
+
+    Returns
+    -------
+    com : PyTorch :obj:`Tensor`
+        Tensor of shape (n_comp, n_dims) of the (<x>, <y>) positions [a_x].
+
+    """
+    # pylint: disable=unused-argument
+    meshes = _meshes(space)
+    return torch.stack([torch.stack(ttools.expect_val(psi, mesh))
+                        for mesh in meshes], dim=-1)
+
+
+def width(psi, psik, space):
+    """Compute the RMS width of each spin component.
+
+    Returns
+    -------
+    rms : PyTorch :obj:`Tensor`
+        Tensor of shape (n_comp, n_dims) of the x- and y-widths [a_x].
+
+    """
+    com = center_of_mass(psi, psik, space)
+    meshes = _meshes(space)
+    second = torch.stack([torch.stack(ttools.expect_val(psi, mesh**2))
+                          for mesh in meshes], dim=-1)
+    return torch.sqrt(torch.clamp(second - com**2, min=0))
+
+
+def peak_dens(psi, psik, space):
+    """Compute the peak real-space density of each spin component.
+
+    Returns
+    -------
+    peak : PyTorch :obj:`Tensor`
+        Tensor of shape (n_comp,) [1/a_x^2].
+
+    """
+    # pylint: disable=unused-argument
+    return torch.stack([d.max() for d in ttools.density(psi)])
+
+
+def separation(psi, psik, space):
+    """Compute the phase separation of the two spin components.
+
+    Same quantity as ``PropResult.calc_separation``: 0 for fully overlapping
+    and 1 for fully separated components.
+
+    """
+    # pylint: disable=unused-argument
+    dens = ttools.density(psi)
+    overlap = torch.sum(dens[0] * dens[1])
+    return 1 - overlap / torch.sqrt(torch.sum(dens[0]**2)
+                                    * torch.sum(dens[1]**2))
+
+
+def polarization(psi, psik, space):
+    """Compute the spin polarization (N_up - N_down) / (N_up + N_down)."""
+    # pylint: disable=unused-argument
+    pops = [d.sum() for d in ttools.density(psik)]
+    return (pops[0] - pops[1]) / (pops[0] + pops[1])
+
+
+def edge_weight(psi, psik, space):
+    """Compute the fraction of atoms in the outer 10% of the real-space grid.
+
+    See ``grid_tools.edge_weight``.
+
+    """
+    # pylint: disable=unused-argument
+    return gtools.edge_weight(psi)
+
+
+def tail_weight(psi, psik, space):
+    """Compute the fraction of atoms in the outer 10% of the k-space grid.
+
+    See ``grid_tools.tail_weight``.
+
+    """
+    # pylint: disable=unused-argument
+    return gtools.tail_weight(psik)
+
+
+def k_window(center=(0.0, 0.0), radius=1.0):
+    """Create an observable of the populations inside a momentum window.
+
+    Useful for tracking the population near the Raman recoil peaks, e.g.
+    ``k_window((ps.kL_recoil, 0), ps.kL_recoil / 2)``.
+
+    Parameters
+    ----------
+    center : :obj:`iterable` of :obj:`float`, default=(0.0, 0.0)
+        The (kx, ky) center of the circular window [1/a_x]. On a 1D grid,
+        only kx is used.
+    radius : :obj:`float`, default=1.0
+        The radius of the window [1/a_x].
+
+    Returns
+    -------
+    func : callable
+        Observable returning a Tensor of shape (n_comp,) of the fraction of
+        each component's atoms inside the window.
+
+    """
+    cache = {}
+
+    def window_pops(psi, psik, space):
+        # pylint: disable=unused-argument
+        if 'mask' not in cache:
+            shape = psik[0].shape
+            k_lin = [(torch.arange(n, device=psik[0].device) - n // 2) * dk
+                     for n, dk in zip(reversed(shape), space['dk'])]
+            # The meshes of the (kx, ky) axes; x is the last grid axis.
+            meshes = torch.meshgrid(*k_lin[::-1], indexing='ij')[::-1]
+            cache['mask'] = (sum((mesh - cent)**2 for mesh, cent
+                                 in zip(meshes, center)) <= radius**2)
+        dens = ttools.density(psik)
+        return torch.stack([d[cache['mask']].sum() / d.sum() for d in dens])
+
+    return window_pops
+
+
+#: Built-in observables, selectable by name.
+BUILTINS = {'com': center_of_mass,
+            'width': width,
+            'peak_dens': peak_dens,
+            'separation': separation,
+            'polarization': polarization,
+            'edge_weight': edge_weight,
+            'tail_weight': tail_weight}
+
+
+def parse_observables(observables):
+    """Convert a user specification of observables into named callables.
+
+    Parameters
+    ----------
+    observables : :obj:`list` or :obj:`dict`
+        Either a :obj:`list` of built-in names (see `BUILTINS`), or a
+        :obj:`dict` mapping names to built-in names or to callables.
+
+    Returns
+    -------
+    funcs : :obj:`dict` of callable
+        The observables to evaluate, keyed by their names.
+
+    Raises
+    ------
+    KeyError
+        If a requested built-in observable does not exist.
+
+    """
+    if observables is None:
+        return {}
+    if not isinstance(observables, dict):
+        observables = {name: name for name in observables}
+
+    funcs = {}
+    for name, obs in observables.items():
+        if callable(obs):
+            funcs[name] = obs
+        elif obs in BUILTINS:
+            funcs[name] = BUILTINS[obs]
+        else:
+            raise KeyError(f"Unknown observable `{obs}`. Built-in "
+                           f"observables are: {set(BUILTINS)}.")
+    return funcs
@@ -9,6 +9,9 @@ from matplotlib import gridspec
 
 from spinor_gpe.pspinor import tensor_tools as ttools
 
+#: Figure size [in] of `plot_spins`, and of the frames of movies.
+SPINS_FIG_SIZE = (5.5, 6.4)
+
 
 def next_available_path(file_name, trial_name, ext=''):
     """
@@ -101,6 +104,179 @@ def time_remaining(frame, n_total, its):
     return f'[{hour_str}:{minute_str}:{second_str}]'
 
 
+def center_slices(shape, zoom=1.0):
+    """Get the slices of the central 1 / `zoom` of a grid of `shape`.
+
+    Parameters
+    ----------
+    shape : :obj:`iterable` of :obj:`int`
+        The (Ny, Nx) shape of the grid.
+    zoom : :obj:`float`, default=1.0
+        The zoom factor; values of 1.0 or less keep the whole grid.
+
+    Returns
+    -------
+    slices : :obj:`tuple` of :obj:`slice`
+        The slices of the y- and x-axes, respectively. An even number of
+        points is kept, centered on the zero-frequency point of a centered
+        momentum-space grid.
+    fraction : NumPy :obj:`array`
+        The fraction of the y- and x-axes that is kept, respectively.
+
+    """
+    slices = []
+    fraction = []
+    for size in shape:
+        keep = max(2, 2 * int(round(size / (2 * max(zoom, 1.0)))))
+        start = (size - keep) // 2
+        slices.append(slice(start, start + keep))
+        fraction.append(keep / size)
+    return tuple(slices), np.array(fraction)
+
+
+def zoom_extent(extent, shape, zoom=1.0):
+    """Get the extent of a grid cropped with `center_slices`.
+
+    Parameters
+    ----------
+    extent : :obj:`iterable`
+        The full extent of the grid, [x_min, x_max, y_min, y_max].
+    shape : :obj:`iterable` of :obj:`int`
+        The (Ny, Nx) shape of the full grid.
+    zoom : :obj:`float`, default=1.0
+        The zoom factor.
+
+    """
+    fraction = center_slices(shape, zoom)[1]
+    return np.asarray(extent) * np.repeat(fraction[::-1], 2)
+
+
+def rebin(arr, new_shape=(256, 256)):
+    """Rebin the trailing axes of `arr` to `new_shape` by area-averaging.
+
+    Axes that are divided evenly are averaged over equal blocks; otherwise
+    the bins differ in size by at most one point. Axes already no larger
+    than `new_shape` are left unchanged.
+
+    Parameters
+    ----------
+    arr : NumPy :obj:`array`
+        The real or complex input array.
+    new_shape : :obj:`iterable` of :obj:`int`, default=(256, 256)
+        The target shape of the last ``len(new_shape)`` axes.
+
+    Returns
+    -------
+    new_arr : NumPy :obj:`array`
+        The rebinned array.
+
+    """
+    arr = np.asarray(arr)
+    first = arr.ndim - len(new_shape)
+    for axis, new_size in enumerate(new_shape, start=first):
+        size = arr.shape[axis]
+        if new_size >= size:
+            continue
+        if size % new_size == 0:
+            shape = (arr.shape[:axis] + (new_size, size // new_size)
+                     + arr.shape[axis + 1:])
+            arr = arr.reshape(shape).mean(axis=axis + 1)
+        else:
+            edges = np.arange(new_size) * size // new_size
+            counts = np.diff(np.append(edges, size))
+            counts = counts.reshape((-1,) + (1,) * (arr.ndim - axis - 1))
+            arr = np.add.reduceat(arr, edges, axis=axis) / counts
+    return arr
+
+
+def display_shape(fig, n_rows=1, n_cols=1):
+    """Get the pixel budget of one panel in a grid of `fig`'s subplots.
+
+    The budget is the figure size at the larger of the figure and
+    ``savefig.dpi`` resolutions, divided evenly between the panels; arrays
+    with more points than this are not resolved in the figure.
+
+    Parameters
+    ----------
+    fig : :obj:`matplotlib.figure.Figure`
+        The figure.
+    n_rows : :obj:`int`, default=1
+        The number of rows of panels.
+    n_cols : :obj:`int`, default=1
+        The number of columns of panels.
+
+    Returns
+    -------
+    shape : :obj:`tuple` of :obj:`int`
+        The number of pixels along the y- and x-axes of a panel.
+
+    """
+    dpi = fig.dpi
+    if not isinstance(plt.rcParams['savefig.dpi'], str):
+        dpi = max(dpi, plt.rcParams['savefig.dpi'])
+    width, height = fig.get_size_inches() * dpi
+    return int(np.ceil(height / n_rows)), int(np.ceil(width / n_cols))
+
+
+def display_dens(psi, shape, zoom=1.0):
+    """Compute the densities of `psi` at display resolution.
+
+    Parameters
+    ----------
+    psi : :obj:`list` of NumPy :obj:`array`
+        The real- or momentum-space wavefunction components.
+    shape : :obj:`iterable` of :obj:`int`
+        The maximum display shape; see `display_shape`.
+    zoom : :obj:`float`, default=1.0
+        The densities are cropped with `center_slices` before rebinning.
+
+    Returns
+    -------
+    dens : :obj:`list` of NumPy :obj:`array`
+        The area-averaged densities.
+
+    """
+    slices = center_slices(psi[0].shape, zoom)[0]
+    return [rebin(ttools.norm_sq(p[slices]), shape) for p in psi]
+
+
+def display_phase(psi, shape):
+    """Compute the phases of `psi` at display resolution.
+
+    The phase is that of the area-averaged wavefunction, which, unlike the
+    average of the phase, is unaffected by the phase wrapping.
+
+    Parameters
+    ----------
+    psi : :obj:`list` of NumPy :obj:`array`
+        The real-space wavefunction components.
+    shape : :obj:`iterable` of :obj:`int`
+        The maximum display shape; see `display_shape`.
+
+    Returns
+    -------
+    phase : :obj:`list` of NumPy :obj:`array`
+        The phases, set to zero where the density is negligible.
+
+    """
+    psi = [rebin(p, shape) for p in psi]
+    return ttools.phase(psi, uwrap=False, dens=ttools.density(psi))
+
+
+def check_2d(grid, what='This plot'):
+    """Raise an error if `grid` is not 2D; the plots are images.
+
+    Raises
+    ------
+    NotImplementedError
+        If `grid` does not have two dimensions.
+
+    """
+    if np.ndim(grid) != 2:
+        raise NotImplementedError(f"{what} is only implemented for 2D "
+                                  f"grids, not {np.ndim(grid)}D grids.")
+
+
 def plot_dens(psi, spin=None, cmap='viridis', scale=1.,
               extent=None):
     """Plot the real or k-space density of the wavefunction.
@@ -127,6 +303,7 @@ def plot_dens(psi, spin=None, cmap='viridis', scale=1.,
         scale of the plot.
 
     """
+    check_2d(psi[0])
     if spin is None:
         n_plots = 2
     else:
@@ -135,11 +312,10 @@ def plot_dens(psi, spin=None, cmap='viridis', scale=1.,
         n_plots = 1
         psi = [psi[spin]]
 
-    dens = ttools.density(psi)
-
     fig, axs = plt.subplots(1, n_plots, sharex=True, sharey=True)
     if not isinstance(axs, np.ndarray):  # Makes single axs an array
         axs = np.array([axs])
+    dens = display_dens(psi, display_shape(fig, 1, n_plots))
 
     for i, den in enumerate(dens):
         axs[i].imshow(den, cmap=cmap, extent=extent)
@@ -172,6 +348,7 @@ def plot_phase(psi, spin=None, cmap='twilight_shifted', scale=1,
         scale of the plot.
 
     """
+    check_2d(psi[0])
     if spin is None:
         n_plots = 2
     else:
@@ -180,68 +357,50 @@ def plot_phase(psi, spin=None, cmap='twilight_shifted', scale=1,
         n_plots = 1
         psi = [psi[spin]]
 
-    phase = ttools.phase(psi)
-    dens = ttools.density(psi)
-
     fig, axs = plt.subplots(1, n_plots, sharex=True, sharey=True)
     if not isinstance(axs, np.ndarray):  # Makes single axs an array
         axs = np.array([axs])
+    phase = display_phase(psi, display_shape(fig, 1, n_plots))
 
     for i, phz in enumerate(phase):
-        phz[dens[i] < 1e-6 * np.max(dens[i])] = 0
         axs[i].imshow(phz, cmap=cmap, extent=extent)
 
     plt.show()
 
 
-def plot_spins(psi, psik, extents, paths, cmap='viridis', save=True,
-               ext='.pdf', show=True, zoom=1.0):
-    """Plot the densities (real & k) and phases of spin components.
+def draw_spins(fig, dens, phase, densk, extents, cmap='viridis', zoom=1.0):
+    """Draw the densities (real & k) and phases of spin components.
 
-    In total, six subplots are generated. Each pair of axes are stored together
-    in a list, which is returned in `all_plots`.
+    Used by `plot_spins`, and to render the frames of movies.
 
     Parameters
     ----------
-    psi : :obj:`list` of Numpy :obj:`array`, optional.
-        The real-space wavefunction to plot.
-    psik : :obj:`list` of Numpy :obj:`array`, optional.
-        The momentum-space wavefunction to plot.
+    fig : :obj:`matplotlib.figure.Figure`
+        The empty figure on which to draw the six subplots.
+    dens : :obj:`list` of NumPy :obj:`array`
+        The real-space densities of the spin components.
+    phase : :obj:`list` of NumPy :obj:`array`
+        The real-space phases of the spin components.
+    densk : :obj:`list` of NumPy :obj:`array`
+        The momentum-space densities of the spin components.
     extents : :obj:`dict` of :obj:`iterable`
-        The dictionary keys are {'r', 'k'}, and each value is a 4-element
-        iterables giving the x- (kx-) and y- (ky-) spatial extents of the plot
-        area, e.g. [x_min, x_max, y_min, y_max]
-    paths : :obj:`dict` of :obj:`str`
-        The dictionary keys contain {'data', 'folder'}, and the values are
-        absolute paths to the saved data path and its containing folder.
+        See `plot_spins`.
     cmap : :obj:`str`, default='viridis'
         Matplotlib color map name for the real- and momentum-space density
         plots.
-    save : :obj:`bool`, default=True
-        Saves the figure as a .pdf file (default). The filename has the
-        format "/`data_path`/spin_dens_phase%s-`trial_name`.pdf".
-    ext : :obj:`str`, default='.pdf'
-        File extension for the saved density plots.
     zoom : :obj:`float`, default=1.0
         A zoom factor for the k-space density plot.
 
     Returns
     -------
-    fig : :obj:`plt.Figure`
-        The matplotlib figure for the plot.
     all_plots : :obj:`dict` of :obj:`list`
         The keys are {'r', 'ph', 'k'}. Each value is a pair of
         :obj:`matplotlib.image.AxesImage` for both spins.
 
     """
     # pylint: disable=unused-variable
-    dens = ttools.density(psi)
-    phase = ttools.phase(psi, uwrap=False, dens=dens)
-    densk = ttools.density(psik)
-
     widths = [1] * 4
     heights = [1] * 6
-    fig = plt.figure(figsize=(5.5, 6.4))
     gsp = gridspec.GridSpec(6, 4, width_ratios=widths, height_ratios=heights)
 
     r_axs = [fig.add_subplot(gsp[0:2, 0:2]), fig.add_subplot(gsp[0:2, 2:])]
@@ -280,7 +439,60 @@ def plot_spins(psi, psik, extents, paths, cmap='viridis', save=True,
     all(ax.set_xlim(zoom_kext[:2]) for ax in k_axs)
     all(ax.set_ylim(zoom_kext[2:]) for ax in k_axs)
 
-    plt.tight_layout()
+    fig.tight_layout()
+
+    return {'r': r_plots, 'ph': ph_plots, 'k': k_plots}
+
+
+def plot_spins(psi, psik, extents, paths, cmap='viridis', save=True,
+               ext='.pdf', show=True, zoom=1.0):
+    """Plot the densities (real & k) and phases of spin components.
+
+    In total, six subplots are generated. Each pair of axes are stored together
+    in a list, which is returned in `all_plots`.
+
+    Parameters
+    ----------
+    psi : :obj:`list` of Numpy :obj:`array`, optional.
+        The real-space wavefunction to plot.
+    psik : :obj:`list` of Numpy :obj:`array`, optional.
+        The momentum-space wavefunction to plot.
+    extents : :obj:`dict` of :obj:`iterable`
+        The dictionary keys are {'r', 'k'}, and each value is a 4-element
+        iterables giving the x- (kx-) and y- (ky-) spatial extents of the plot
+        area, e.g. [x_min, x_max, y_min, y_max]
+    paths : :obj:`dict` of :obj:`str`
+        The dictionary keys contain {'data', 'folder'}, and the values are
+        absolute paths to the saved data path and its containing folder.
+    cmap : :obj:`str`, default='viridis'
+        Matplotlib color map name for the real- and momentum-space density
+        plots.
+    save : :obj:`bool`, default=True
+        Saves the figure as a .pdf file (default). The filename has the
+        format "/`data_path`/spin_dens_phase%s-`trial_name`.pdf".
+    ext : :obj:`str`, default='.pdf'
+        File extension for the saved density plots.
+    zoom : :obj:`float`, default=1.0
+        A zoom factor for the k-space density plot.
+
+    Returns
+    -------
+    fig : :obj:`plt.Figure`
+        The matplotlib figure for the plot.
+    all_plots : :obj:`dict` of :obj:`list`
+        The keys are {'r', 'ph', 'k'}. Each value is a pair of
+        :obj:`matplotlib.image.AxesImage` for both spins.
+
+    """
+    check_2d(psik[0])
+    fig = plt.figure(figsize=SPINS_FIG_SIZE)
+    shape = display_shape(fig, 3, 2)
+    dens = display_dens(psi, shape)
+    phase = display_phase(psi, shape)
+    densk = display_dens(psik, shape, zoom)
+    # The k-space densities are already cropped to the zoomed region.
+    extents = dict(extents, k=zoom_extent(extents['k'], psik[0].shape, zoom))
+    all_plots = draw_spins(fig, dens, phase, densk, extents, cmap)
 
     # Save figure
     if save:
@@ -290,7 +502,6 @@ def plot_spins(psi, psik, extents, paths, cmap='viridis', save=True,
     if show:
         plt.show()
 
-    all_plots = {'r': r_plots, 'ph': ph_plots, 'k': k_plots}
     return fig, all_plots
 
 
@@ -331,13 +542,15 @@ def plot_total(psi, psik, extents, paths, cmap='viridis', save=True,
         :obj:`matplotlib.image.AxesImage`.
 
     """
-    dens_tot_r = sum(ttools.density(psi))
-    ph_tot_r = ttools.phase(sum(psi), uwrap=False, dens=dens_tot_r)
-    dens_tot_k = sum(ttools.density(psik))
-
+    check_2d(psik[0])
     widths = [1] * 4
     heights = [1] * 4
     fig = plt.figure()
+    shape = display_shape(fig, 2, 2)
+    dens_tot_r = sum(display_dens(psi, shape))
+    ph_tot_r = display_phase([sum(psi)], shape)[0]
+    dens_tot_k = sum(display_dens(psik, shape, zoom))
+    k_extent = zoom_extent(extents['k'], psik[0].shape, zoom)
     gsp = gridspec.GridSpec(4, 4, width_ratios=widths,
                             height_ratios=heights)
     r_ax = fig.add_subplot(gsp[0:2, 0:2])
@@ -364,12 +577,10 @@ def plot_total(psi, psik, extents, paths, cmap='viridis', save=True,
 
     # Momentum-space density plot
     k_plot = k_ax.imshow(dens_tot_k, cmap=cmap, origin='lower',
-                         extent=extents['k'], vmin=0)
+                         extent=k_extent, vmin=0)
     fig.colorbar(k_plot, ax=k_ax)
     k_ax.set_xlabel('$k_x$')
     k_ax.set_ylabel('$k_y$')
-    k_ax.set_xlim(extents['k'][:2] / zoom)
-    k_ax.set_ylim(extents['k'][2:] / zoom)
 
     plt.tight_layout()
 
@@ -0,0 +1,184 @@
+"""pod_tools.py module.
+
+Compression of sampled-wavefunction archives by proper orthogonal
+decomposition (POD).
+
+The frames of smooth dynamics, e.g. Rabi oscillations, lie close to a
+low-dimensional subspace. A truncated POD basis of that subspace is
+computed by an incremental singular value decomposition, streaming over
+the archive in batches of frames, so that the archive is never held in
+memory. Each frame is then stored as its coefficients in the basis.
+
+The basis is truncated so that the discarded fraction of the total energy
+of the frames, i.e. of the sum of their squared norms, is at most `tol`.
+A compressed archive stores the 'pod_basis' of shape (n_modes, *frame),
+the 'pod_coeffs' of shape (n_frames, n_modes), the 'pod_singular' values,
+the relative 'pod_error' of each reconstructed frame, the 'pod_tol', and
+the name 'pod_key' of the original sampled array, along with the other
+members of the original archive. ``archive_tools`` reconstructs its frames
+on demand.
+
+"""
+import os
+
+import numpy as np
+
+from spinor_gpe.pspinor import archive_tools as atools
+
+_TINY = np.finfo(float).tiny
+
+
+def _update(basis, sing, batch, budget, max_modes):
+    """Add a batch of frames to a truncated SVD.
+
+    Parameters
+    ----------
+    basis : NumPy :obj:`array` or None
+        The orthonormal left singular vectors, of shape (n_points, n_modes).
+    sing : NumPy :obj:`array` or None
+        The singular values.
+    batch : NumPy :obj:`array`
+        The flattened frames, of shape (n_points, n_frames).
+    budget : :obj:`float`
+        The largest energy that may be discarded by the truncation.
+    max_modes : :obj:`int` or None
+        The most modes that are kept.
+
+    Returns
+    -------
+    basis : NumPy :obj:`array`
+    sing : NumPy :obj:`array`
+    discarded : :obj:`float`
+        The energy discarded by the truncation.
+
+    """
+    if basis is None:
+        ortho, tri = np.linalg.qr(batch)
+        core = tri
+    else:
+        proj = basis.conj().T @ batch
+        resid = batch - basis @ proj
+        # Re-orthogonalize once, against the loss of orthogonality
+        proj2 = basis.conj().T @ resid
+        resid -= basis @ proj2
+        ortho, tri = np.linalg.qr(resid)
+        core = np.zeros((sing.size + tri.shape[0],) * 2, dtype=batch.dtype)
+        core[:sing.size, :sing.size] = np.diag(sing)
+        core[:sing.size, sing.size:] = proj + proj2
+        core[sing.size:, sing.size:] = tri
+        ortho = np.hstack([basis, ortho])
+    left, sing, _ = np.linalg.svd(core)
+
+    n_modes = _truncate(sing, budget, max_modes)
+    discarded = float(np.sum(sing[n_modes:]**2))
+    return ortho @ left[:, :n_modes], sing[:n_modes], discarded
+
+
+def _truncate(sing, budget, max_modes=None):
+    """Get the fewest modes whose discarded energy is within `budget`."""
+    # The energy discarded by keeping the first n modes, for each n
+    tails = np.cumsum((sing**2)[::-1])[::-1]
+    n_modes = int(np.sum(tails > budget))
+    if max_modes is not None:
+        n_modes = min(n_modes, max_modes)
+    return max(n_modes, 1)
+
+
+def compress(path, tol=1e-6, max_modes=None, batch_size=16, out_path=None):
+    """Compress a sampled archive to a truncated POD basis.
+
+    The archive is read twice, one batch of frames at a time: once to build
+    the basis, and once to project the frames onto it and measure the
+    reconstruction errors.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive.
+    tol : :obj:`float`, default=1e-6
+        The largest fraction of the total energy of the frames that is
+        discarded.
+    max_modes : :obj:`int`, optional
+        The most modes that are kept, which may exceed `tol`.
+    batch_size : :obj:`int`, default=16
+        The number of frames added to the basis at a time.
+    out_path : :obj:`str`, optional
+        Path of the compressed archive. Defaults to `path` with the suffix
+        '_pod', numbered if that archive exists.
+
+    Returns
+    -------
+    report : :obj:`dict`
+        The compressed archive's 'path', the number of 'n_modes', the
+        storage 'ratio' of the sampled frames to the basis and
+        coefficients, the largest relative 'error' of a reconstructed
+        frame, and the discarded fraction of the total 'energy'.
+
+    """
+    # pylint: disable=too-many-locals
+    assert not atools.is_compressed(path), (
+        f"The archive {path} is already compressed.")
+    key = atools.sample_key(path)
+    shape = atools.sample_shape(path, key)
+    n_frames, n_points = shape[0], int(np.prod(shape[1:]))
+    n_batches = -(-n_frames // batch_size)
+
+    basis, sing = None, None
+    seen, discarded = 0.0, 0.0
+    for batch in _batches(path, key, batch_size):
+        seen += float(np.sum(np.abs(batch)**2))
+        # Spread the discarded energy evenly over the updates
+        basis, sing, lost = _update(basis, sing, batch,
+                                    tol * seen / n_batches, max_modes)
+        discarded += lost
+    # Use the rest of the budget on the final truncation
+    n_modes = _truncate(sing, tol * seen - discarded, max_modes)
+    basis, sing = basis[:, :n_modes], sing[:n_modes]
+
+    coeffs = np.empty((n_frames, n_modes), dtype=basis.dtype)
+    error = np.empty(n_frames)
+    resid_energy, start = 0.0, 0
+    for batch in _batches(path, key, batch_size):
+        stop = start + batch.shape[1]
+        proj = basis.conj().T @ batch
+        resid = np.sum(np.abs(batch - basis @ proj)**2, axis=0)
+        norms = np.sum(np.abs(batch)**2, axis=0)
+        error[start:stop] = np.sqrt(resid / np.maximum(norms, _TINY))
+        coeffs[start:stop] = proj.T
+        resid_energy += float(np.sum(resid))
+        start = stop
+
+    if out_path is None:
+        out_path = _next_path(os.path.splitext(path)[0] + '_pod')
+    with np.load(path) as archive:
+        others = {name: archive[name] for name in archive.files
+                  if name != key}
+    np.savez(out_path, pod_basis=basis.T.reshape(n_modes, *shape[1:]),
+             pod_coeffs=coeffs, pod_singular=sing, pod_error=error,
+             pod_tol=tol, pod_key=key, **others)
+
+    n_stored = (n_modes * n_points + n_frames * n_modes) * basis.itemsize
+    return {'path': out_path, 'n_modes': n_modes,
+            'ratio': n_frames * n_points * basis.itemsize / n_stored,
+            'error': float(np.max(error)), 'energy': resid_energy / seen}
+
+
+def _batches(path, key, batch_size):
+    """Yield the flattened frames of an archive as columns, in batches."""
+    batch = []
+    for frame in atools.iter_samples(path, key):
+        batch.append(frame.ravel())
+        if len(batch) == batch_size:
+            yield np.stack(batch, axis=1)
+            batch = []
+    if batch:
+        yield np.stack(batch, axis=1)
+
+
+def _next_path(base):
+    """Get the first of `base`.npz, `base`2.npz, ... that does not exist."""
+    path, i = base + '.npz', 1
+    while os.path.exists(path):
+        i += 1
+        path = f'{base}{i}.npz'
+    return path
@@ -0,0 +1,289 @@
+"""profiling_tools.py module.
+
+Low-overhead phase timers for instrumenting the propagation loop, and the
+run metrics recorded with every propagation.
+
+"""
+import functools
+import os
+import platform
+import socket
+import subprocess
+import time
+
+import numpy as np
+import scipy
+import torch
+
+from spinor_gpe.pspinor import tensor_tools as ttools
+
+#: Estimated memory traffic of each phase, per call and spin component, in
+#: units of one full complex wavefunction grid. These are minimal-traffic
+#: estimates (every operand read once, every result written once), used for
+#: the effective memory bandwidth.
+PHASE_TRAFFIC = {'kin': 3, 'ifft': 2, 'fft': 2, 'norm': 4, 'int': 5,
+                 'coupl': 6, 'pot': 3}
+
+
+class NullTimer:
+    """Stand-in for :obj:`PhaseTimer` when profiling is disabled."""
+
+    def switch(self, name=None):
+        """Do nothing."""
+
+    def stop(self):
+        """Do nothing."""
+
+
+class PhaseTimer:
+    """Accumulates the wall time spent in named phases of a computation.
+
+    Exactly one phase is timed at any moment: :meth:`switch` ends the
+    current phase and begins the next one. On CUDA devices the device is
+    synchronized at every phase boundary so that the asynchronous kernels
+    are attributed to the phase that launched them; this makes profiled runs
+    slightly slower than unprofiled ones.
+
+    Attributes
+    ----------
+    totals : :obj:`dict` of :obj:`float`
+        The accumulated time [s] spent in each phase.
+    counts : :obj:`dict` of :obj:`int`
+        The number of times each phase was entered.
+
+    """
+
+    def __init__(self, device='cpu', record=False):
+        """Instantiate a PhaseTimer object.
+
+        Parameters
+        ----------
+        device : :obj:`str`, default='cpu'
+            The device on which the timed operations run.
+        record : :obj:`bool`, default=False
+            Option to also emit a ``torch.profiler`` range for every phase,
+            for use in a Chrome trace.
+
+        """
+        self.totals = {}
+        self.counts = {}
+        self._sync = torch.device(device).type == 'cuda'
+        self._record = record
+        self._current = None
+        self._range = None
+        self._start = 0.0
+
+    def switch(self, name=None):
+        """End the current phase, and begin phase `name` (if given)."""
+        if self._sync:
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        if self._current is not None:
+            self.totals[self._current] = (self.totals.get(self._current, 0.0)
+                                          + now - self._start)
+            self.counts[self._current] = self.counts.get(self._current, 0) + 1
+            if self._range is not None:
+                self._range.__exit__(None, None, None)
+                self._range = None
+        self._current = name
+        if name is not None:
+            if self._record:
+                self._range = torch.profiler.record_function(name)
+                self._range.__enter__()
+            self._start = time.perf_counter()
+
+    def stop(self):
+        """End the current phase."""
+        self.switch(None)
+
+    def report(self, n_steps, wall_time, grid_bytes, n_comp=2):
+        """Summarize the timings of a propagation.
+
+        Parameters
+        ----------
+        n_steps : :obj:`int`
+            The number of full time steps taken.
+        wall_time : :obj:`float`
+            The total wall time [s] of the propagation loop.
+        grid_bytes : :obj:`int`
+            The size [bytes] of a single wavefunction component grid.
+        n_comp : :obj:`int`, default=2
+            The number of wavefunction components.
+
+        Returns
+        -------
+        report : :obj:`dict`
+            'phases' maps each phase name to its total time 'time' [s],
+            number of calls 'calls', mean time per call 'mean' [s], fraction
+            'frac' of the wall time, and, where an estimate is available,
+            effective memory bandwidth 'bandwidth' [bytes/s]. The summary
+            keys are 'wall_time' [s], 'steps_per_sec', and 'bandwidth', the
+            effective bandwidth of the split-step phases [bytes/s].
+
+        """
+        phases = {}
+        step_bytes, step_time = 0, 0.0
+        for name, total in self.totals.items():
+            calls = self.counts[name]
+            phases[name] = {'time': total, 'calls': calls,
+                            'mean': total / calls,
+                            'frac': total / wall_time}
+            if name in PHASE_TRAFFIC:
+                moved = PHASE_TRAFFIC[name] * n_comp * grid_bytes * calls
+                phases[name]['bandwidth'] = moved / total
+                step_bytes += moved
+                step_time += total
+
+        report = {'phases': phases, 'wall_time': wall_time,
+                  'steps_per_sec': n_steps / wall_time,
+                  'bandwidth': step_bytes / step_time if step_time else 0.0}
+        return report
+
+
+def format_report(report):
+    """Format a profiling report as a text table.
+
+    Parameters
+    ----------
+    report : :obj:`dict`
+        The report returned by :meth:`PhaseTimer.report`.
+
+    Returns
+    -------
+    text : :obj:`str`
+        A human-readable per-phase breakdown.
+
+    """
+    lines = [f"{'phase':<12}{'calls':>9}{'total [s]':>12}{'mean [us]':>12}"
+             f"{'frac':>8}{'GB/s':>9}"]
+    phases = sorted(report['phases'].items(), key=lambda p: -p[1]['time'])
+    for name, vals in phases:
+        bandwidth = vals.get('bandwidth')
+        bw_str = f"{bandwidth / 1e9:9.2f}" if bandwidth else f"{'-':>9}"
+        lines.append(f"{name:<12}{vals['calls']:>9}{vals['time']:>12.4f}"
+                     f"{vals['mean'] * 1e6:>12.1f}{vals['frac']:>8.1%}"
+                     + bw_str)
+    lines.append(f"Wall time: {report['wall_time']:.4f} s; "
+                 f"{report['steps_per_sec']:.1f} steps/s; effective "
+                 f"bandwidth {report['bandwidth'] / 1e9:.2f} GB/s")
+    return '\n'.join(lines)
+
+
+def environment_info(is_cuda=False, is_revision=True):
+    """Collect metadata about the software and hardware environment.
+
+    Parameters
+    ----------
+    is_cuda : :obj:`bool`, default=False
+        Option to name the CUDA devices. Querying the names creates a CUDA
+        context, so otherwise only the devices are counted, unless CUDA is
+        already initialized.
+    is_revision : :obj:`bool`, default=True
+        Option to look up the git revision of the package, in a subprocess.
+
+    Returns
+    -------
+    info : :obj:`dict`
+        JSON-serializable description of the host, the library versions,
+        the CPU thread settings, the number of CUDA devices and their names
+        (None if not queried), and the git revision of the package (None if
+        not looked up or unavailable).
+
+    """
+    revision = None
+    if is_revision:
+        try:
+            revision = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True,
+                text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                timeout=10, check=True).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            pass
+
+    n_cuda = torch.cuda.device_count()
+    cuda_devices = None
+    if is_cuda or torch.cuda.is_initialized():
+        cuda_devices = [torch.cuda.get_device_name(i) for i in range(n_cuda)]
+
+    info = {'hostname': socket.gethostname(),
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'torch': torch.__version__,
+            'torch_threads': torch.get_num_threads(),
+            'fft_workers': ttools.get_threads(),
+            'cuda': torch.version.cuda,
+            'cuda_count': n_cuda,
+            'cuda_devices': cuda_devices,
+            'git_revision': revision,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+    return info
+
+
+@functools.lru_cache(maxsize=None)
+def _static_info(is_cuda):
+    """Get the parts of `environment_info` that are fixed for a process."""
+    info = environment_info(is_cuda, is_revision=False)
+    for key in ['torch_threads', 'fft_workers', 'git_revision', 'timestamp']:
+        del info[key]
+    return info
+
+
+def run_metrics(n_steps, wall_time, grid_shape, device, dtype, **kwargs):
+    """Summarize the cost of a propagation, for capacity planning.
+
+    Parameters
+    ----------
+    n_steps : :obj:`int`
+        The number of time steps taken.
+    wall_time : :obj:`float`
+        The wall time [s] of the propagation.
+    grid_shape : :obj:`tuple` of :obj:`int`
+        The shape of a wavefunction component grid.
+    device : :obj:`str`
+        The device of the propagation.
+    dtype : PyTorch :obj:`dtype`
+        The complex dtype of the propagation.
+
+    Other Parameters
+    ----------------
+    peak : :obj:`dict`
+        The peak 'host' and 'device' memory [bytes]; see
+        ``memory_tools.peak_memory``.
+    is_reset : :obj:`bool`
+        Whether the host peak was reset at the start of the propagation.
+    written : :obj:`int`
+        The bytes written to disk.
+
+    Returns
+    -------
+    metrics : :obj:`dict`
+        JSON-serializable 'wall_time' [s], 'steps_per_sec', the
+        'time_per_point' [s] per grid point and time step, the 'peak_host'
+        and 'peak_device' memory [bytes] and the 'peak_scope' of the host
+        peak, {'run', 'process'}, the 'bytes_written', the 'device',
+        'dtype', 'grid', 'n_steps', 'torch_threads' and 'fft_workers', and
+        the 'environment': host, library versions and CUDA devices; see
+        `environment_info`. The CUDA devices are named only for CUDA
+        propagations, or if CUDA is already initialized.
+
+    """
+    peak = kwargs.get('peak', {})
+    points = int(np.prod(grid_shape))
+    steps = max(n_steps, 1)
+    return {'wall_time': wall_time,
+            'steps_per_sec': n_steps / wall_time if wall_time else 0.0,
+            'time_per_point': wall_time / (steps * points),
+            'peak_host': peak.get('host'), 'peak_device': peak.get('device'),
+            'peak_scope': 'run' if kwargs.get('is_reset') else 'process',
+            'bytes_written': kwargs.get('written', 0),
+            'device': str(device), 'dtype': str(dtype).replace('torch.', ''),
+            'grid': list(grid_shape), 'n_steps': n_steps,
+            'torch_threads': torch.get_num_threads(),
+            'fft_workers': ttools.get_threads(),
+            'environment': dict(_static_info(
+                torch.device(device).type == 'cuda'
+                or torch.cuda.is_initialized()))}
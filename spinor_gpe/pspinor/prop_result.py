@@ -1,4 +1,5 @@
 """prop_result.py module."""
+import json
 import os
 import warnings
 import sys
@@ -7,14 +8,21 @@ import subprocess
 import numpy as np
 from matplotlib import pyplot as plt
 from matplotlib import gridspec
-import matplotlib.animation as ani
 
 from spinor_gpe.pspinor import tensor_tools as ttools
 from spinor_gpe.pspinor import plotting_tools as ptools
+from spinor_gpe.pspinor import archive_tools as atools
+from spinor_gpe.pspinor import movie_tools as mvtools
+from spinor_gpe.pspinor import pod_tools as podtools
+from spinor_gpe.pspinor import pyramid_tools as pytools
+from spinor_gpe.pspinor.vortex_tools import VortexTracker
 
 # pylint: disable=too-many-arguments
 # pylint: disable=too-many-locals
 
+#: Version of the on-disk format written by `PropResult.save`.
+SAVE_FORMAT = 1
+
 
 class PropResult:
     """The result of propagation, with plotting and analysis tools.
@@ -25,6 +33,9 @@ class PropResult:
         The final real-space wavefunctions.
     psik : :obj:`list` of :obj:`array`
         The final momentum-space wavefunctions.
+    lean : :obj:`bool`
+        If True, only `psik` is held, and `psi`, `dens`, `densk` and `phase`
+        are recomputed on access; otherwise they are cached on first access.
     eng_final : :obj:`list`
         The energy expectation values: [<total>, <kin.>, <pot.>, <int.>].
     pops : :obj:`dict` of :obj:`array`
@@ -32,6 +43,19 @@ class PropResult:
     sampled_path : :obj:`str`
         Path to the .npz file where the sampled wavefunctions and times are
         stored for this result.
+    observables : :obj:`dict` of :obj:`array`
+        Time series of the observables evaluated during propagation, keyed
+        by name, along with their sample 'times'.
+    profile : :obj:`dict` or None
+        Per-phase timing report of a profiled propagation; see
+        ``profiling_tools.PhaseTimer.report``.
+    health : :obj:`dict` or None
+        The report of the health watchdog, if enabled; see
+        ``health_tools.Watchdog``.
+    metrics : :obj:`dict` or None
+        The cost of the propagation: wall time, throughput, peak memory,
+        bytes written, and the environment; see
+        ``profiling_tools.run_metrics``.
     dens : :obj:`list` of :obj:`array`
         The final real-space densities.
     densk : :obj:`list` of :obj:`array`
@@ -48,7 +72,7 @@ class PropResult:
     """
 
     def __init__(self, psi_final, psik_final, eng_final, pops,
-                 sampled_path=None):
+                 sampled_path=None, observables=None, lean=False):
         """Generate a PropResult instance.
 
         Parameters
@@ -65,22 +89,85 @@ class PropResult:
         sampled_path : :obj:`str`, optional
             The path to the .npz file where the sampled wavefunctions and
             times are stored for this result.
+        observables : :obj:`dict` of NumPy :obj:`array`, optional
+            The time series of the observables evaluated during propagation.
+        lean : :obj:`bool`, default=False
+            Holds only `psik`. The real-space wavefunction and the densities
+            and phases are then recomputed on every access, rather than
+            cached; `psi_final` may be None.
 
         """
-        self.psi = psi_final
+        self.lean = lean
+        self.psi = None if lean else psi_final
         self.psik = psik_final
         self.eng_final = eng_final
         self.pops = pops
         self.sampled_path = sampled_path
-
-        self.dens = ttools.density(self.psi)
-        self.densk = ttools.density(self.psik)
-        self.phase = ttools.phase(self.psi, uwrap=False, dens=self.dens)
+        if observables is None:
+            observables = {}
+        self.observables = observables
+        self.profile = None
+        self.health = None
+        self.metrics = None
+        self._densk = None
+        self._pyramid = None
 
         self.paths = dict()
         self.time_scale = None
         self.space = dict()
 
+    @property
+    def psi(self):
+        """Get the final real-space wavefunction.
+
+        Computed from `psik` when it is not held, i.e. in `lean` mode.
+
+        """
+        if self._psi is None:
+            psi = ttools.ifft_nd(self.psik, self.space['dr'])
+            if self.lean:
+                return psi
+            self._psi = psi
+        return self._psi
+
+    @psi.setter
+    def psi(self, arrays):
+        """Set the `psi` attribute, and reset its derived quantities."""
+        self._psi = arrays
+        self._dens = None
+        self._phase = None
+
+    @property
+    def dens(self):
+        """Get the final real-space densities, computed on first access."""
+        if self._dens is None:
+            dens = ttools.density(self.psi)
+            if self.lean:
+                return dens
+            self._dens = dens
+        return self._dens
+
+    @property
+    def densk(self):
+        """Get the final momentum-space densities, computed on first access."""
+        if self._densk is None:
+            densk = ttools.density(self.psik)
+            if self.lean:
+                return densk
+            self._densk = densk
+        return self._densk
+
+    @property
+    def phase(self):
+        """Get the final real-space phases, computed on first access."""
+        if self._phase is None:
+            psi = self.psi
+            phase = ttools.phase(psi, uwrap=False, dens=ttools.density(psi))
+            if self.lean:
+                return phase
+            self._phase = phase
+        return self._phase
+
     def calc_separation(self):
         """Calculate the phase separation of the two spin components."""
         s = 1 - (np.sum(ttools.prod(self.dens))
@@ -111,13 +198,7 @@ class PropResult:
             A zoom factor for the k-space density plot.
 
         """
-        r_sizes = self.space['r_sizes']
-        r_extent = np.ravel(np.vstack((-r_sizes, r_sizes)).T) / rscale
-
-        k_sizes = self.space['k_sizes']
-        k_extent = np.ravel(np.vstack((-k_sizes, k_sizes)).T) / kscale
-
-        extents = {'r': r_extent, 'k': k_extent}
+        extents = self._extents(rscale, kscale)
 
         fig, all_plots = ptools.plot_spins(self.psi, self.psik, extents,
                                            self.paths, cmap=cmap, save=save,
@@ -149,18 +230,22 @@ class PropResult:
             A zoom factor for the k-space density plot.
 
         """
+        extents = self._extents(rscale, kscale)
+
+        fig, all_plots = ptools.plot_total(self.psi, self.psik, extents,
+                                           self.paths, cmap=cmap, save=save,
+                                           ext=ext, show=show, zoom=zoom)
+        return fig, all_plots
+
+    def _extents(self, rscale=1.0, kscale=1.0):
+        """Get the scaled real- and momentum-space extents of the plots."""
         r_sizes = self.space['r_sizes']
         r_extent = np.ravel(np.vstack((-r_sizes, r_sizes)).T) / rscale
 
         k_sizes = self.space['k_sizes']
         k_extent = np.ravel(np.vstack((-k_sizes, k_sizes)).T) / kscale
 
-        extents = {'r': r_extent, 'k': k_extent}
-
-        fig, all_plots = ptools.plot_total(self.psi, self.psik, extents,
-                                           self.paths, cmap=cmap, save=save,
-                                           ext=ext, show=show, zoom=zoom)
-        return fig, all_plots
+        return {'r': r_extent, 'k': k_extent}
 
     def plot_eng(self):
         """Plot the sampled energy expectation values."""
@@ -213,14 +298,86 @@ class PropResult:
             plt.savefig(file_name)
         plt.show()
 
-    def analyze_vortex(self):
-        """Compute the total vorticity in each spin component."""
-        raise NotImplementedError()
+    def analyze_vortex(self, dens_cut=1e-2):
+        """Compute the total vorticity in each spin component.
+
+        Parameters
+        ----------
+        dens_cut : :obj:`float`, default=1e-2
+            Relative density below which phase singularities are ignored.
+            See ``tensor_tools.find_vortices``.
+
+        Returns
+        -------
+        vorticity : :obj:`list` of :obj:`int`
+            The sum of the vortex winding numbers in each spin component.
+
+        """
+        origin = (self.space['x'][0], self.space['y'][0])
+        vorticity = [int(np.sum(ttools.find_vortices(p, self.space['dr'],
+                                                     origin, dens_cut)[1]))
+                     for p in self.psi]
+        return vorticity
+
+    def track_vortices(self, spin=0, max_dist=None, dens_cut=1e-2):
+        """Link the vortices of the sampled wavefunctions into trajectories.
+
+        The sampled archive is streamed one frame at a time: each frame is
+        transformed to real space, its vortices are located, and they are
+        linked to the previous frame's vortices by nearest-neighbour
+        assignment. The full set of frames is never held in memory.
+
+        Parameters
+        ----------
+        spin : :obj:`int`, default=0
+            The spin component in which to track vortices.
+        max_dist : :obj:`float`, optional
+            The maximum distance [a_x] a vortex may move between consecutive
+            samples. Defaults to five times the largest mesh spacing.
+        dens_cut : :obj:`float`, default=1e-2
+            Relative density below which phase singularities are ignored.
+
+        Returns
+        -------
+        tracks : :obj:`dict` of NumPy :obj:`array`
+            The trajectory arrays, see ``vortex_tools.VortexTracker.result``,
+            along with the sampled 'times'.
+
+        """
+        if not os.path.exists(str((self.sampled_path))):
+            warnings.warn("Cannot track vortices. No sampled wavefunction "
+                          "data exists.")
+            return None
+        if atools.sample_key(self.sampled_path) != 'psiks':
+            warnings.warn("Cannot track vortices. The full momentum-space "
+                          "wavefunction was not sampled.")
+            return None
+
+        delta_r = self.space['dr']
+        origin = (self.space['x'][0], self.space['y'][0])
+        if max_dist is None:
+            max_dist = 5 * np.max(delta_r)
+
+        tracker = VortexTracker(max_dist)
+        for psik in atools.iter_samples(self.sampled_path):
+            psi = ttools.ifft_nd([psik[spin]], delta_r)[0]
+            tracker.update(*ttools.find_vortices(psi, delta_r, origin,
+                                                 dens_cut))
+
+        tracks = tracker.result()
+        with np.load(self.sampled_path) as sampled:
+            tracks['times'] = sampled['times']
+        return tracks
 
     def make_movie(self, rscale=1.0, kscale=1.0, cmap='viridis', play=False,
-                   zoom=1.0, norm_type='all'):
+                   zoom=1.0, norm_type='all', **kwargs):
         """Generate a movie of the wavefunctions' densities and phases.
 
+        The sampled frames are transformed and downsampled to display
+        resolution in batches on the device, rendered in parallel worker
+        processes, and encoded by a single ffmpeg process; see
+        ``movie_tools.render_movie``.
+
         Parameters
         ----------
         rscale : :obj:`float`, optional
@@ -234,65 +391,50 @@ class PropResult:
         play : :obj:`bool`, default=False
             If True, the movie is opened in the computer's default media
             player after it is saved.
-        kzoom : :obj:`float`, optional
+        zoom : :obj:`float`, optional
             A zoom factor for the k-space density plot.
         norm_type : :obj:`str`, optional
             {'all', 'half'} Normalizes the colormaps to the full or half sum
             of the max densites. 'half' is useful for visualizing situations
             where the population is equally divided between the two spins.
 
-        """
-        def animate(frame, n_total, val):
-            global timelast, timethis
-            psik = psiks[frame]
-            psi = ttools.ifft_2d(psik, self.space['dr'])
-
-            dens = ttools.density(psi)
-            phase = ttools.phase(psi, uwrap=False, dens=dens)
-            densk = ttools.density(psik)
-            max_r = [np.max(d) for d in dens]
-            max_k = [np.max(d) for d in densk]
-
-            any(plot.set_data(d) for plot, d in zip(all_plots['r'], dens))
-            any(plot.set_data(ph) for plot, ph in zip(all_plots['ph'], phase))
-            any(plot.set_data(dk) for plot, dk in zip(all_plots['k'], densk))
+        Other Parameters
+        ----------------
+        fps, dpi, resolution, device, n_workers, progress
+            See ``movie_tools.render_movie``.
 
-            any(plot.set_clim(0, sum(max_r) / val) for plot in all_plots['r'])
-            any(plot.set_clim(0, sum(max_k) / val) for plot in all_plots['k'])
-
-            ptools.progress_message(frame, n_total)
+        Returns
+        -------
+        file_name : :obj:`str` or None
+            The path of the saved movie.
 
+        """
         if not os.path.exists(str((self.sampled_path))):
             warnings.warn("Cannot generate propagation movie. No sampled "
                           "wavefuntion data exists.")
-            return
+            return None
+        if atools.sample_key(self.sampled_path) != 'psiks':
+            warnings.warn("Cannot generate propagation movie. The full "
+                          "momentum-space wavefunction was not sampled.")
+            return None
+        ptools.check_2d(self.psik[0], 'The propagation movie')
+        if mvtools.ffmpeg_path() is None:
+            warnings.warn("Cannot generate propagation movie. The ffmpeg "
+                          "executable was not found.")
+            return None
 
         if norm_type == 'all':
             norm_val = 1.0
         elif norm_type == 'half':
             norm_val = 2.0
 
-        with np.load(self.sampled_path) as sampled:
-            times = sampled['times']
-            psiks = sampled['psiks']
-            # ??? Need to rebin grids for speed?
-
-        n_samples = len(times)
-        writer = ani.writers['ffmpeg'](fps=5, bitrate=-1)
-        fig, all_plots = self.plot_spins(rscale, kscale, cmap, save=False,
-                                         show=False, zoom=zoom)
-
-        # Create and then save the animation
-        anim = ani.FuncAnimation(fig, animate, frames=n_samples, blit=False,
-                                 fargs=(n_samples, norm_val,))
-
-        # Save animation
         test_name = self.paths['data'] + 'prop_movie'
         file_name = ptools.next_available_path(test_name,
                                                self.paths['folder'],
                                                '.mp4')
-        anim.save(file_name, writer=writer)
-        plt.close(fig)
+        mvtools.render_movie(self.sampled_path, file_name, self.space['dr'],
+                             self._extents(rscale, kscale), cmap, zoom,
+                             norm_val, **kwargs)
 
         if play:
             if sys.platform == "win32":
@@ -300,6 +442,229 @@ class PropResult:
             else:
                 opener ="open" if sys.platform == "darwin" else "xdg-open"
                 subprocess.call([opener, file_name])
+        return file_name
+
+    def compress_samples(self, tol=1e-6, keep=True, **kwargs):
+        """Compress the sampled archive to a truncated POD basis.
+
+        The result then refers to the compressed archive, whose frames are
+        reconstructed on demand by `make_movie`, `track_vortices` and
+        ``archive_tools.iter_samples``.
+
+        Parameters
+        ----------
+        tol : :obj:`float`, default=1e-6
+            The largest fraction of the total energy of the sampled frames
+            that is discarded.
+        keep : :obj:`bool`, default=True
+            Keep the uncompressed archive; otherwise it is deleted.
+
+        Other Parameters
+        ----------------
+        max_modes, batch_size, out_path
+            See ``pod_tools.compress``.
+
+        Returns
+        -------
+        report : :obj:`dict` or None
+            The number of modes, the storage ratio and the reconstruction
+            errors; see ``pod_tools.compress``.
+
+        """
+        if not os.path.exists(str((self.sampled_path))):
+            warnings.warn("Cannot compress the samples. No sampled "
+                          "wavefunction data exists.")
+            return None
+        report = podtools.compress(self.sampled_path, tol, **kwargs)
+        if not keep:
+            os.remove(self.sampled_path)
+        self.sampled_path = report['path']
+        return report
+
+    def build_pyramid(self, tile=pytools.TILE, **kwargs):
+        """Build a multi-resolution tile pyramid of the sampled frames.
+
+        Full momentum-space samples are shown in real space. The pyramid is
+        stored next to the sampled archive, and read by `view`.
+
+        Parameters
+        ----------
+        tile : :obj:`int`, default=256
+            The size of the tiles along each axis.
+
+        Other Parameters
+        ----------------
+        device, batch_size
+            See ``pyramid_tools.build``.
+
+        Returns
+        -------
+        pyramid : ``pyramid_tools.Pyramid`` or None
+
+        """
+        if not os.path.exists(str((self.sampled_path))):
+            warnings.warn("Cannot build the pyramid. No sampled wavefunction "
+                          "data exists.")
+            return None
+        ptools.check_2d(self.psik[0], 'The frame pyramid')
+        info = atools.sample_info(self.sampled_path)
+        extent = info.get('extent', self._extents()['r'])
+        self._pyramid = pytools.build(self.sampled_path, self.space['dr'],
+                                      extent, tile, **kwargs)
+        return self._pyramid
+
+    def view(self, frame, quantity='dens', region=None, size=512):
+        """Get a sampled frame within a viewport, from the tile pyramid.
+
+        Only the tiles of the coarsest level that resolves the viewport with
+        `size` pixels are read, so frames can be browsed interactively; see
+        ``pyramid_tools.Pyramid.view``.
+
+        Parameters
+        ----------
+        frame : :obj:`int`
+            The index of the sampled frame.
+        quantity : :obj:`str`, default='dens'
+            'dens' or 'phase'.
+        region : :obj:`iterable` of :obj:`float`, optional
+            The viewport, [x_min, x_max, y_min, y_max]. Defaults to the
+            whole frame.
+        size : :obj:`int`, default=512
+            The number of display pixels along the longer axis of the
+            viewport.
+
+        Returns
+        -------
+        image : NumPy :obj:`array`
+            The (2, ny, nx) grids of both spin components.
+        extent : NumPy :obj:`array`
+            The extent of the grids, for ``matplotlib.pyplot.imshow``.
+
+        """
+        folder = pytools.pyramid_path(str(self.sampled_path))
+        if self._pyramid is None or self._pyramid.folder != folder:
+            if not os.path.exists(folder):
+                warnings.warn("Cannot view the sampled frames. Build their "
+                              "pyramid first, with `build_pyramid`.")
+                return None
+            self._pyramid = pytools.Pyramid(folder)
+        return self._pyramid.view(frame, quantity, region, size)
+
+    def save(self, path=None):
+        """Save the result to a directory, to be reopened with `load`.
+
+        Each large array (`psik`, `psi` if it is held, the populations and
+        the observables) is stored as a separate .npy file, so that `load`
+        can memory-map it. The energies, `paths`, `space`, `profile`,
+        `health`, `metrics`, and the path to the sampled-wavefunction archive
+        are stored in meta.json. The archive itself is linked, not copied.
+        The `space` meshes are recomputed on loading.
+
+        Parameters
+        ----------
+        path : :obj:`str`, optional
+            The directory to save to. Defaults to the next available
+            /`data_path`/prop_result%s-`trial_name`/ directory.
+
+        Returns
+        -------
+        path : :obj:`str`
+            The directory of the saved result.
+
+        """
+        if path is None:
+            path = ptools.next_available_path(
+                self.paths['data'] + 'prop_result', self.paths['folder'])
+        os.makedirs(path, exist_ok=True)
+
+        arrays = {'psik': self.psik}
+        if self._psi is not None:
+            arrays['psi'] = self._psi
+        arrays.update({'pops_' + key: val for key, val in self.pops.items()})
+        arrays.update({'obs_' + key: val
+                       for key, val in self.observables.items()})
+        for name, arr in arrays.items():
+            np.save(os.path.join(path, name + '.npy'), np.asarray(arr))
+
+        sampled_path = self.sampled_path
+        if sampled_path is not None:
+            sampled_path = os.path.abspath(sampled_path)
+        space = {key: np.asarray(val).tolist()
+                 for key, val in self.space.items()
+                 if key not in ['x_mesh', 'y_mesh', 'kx_mesh', 'ky_mesh']}
+        meta = {'format': SAVE_FORMAT, 'arrays': sorted(arrays),
+                'eng_final': np.asarray(self.eng_final).tolist(),
+                'sampled_path': sampled_path, 'lean': self.lean,
+                'paths': self.paths, 'time_scale': self.time_scale,
+                'space': space, 'profile': self.profile,
+                'health': self.health, 'metrics': self.metrics}
+        with open(os.path.join(path, 'meta.json'), 'w',
+                  encoding='utf-8') as file:
+            json.dump(meta, file, indent=1, default=lambda obj: obj.item())
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a result saved with `save`.
+
+        Parameters
+        ----------
+        path : :obj:`str`
+            The directory of the saved result.
+        mmap : :obj:`bool`, default=True
+            Memory-maps the large arrays read-only, so that they are only
+            read from disk as they are accessed. Otherwise they are read
+            into memory.
+
+        Returns
+        -------
+        result : :obj:`PropResult`
+            The reopened result.
+
+        Raises
+        ------
+        ValueError
+            If the result was saved in a newer format than this version
+            reads.
+
+        """
+        with open(os.path.join(path, 'meta.json'),
+                  encoding='utf-8') as file:
+            meta = json.load(file)
+        if meta['format'] > SAVE_FORMAT:
+            raise ValueError(f"The result in {path} has format "
+                             f"{meta['format']}, newer than the supported "
+                             f"format {SAVE_FORMAT}; update spinor_gpe to "
+                             "load it.")
+        arrays = {name: np.load(os.path.join(path, name + '.npy'),
+                                mmap_mode='r' if mmap else None)
+                  for name in meta['arrays']}
+
+        def group(prefix):
+            return {name[len(prefix):]: arr for name, arr in arrays.items()
+                    if name.startswith(prefix)}
+
+        psi = arrays.get('psi')
+        if psi is not None:
+            psi = list(psi)
+        result = cls(psi, list(arrays['psik']), meta['eng_final'],
+                     group('pops_'), meta['sampled_path'], group('obs_'),
+                     meta['lean'])
+        result.profile = meta['profile']
+        result.health = meta.get('health')
+        result.metrics = meta.get('metrics')
+        result.paths = meta['paths']
+        result.time_scale = meta['time_scale']
+
+        result.space = {key: np.array(val) if isinstance(val, list) else val
+                        for key, val in meta['space'].items()}
+        axes = ['x', 'y'][:len(result.space['dr'])]
+        for prefix in ['', 'k']:
+            meshes = np.meshgrid(*[result.space[prefix + name]
+                                   for name in axes], sparse=True)
+            result.space.update({prefix + name + '_mesh': mesh
+                                 for name, mesh in zip(axes, meshes)})
+        return result
 
     def rebin(self, arr, new_shape=(256, 256)):
         """Rebin a 2D `arr` to shape `new_shape` by averaging.
@@ -314,15 +679,10 @@ class PropResult:
         new_shape : :obj:`iterable`, default=(256, 256)
             The target rebinned shape.
 
+        See Also
+        --------
+        plotting_tools.rebin : Rebinning of arbitrary shapes.
+
         """
         assert arr[0].shape == arr[1].shape
-        new_arr = [0, 0]
-        curr_shape = arr[0].shape
-        if new_shape < curr_shape:
-            for i, a in enumerate(arr):
-                shape = (new_shape[0], a.shape[0] // new_shape[0],
-                         new_shape[1], a.shape[1] // new_shape[1])
-                new_arr[i] = a.reshape(shape).mean(-1).mean(1)
-        else:
-            new_arr = arr
-        return new_arr
+        return [ptools.rebin(a, new_shape) for a in arr]
@@ -1,5 +1,6 @@
 """Base class for pseudospinor GPE propagation."""
 
+import functools
 import os
 import shutil
 import warnings
@@ -13,9 +14,99 @@ from definitions import ROOT_DIR
 # pylint: disable=import-error
 import spinor_gpe.constants as const
 from spinor_gpe.pspinor import tensor_tools as ttools
+from spinor_gpe.pspinor import grid_tools as gtools
 from spinor_gpe.pspinor import plotting_tools as ptools
+from spinor_gpe.pspinor import memory_tools as mtools
+from spinor_gpe.pspinor import sampling_tools as smtools
+from spinor_gpe.pspinor import separable_tools as sptools
 from spinor_gpe.pspinor import tensor_propagator as tprop
 
+#: The names of the spatial axes, in the order of `mesh_points`.
+AXES = ('x', 'y')
+
+#: The number of distinct (`mesh_points`, `r_sizes`) grids kept in the
+#: process-wide grid cache, in addition to those still held by a `PSpinor`.
+GRID_CACHE_SIZE = 4
+
+
+def _read_only(array):
+    """Mark a cached `array` as read-only, so that it can be shared."""
+    array.setflags(write=False)
+    return array
+
+
+@functools.lru_cache(maxsize=GRID_CACHE_SIZE)
+def _spatial_grids(mesh_points, r_sizes):
+    """Compute the read-only spatial grids; see `compute_spatial_grids`."""
+    assert all(point % 2 == 0 for point in mesh_points), (
+        f"Number of mesh points {mesh_points} should be powers of 2.")
+    assert len(mesh_points) in (1, 2), ("Only 1D and 2D grids are "
+                                        "supported.")
+    assert len(r_sizes) == len(mesh_points), (
+        f"`r_sizes` {r_sizes} and `mesh_points` {mesh_points} must have the "
+        "same length.")
+    mesh_points = np.array(mesh_points)
+    r_sizes = np.array(r_sizes)
+    space = {}
+
+    # Spacing between real-space mesh points [a_x]
+    space['dr'] = 2 * r_sizes / mesh_points
+    # Half size of the grid along the kx- and ky- axes [1/a_x]
+    k_sizes = np.pi / space['dr']
+    # Spacing between momentum-space mesh points [1/a_x]
+    space['dk'] = np.pi / r_sizes
+
+    # Linear arrays for real- [a_x] and k-space [1/a_x], x- and y-axes
+    axes = AXES[:len(mesh_points)]
+    for axis, name in enumerate(axes):
+        space[name] = PSpinor._compute_lin(r_sizes, mesh_points, axis=axis)
+        space['k' + name] = PSpinor._compute_lin(k_sizes, mesh_points,
+                                                 axis=axis)
+
+    # Sparse meshes for computing the energy grids [a_x] and [1/a_x]
+    meshes = np.meshgrid(*[space[name] for name in axes], sparse=True)
+    k_meshes = np.meshgrid(*[space['k' + name] for name in axes],
+                           sparse=True)
+    for name, mesh, k_mesh in zip(axes, meshes, k_meshes):
+        space.update({name + '_mesh': mesh, 'k' + name + '_mesh': k_mesh})
+
+    # ??? Add functionality for Tukey filter window?
+
+    # Real-space volume element used for normalization [a_x^2]
+    space['dv_r'] = np.prod(space['dr'])
+    # k-space volume element used for normalization [1/a_x^2]
+    space['dv_k'] = np.prod(space['dk'])
+
+    space['mesh_points'] = mesh_points
+    space['r_sizes'] = r_sizes
+    space['k_sizes'] = k_sizes
+    return {key: _read_only(val) if isinstance(val, np.ndarray) else val
+            for key, val in space.items()}
+
+
+@functools.lru_cache(maxsize=GRID_CACHE_SIZE)
+def _harmonic_pot(mesh_points, r_sizes, y_trap):
+    """Compute the separable harmonic potential energy grid."""
+    space = _spatial_grids(mesh_points, r_sizes)
+    traps = zip(AXES[:len(mesh_points)], (1.0, y_trap))
+    return sptools.SepSum([_read_only((trap * space[name + '_mesh'])**2 / 2)
+                           for name, trap in traps], mesh_points[::-1])
+
+
+@functools.lru_cache(maxsize=GRID_CACHE_SIZE)
+def _free_kin_eng(mesh_points, r_sizes):
+    """Compute the separable free-particle kinetic energy grid."""
+    space = _spatial_grids(mesh_points, r_sizes)
+    return sptools.SepSum([_read_only(space['k' + name + '_mesh']**2 / 2)
+                           for name in AXES[:len(mesh_points)]],
+                          mesh_points[::-1])
+
+
+def clear_grid_cache():
+    """Release the grids held by the process-wide grid cache."""
+    for func in [_spatial_grids, _harmonic_pot, _free_kin_eng]:
+        func.cache_clear()
+
 
 # pylint: disable=too-many-public-methods
 class PSpinor:
@@ -62,6 +153,11 @@ class PSpinor:
         | Other:             |                'mesh_points'                |
         +--------------------+----------+----------+-----------+-----------+
 
+        A quasi-1D grid has only the x-axis arrays and meshes. The 2D
+        meshes are sparse, of shapes (1, Nx) and (Ny, 1), and broadcast
+        against each other and against the grids.
+    n_dims : :obj:`int`
+        The number of grid dimensions, 1 (quasi-1D) or 2.
     pop_frac : :obj:`iterable`
         The initial population fraction in each spin component.
     omeg : :obj:`dict`
@@ -90,7 +186,10 @@ class PSpinor:
         complex.
     psik : :obj:`list` of :obj:`array`
         A :obj:`list` of 2D momentum-space spin component wavefunctions;
-        generally complex.
+        generally complex. After a propagation, the wavefunction and the
+        grids stay loaded on the device, and the next propagation continues
+        from them unless `psi`, `psik` or the energy grids have been
+        reassigned; see `release_session`.
     is_coupling : :obj:`bool`
         Signals the presence of direct coupling between spin components.
     kL_recoil : :obj:`float`
@@ -133,9 +232,12 @@ class PSpinor:
             symmetric, i.e. ud == du.
         mesh_points : :obj:`iterable` of :obj:`int`, default=(256, 256)
             The number of grid points along the x- and y-axes, respectively.
+            A single value, e.g. ``(1024,)``, sets up a quasi-1D condensate
+            along the x-axis.
         r_sizes : :obj:`iterable` of :obj:`int`, default=(16, 16)
             The half size of the real space grid along the x- and y-axes,
-            respectively, in units of [a_x].
+            respectively, in units of [a_x]. Has the same length as
+            `mesh_points`.
         atom_num : :obj:`int`, default=1e4
             Total atom number.
         pop_frac : :obj:`array_like` of :obj:`float`, default=(0.5, 0.5)
@@ -151,15 +253,44 @@ class PSpinor:
             attempts to overwrite a directory `path` already containing data.
             `overwrite` gives the user the option to overwrite the data with
             every new instance.
-
+        mem_check : :obj:`str`, optional
+            {'warn', 'raise', 'ignore'} Action taken when the estimated peak
+            memory of creating the grids, or later of a propagation, exceeds
+            the memory budget. 'raise' raises a :obj:`MemoryError` before
+            anything is allocated. Default is 'warn'.
+        mem_budget : :obj:`int`, optional
+            The memory budget [bytes]. By default, the memory currently
+            available on the host or device is used.
+        save_tf : :obj:`bool`, optional
+            Saves the initial Thomas-Fermi wavefunction to
+            trial_data/tf_wf-`folder_name`.npz when it is computed. Default
+            is False.
+
+        Notes
+        -----
+        The spatial and energy grids are shared between all `PSpinor`
+        instances with the same `mesh_points` and `r_sizes`, through a
+        process-wide cache, and are read-only; to change them, assign new
+        arrays. The energy grids, the Thomas-Fermi wavefunction, and the
+        coupling and detuning grids are only computed when first accessed.
 
         """
-        phase_factor = kwargs.get('phase_factor', 1)
+        self._phase_factor = kwargs.get('phase_factor', 1)
+        assert abs(self._phase_factor) == 1.0, ("Relative phase factor must "
+                                                "have unit magnitude.")
+        self.save_tf = kwargs.get('save_tf', False)
         overwrite = kwargs.get('overwrite', False)
+        self.mem_check = kwargs.get('mem_check', 'warn')
+        self.mem_budget = kwargs.get('mem_budget', None)
+        estimate = mtools.estimate_memory(mesh_points)
+        mtools.check_memory(estimate['breakdown']['pspinor_init'],
+                            self._mem_available('cpu'), self.mem_check,
+                            f"A PSpinor with {tuple(mesh_points)} points")
         # pylint: disable=too-many-arguments
         self.setup_data_path(path, overwrite)
 
         self.atom_num = atom_num
+        self.n_dims = len(mesh_points)
         self.space = {}
 
         assert sum(pop_frac) == 1.0, "Total population must equal 1."
@@ -185,14 +316,17 @@ class PSpinor:
             self.g_sc = g_sc
         self.compute_tf_params()
         self.compute_spatial_grids(mesh_points, r_sizes)
-        self.compute_energy_grids()
-        self.compute_tf_psi(phase_factor)
+        # Grids computed on first access
+        self._pot_eng, self._pot_eng_spin = None, None
+        self._kin_eng, self._kin_eng_spin = None, None
+        self._psi, self._psik, self._heal = None, None, None
+        # Propagator and grids kept on the device between propagations
+        self._session = None
+        self._coupling, self._detuning = None, None
         self.no_coupling_setup()
 
         self.rand_seed = None
         self.prop = None
-        self.coupling = np.zeros(np.flip(mesh_points))
-        self.detuning = np.zeros(np.flip(mesh_points))
         self.rot_coupling = True
 
     def setup_data_path(self, path, overwrite):
@@ -271,14 +405,80 @@ class PSpinor:
         self.psi[1] = self.psi[1] * phase_factor
 
         self.psi, _ = ttools.norm(self.psi, self.space['dv_r'], self.atom_num)
-        self.psik = ttools.fft_2d(self.psi, self.space['dr'])
+        self.psik = ttools.fft_nd(self.psi, self.space['dr'])
 
-        self.heal = [(8*np.pi * np.max(np.abs(p)**2) * self.a_sc)**(-1/2) for p
-                     in self.psi]
+        self._heal = self._calc_heal(self.psi)
 
         # Saves the real- and k-space versions of the Thomas-Fermi wavefunction
-        np.savez(self.paths['trial'] + 'tf_wf-' + self.paths['folder'],
-                 psi=self.psi, psik=self.psik)
+        if self.save_tf:
+            np.savez(self.paths['trial'] + 'tf_wf-' + self.paths['folder'],
+                     psi=self.psi, psik=self.psik)
+
+    @property
+    def psi(self):
+        """Get the `psi` attribute.
+
+        Defaults to the Thomas-Fermi wavefunction, or else the inverse FFT of
+        `psik` if only it has been set.
+
+        """
+        self._pull()
+        if self._psi is None:
+            if self._psik is None:
+                self.compute_tf_psi(self._phase_factor)
+            else:
+                self._psi = ttools.ifft_nd(self._psik, self.space['dr'])
+        return self._psi
+
+    @psi.setter
+    def psi(self, arrays):
+        """Set the `psi` attribute."""
+        self._psi = arrays
+        self._desync()
+
+    @property
+    def psik(self):
+        """Get the `psik` attribute.
+
+        Defaults to the FFT of the Thomas-Fermi wavefunction, or else of
+        `psi` if only it has been set.
+
+        """
+        self._pull()
+        if self._psik is None:
+            if self._psi is None:
+                self.compute_tf_psi(self._phase_factor)
+            else:
+                self._psik = ttools.fft_nd(self._psi, self.space['dr'])
+        return self._psik
+
+    @psik.setter
+    def psik(self, arrays):
+        """Set the `psik` attribute."""
+        self._psik = arrays
+        self._desync()
+
+    def _desync(self):
+        """Mark the wavefunction on the device as out of date."""
+        if self._session is not None:
+            self._session['synced'] = False
+            self._session['ahead'] = False
+
+    @property
+    def heal(self):
+        """Get the healing length of each spin component, [a_x].
+
+        Computed from the peak density of `psi` when first accessed.
+
+        """
+        if self._heal is None:
+            self._heal = self._calc_heal(self.psi)
+        return self._heal
+
+    def _calc_heal(self, psi):
+        """Compute the healing length of each component of `psi`, [a_x]."""
+        return [(8*np.pi * np.max(np.abs(p)**2) * self.a_sc)**(-1/2)
+                for p in psi]
 
     def compute_tf_params(self, species='Rb87'):
         """Compute parameters and scales for the Thomas-Fermi solution.
@@ -289,6 +489,13 @@ class PSpinor:
             Designates the atomic species and corresponding physical data
             used in the simulations.
 
+        Notes
+        -----
+        On a 1D grid the condensate is quasi-1D, tightly confined along the
+        y- and z-axes, and the interaction strengths are reduced to
+        g_1D = 2 * a_sc * sqrt(omeg['y'] * omeg['z']) / omeg['x'], in units of
+        [\\hbar * omeg['x'] * a_x].
+
         """
         # Relative size of y-axis trapping frequency relative to x-axis.
         y_trap = self.omeg['y'] / self.omeg['x']
@@ -303,10 +510,16 @@ class PSpinor:
         else:
             self.a_sc = 1
 
-        self.chem_pot = ((4 * self.atom_num * self.a_sc * y_trap
-                          * np.sqrt(z_trap / (2 * np.pi)))**(1/2))
+        if self.n_dims == 1:
+            # Quasi-1D: the y- and z-axes are frozen to their ground states.
+            g_scale = 2 * np.sqrt(y_trap * z_trap) * self.a_sc
+            self.chem_pot = ((3 * self.atom_num * g_scale
+                              / (4 * np.sqrt(2)))**(2/3))
+        else:
+            self.chem_pot = ((4 * self.atom_num * self.a_sc * y_trap
+                              * np.sqrt(z_trap / (2 * np.pi)))**(1/2))
+            g_scale = np.sqrt(8 * z_trap * np.pi) * self.a_sc
 
-        g_scale = np.sqrt(8 * z_trap * np.pi) * self.a_sc
         self.g_sc.update({k: g_scale * self.g_sc[k] for k in self.g_sc.keys()})
         self.rad_tf = np.sqrt(2 * self.chem_pot)
 
@@ -327,41 +540,16 @@ class PSpinor:
             The half size of the grid along the real x- and y-axes,
             respectively,in units of [a_x].
 
-        """
-        assert all(point % 2 == 0 for point in mesh_points), (
-            f"Number of mesh points {mesh_points} should be powers of 2.")
-        mesh_points = np.array(mesh_points)
-        r_sizes = np.array(r_sizes)
+        Notes
+        -----
+        The grids are read-only, and shared through a process-wide cache with
+        all other `PSpinor` instances with the same `mesh_points` and
+        `r_sizes`.
 
-        # Spacing between real-space mesh points [a_x]
-        self.space['dr'] = 2 * r_sizes / mesh_points
-        # Half size of the grid along the kx- and ky- axes [1/a_x]
-        k_sizes = np.pi / self.space['dr']
-        # Spacing between momentum-space mesh points [1/a_x]
-        self.space['dk'] = np.pi / r_sizes
-
-        # Linear arrays for real- [a_x] and k-space [1/a_x], x- and y-axes
-        self.space['x'] = self._compute_lin(r_sizes, mesh_points, axis=0)
-        self.space['y'] = self._compute_lin(r_sizes, mesh_points, axis=1)
-        self.space['kx'] = self._compute_lin(k_sizes, mesh_points, axis=0)
-        self.space['ky'] = self._compute_lin(k_sizes, mesh_points, axis=1)
-
-        # 2D meshes for computing the energy grids [a_x] and [1/a_x]
-        x_mesh, y_mesh = np.meshgrid(self.space['x'], self.space['y'])
-        kx_mesh, ky_mesh = np.meshgrid(self.space['kx'], self.space['ky'])
-        self.space.update({'x_mesh': x_mesh, 'y_mesh': y_mesh})
-        self.space.update({'kx_mesh': kx_mesh, 'ky_mesh': ky_mesh})
-
-        # ??? Add functionality for Tukey filter window?
-
-        # Real-space volume element used for normalization [a_x^2]
-        self.space['dv_r'] = np.prod(self.space['dr'])
-        # k-space volume element used for normalization [1/a_x^2]
-        self.space['dv_k'] = np.prod(self.space['dk'])
-
-        self.space['mesh_points'] = mesh_points
-        self.space['r_sizes'] = r_sizes
-        self.space['k_sizes'] = k_sizes
+        """
+        mesh_points = tuple(int(point) for point in mesh_points)
+        r_sizes = tuple(float(size) for size in r_sizes)
+        self.space = dict(_spatial_grids(mesh_points, r_sizes))
 
     @classmethod
     def _compute_lin(cls, sizes, points, axis=0):
@@ -384,9 +572,15 @@ class PSpinor:
     def pot_eng(self):
         r"""Get the `pot_eng` attribute.
 
-        2D potential energy grid, [\\hbar * omeg['x']].
+        2D potential energy grid, [\\hbar * omeg['x']]. Defaults to the
+        harmonic trap, computed when first accessed and kept as a separable
+        :obj:`SepSum` of its x- and y-terms; see ``separable_tools``. Any
+        array may be assigned instead.
 
         """
+        if self._pot_eng is None:
+            self.pot_eng = _harmonic_pot(*self._grid_key,
+                                         self.omeg['y'] / self.omeg['x'])
         return self._pot_eng
 
     @pot_eng.setter
@@ -399,9 +593,13 @@ class PSpinor:
     def kin_eng(self):
         r"""Get the `kin_eng` attribute.
 
-        2D kinetic energy grid, [\\hbar * omeg['x']]0
+        2D kinetic energy grid, [\\hbar * omeg['x']]. Defaults to the
+        free-particle dispersion, computed when first accessed and kept as a
+        separable :obj:`SepSum`.
 
         """
+        if self._kin_eng is None:
+            self.kin_eng = _free_kin_eng(*self._grid_key)
         return self._kin_eng
 
     @kin_eng.setter
@@ -410,6 +608,41 @@ class PSpinor:
         self._kin_eng = array
         self.kin_eng_spin = [self._kin_eng] * 2
 
+    @property
+    def pot_eng_spin(self):
+        """Get the `pot_eng_spin` attribute."""
+        if self._pot_eng_spin is None:
+            self.pot_eng_spin = [self.pot_eng] * 2
+        return self._pot_eng_spin
+
+    @pot_eng_spin.setter
+    def pot_eng_spin(self, arrays):
+        """Set the `pot_eng_spin` attribute."""
+        self._pot_eng_spin = arrays
+
+    @property
+    def kin_eng_spin(self):
+        """Get the `kin_eng_spin` attribute."""
+        if self._kin_eng_spin is None:
+            self.kin_eng_spin = [self.kin_eng] * 2
+        return self._kin_eng_spin
+
+    @kin_eng_spin.setter
+    def kin_eng_spin(self, arrays):
+        """Set the `kin_eng_spin` attribute."""
+        self._kin_eng_spin = arrays
+
+    @property
+    def _grid_shape(self):
+        """The (Ny, Nx) shape of the grids."""
+        return tuple(self.space['mesh_points'][::-1].tolist())
+
+    @property
+    def _grid_key(self):
+        """The (`mesh_points`, `r_sizes`) key of the grid cache."""
+        return (tuple(self.space['mesh_points'].tolist()),
+                tuple(self.space['r_sizes'].tolist()))
+
     def compute_energy_grids(self):
         """Compute the initial potential and kinetic energy grids.
 
@@ -424,10 +657,8 @@ class PSpinor:
 
         """
         y_trap = self.omeg['y'] / self.omeg['x']
-        self.pot_eng = (self.space['x_mesh']**2
-                        + (y_trap * self.space['y_mesh'])**2) / 2
-        self.kin_eng = (self.space['kx_mesh']**2
-                        + self.space['ky_mesh']**2) / 2
+        self.pot_eng = _harmonic_pot(*self._grid_key, y_trap)
+        self.kin_eng = _free_kin_eng(*self._grid_key)
 
     def _calc_atoms(self, psi=None, space='r'):
         """Given a list of wavefunctions, calculates the total atom number.
@@ -533,24 +764,29 @@ class PSpinor:
             psik = self.psik
 
         shift = scale * self.kL_recoil / self.space['dk'][0]
-        input_ = ttools.fft_2d(psik, self.space['dr'])
+        input_ = ttools.fft_nd(psik, self.space['dr'])
         result = [np.zeros_like(pk) for pk in psik]
 
         for i in range(len(psik)):
-            positive = fourier_shift(input_[i], shift=[0, shift], axis=1)
-            negative = fourier_shift(input_[i], shift=[0, -shift], axis=1)
+            # The x-axis is the last axis of the grids
+            pad = [0] * (self.n_dims - 1)
+            positive = fourier_shift(input_[i], shift=pad + [shift], axis=-1)
+            negative = fourier_shift(input_[i], shift=pad + [-shift], axis=-1)
             result[i] = frac[0]*positive + frac[1]*negative
             frac = np.flip(frac)
-        self.psik = ttools.ifft_2d(result, self.space['dr'])
-        self.psi = ttools.ifft_2d(self.psik, self.space['dr'])
+        self.psik = ttools.ifft_nd(result, self.space['dr'])
+        self.psi = ttools.ifft_nd(self.psik, self.space['dr'])
 
     @property
     def coupling(self):
         r"""Get the `coupling` attribute.
 
-        2D coupling array [\\hbar * omeg['x']].
+        2D coupling array [\\hbar * omeg['x']]. Defaults to zero. The
+        uniform and gradient profiles are kept as a separable :obj:`SepSum`.
 
         """
+        if self._coupling is None:
+            self._coupling = sptools.uniform(0.0, self._grid_shape)
         return self._coupling
 
     @coupling.setter
@@ -562,9 +798,12 @@ class PSpinor:
     def detuning(self):
         r"""Get the `detuning` attribute.
 
-        2D detuning array [\\hbar * omeg['x']].
+        2D detuning array [\\hbar * omeg['x']]. Defaults to zero. The
+        uniform and gradient profiles are kept as a separable :obj:`SepSum`.
 
         """
+        if self._detuning is None:
+            self._detuning = sptools.uniform(0.0, self._grid_shape)
         return self._detuning
 
     @detuning.setter
@@ -595,15 +834,15 @@ class PSpinor:
         offset : :obj:`float`
             The origin offset of the coupling gradient, in [hbar*omeg_x].
         axis : :obj:`int`, optional
-            The axis along which the coupling gradient runs.
+            The axis along which the coupling gradient runs. On a 1D grid,
+            the gradient always runs along the x-axis.
 
         """
-        if axis == 0:
-            mesh = self.space['x_mesh']
-        elif axis == 1:
-            mesh = self.space['y_mesh']
+        # A quasi-1D grid only has the x-axis
+        mesh = self.space[AXES[min(axis, self.n_dims - 1)] + '_mesh']
 
-        self.coupling = mesh * slope + offset
+        self.coupling = sptools.SepSum([mesh * slope + offset],
+                                       self._grid_shape)
 
     def coupling_uniform(self, value):
         """Generate a uniform interspin coupling strength.
@@ -622,7 +861,7 @@ class PSpinor:
 
         """
         assert value >= 0, f"Cannot have a negative coupling value: {value}."
-        self.coupling = np.ones_like(self.space['x_mesh']) * value
+        self.coupling = sptools.uniform(value, self._grid_shape)
 
     def detuning_grad(self, slope, offset=0.0, axis=1):
         """Generate a linear gradient of the interspin coupling strength.
@@ -645,19 +884,19 @@ class PSpinor:
         offset : :obj:`float`
             The origin offset of the detuning gradient, in [hbar*omeg_x].
         axis : :obj:`int`, optional
-            The axis along which the detuning gradient runs.
+            The axis along which the detuning gradient runs. On a 1D grid,
+            the gradient always runs along the x-axis.
 
         See Also
         --------
         coupling_grad : Coupling gradient
 
         """
-        if axis == 0:
-            mesh = self.space['x_mesh']
-        elif axis == 1:
-            mesh = self.space['y_mesh']
+        # A quasi-1D grid only has the x-axis
+        mesh = self.space[AXES[min(axis, self.n_dims - 1)] + '_mesh']
 
-        self.detuning = mesh * slope + offset
+        self.detuning = sptools.SepSum([mesh * slope + offset],
+                                       self._grid_shape)
 
     def detuning_uniform(self, value):
         """Generate a uniform coupling detuning.
@@ -675,7 +914,7 @@ class PSpinor:
         coupling_grad : Coupling gradient
 
         """
-        self.detuning = np.ones_like(self.space['x_mesh']) * value
+        self.detuning = sptools.uniform(value, self._grid_shape)
 
     def seed_vortices(self, positions, windings):
         """Seeds vortices at the positions specified.
@@ -698,6 +937,7 @@ class PSpinor:
 
         """
         # raise NotImplementedError()
+        assert self.n_dims == 2, "Vortices can only be seeded in 2D."
         positions = np.array(positions)
         assert positions.shape[-1] == 2, ("Positions should be ordered "
                                           "pairs, e.g. (x, y).")
@@ -742,7 +982,7 @@ class PSpinor:
                                                                   xdiff))
                 self.psi[i] = (self.psi[i] * v_profile * v_phase)
 
-        self.psik = ttools.fft_2d(self.psi, delta_r=self.space['dr'])
+        self.psik = ttools.fft_nd(self.psi, delta_r=self.space['dr'])
 
     def seed_regular_vortices(self):
         """Seed regularly-arranged vortices into the wavefunction.
@@ -886,9 +1126,106 @@ class PSpinor:
                                            ext=ext, zoom=zoom)
         return fig, all_plots
 
+    def suggest_grid(self, edge_tol=1e-6, k_factor=2.0, margin=1.0,
+                     pow2=False):
+        """Find the smallest grid that resolves the condensate.
+
+        The real-space grid extends past the Thomas-Fermi radius along each
+        axis, until the ground-state density is below `edge_tol` of its
+        peak. The momentum-space grid extends to `k_factor` times the larger
+        of the inverse healing length and sqrt(2 * `chem_pot`), plus the
+        recoil momentum `kL_recoil` of a coupled `PSpinor`. Call after
+        `coupling_setup`, and create a new `PSpinor` with the result:
+
+        >>> mesh_points, r_sizes = ps.suggest_grid()
+        >>> ps = PSpinor(path, mesh_points=mesh_points, r_sizes=r_sizes)
+
+        Parameters
+        ----------
+        edge_tol : :obj:`float`, default=1e-6
+            The density at the real-space boundary, relative to the peak.
+        k_factor : :obj:`float`, default=2.0
+            The momentum-space half sizes, in units of the largest momentum
+            of the healing-length features.
+        margin : :obj:`float`, default=1.0
+            A factor on the real-space half sizes, e.g. to leave room for an
+            expansion in real-time dynamics.
+        pow2 : :obj:`bool`, default=False
+            Option to only use powers of two for `mesh_points`.
+
+        Returns
+        -------
+        mesh_points : :obj:`tuple` of :obj:`int`
+            The number of grid points along the x- and y-axes.
+        r_sizes : :obj:`tuple` of :obj:`float`
+            The half sizes of the grid along the x- and y-axes [a_x].
+
+        See Also
+        --------
+        grid_tools : Grid sizing and edge-weight checks.
+
+        """
+        y_trap = self.omeg['y'] / self.omeg['x']
+        # Thomas-Fermi radii, and potential slopes at those radii
+        radii = [self.rad_tf, self.rad_tf / y_trap][:self.n_dims]
+        slopes = [self.rad_tf, self.rad_tf * y_trap][:self.n_dims]
+        r_sizes = tuple(float(margin * gtools.edge_layer(rad, slope,
+                                                         edge_tol))
+                        for rad, slope in zip(radii, slopes))
+
+        # Healing length at the Thomas-Fermi peak densities
+        peaks = [np.sqrt(pop * self.chem_pot / abs(g)) for pop, g
+                 in zip(self.pop_frac, [self.g_sc['uu'], self.g_sc['dd']])]
+        k_heal = max(1 / min(self._calc_heal(peaks)),
+                     np.sqrt(2 * self.chem_pot))
+        k_size = k_factor * k_heal + self.kL_recoil * self.is_coupling
+
+        # k_sizes = pi / dr = pi * mesh_points / (2 * r_sizes)
+        mesh_points = tuple(gtools.fft_size(2 * size * k_size / np.pi, pow2)
+                            for size in r_sizes)
+        return mesh_points, r_sizes
+
+    def estimate_memory(self, device='cpu', n_samples=0, precision='double',
+                        sample_bytes=None):
+        """Estimate the peak memory of a propagation of this `PSpinor`.
+
+        Parameters
+        ----------
+        device : :obj:`str`, default='cpu'
+            The propagation device.
+        n_samples : :obj:`int`, default=0
+            The number of wavefunctions sampled during the propagation.
+        precision : :obj:`str`, default='double'
+            The floating-point precision of the propagation.
+        sample_bytes : :obj:`int`, optional
+            The size of each sample [bytes]; see ``sampling_tools.Sampler``.
+            Defaults to the full, complex wavefunction.
+
+        Returns
+        -------
+        estimate : :obj:`dict`
+            The peak 'host' and 'device' memory [bytes], and their
+            'breakdown'; see ``memory_tools.estimate_memory``.
+
+        """
+        grids = {'kin_eng_spin': list(self.kin_eng_spin),
+                 'pot_eng_spin': list(self.pot_eng_spin),
+                 'coupling': self.coupling,
+                 'other': [self.kin_eng, self.pot_eng, self.detuning]}
+        return mtools.estimate_memory(self.space['mesh_points'], precision,
+                                      device, self.is_coupling,
+                                      self.rot_coupling, n_samples,
+                                      sample_bytes, grids)
+
+    def _mem_available(self, device):
+        """Memory budget [bytes] for new allocations on `device`."""
+        if self.mem_budget is not None:
+            return self.mem_budget
+        return mtools.available_memory(device)
+
     # pylint: disable=too-many-arguments
     def imaginary(self, t_step, n_steps=1000, device='cpu',
-                  is_sampling=False, n_samples=1):
+                  is_sampling=False, n_samples=1, **kwargs):
         """Perform imaginary-time propagation.
 
         Propagation is carried out in a `TensorPropagator` object. The
@@ -908,24 +1245,18 @@ class PSpinor:
         n_samples : :obj:`int`, optional
             The number of samples to collect.
 
-        """
-        prop = tprop.TensorPropagator(self, t_step, n_steps, device,
-                                      time='imag',
-                                      is_sampling=is_sampling,
-                                      n_samples=n_samples)
-        result = prop.prop_loop(prop.n_steps)
-
-        # Include PSpinor attributes with the result object
-        result.paths = self.paths
-        result.time_scale = self.time_scale
-        result.space = self.space
+        Other Parameters
+        ----------------
+        **kwargs
+            Additional propagation options passed on to the
+            `TensorPropagator`, e.g. `observables` and `obs_rate`.
 
-        self.psik = result.psik
-        self.psi = result.psi
-        return result, prop
+        """
+        return self._propagate('imag', t_step, n_steps, device, is_sampling,
+                               n_samples, **kwargs)
 
     def real(self, t_step, n_steps=1000, device='cpu', is_sampling=False,
-             n_samples=1):
+             n_samples=1, **kwargs):
         """Perform real-time propagation.
 
         Propagation is carried out in a `TensorPropagator` object. The
@@ -945,11 +1276,73 @@ class PSpinor:
         n_samples : :obj:`int`, optional
             The number of samples to collect.
 
+        Other Parameters
+        ----------------
+        **kwargs
+            Additional propagation options passed on to the
+            `TensorPropagator`, e.g. `observables` and `obs_rate`.
+
+        """
+        return self._propagate('real', t_step, n_steps, device, is_sampling,
+                               n_samples, **kwargs)
+
+    def _session_key(self, device, precision):
+        """Get the settings that the device session was loaded with."""
+        return (device, precision, self.atom_num, self.is_coupling,
+                self.rot_coupling, self.kL_recoil, tuple(self.g_sc.values()))
+
+    def _session_grids(self):
+        """Get the host grids that the device session was loaded from."""
+        return [*self.kin_eng_spin, *self.pot_eng_spin, self.coupling]
+
+    def _resume_session(self, device, precision):
+        """Get the propagator of the device session, if it is up to date.
+
+        The session is reused when the device, the precision, and the
+        energy and coupling grids are unchanged since it was loaded; the
+        wavefunction is uploaded again only if `psi` or `psik` were set in
+        the meantime. Otherwise, the session is released.
+
+        Returns
+        -------
+        prop : :obj:`TensorPropagator` or None
+            The loaded propagator, or None if a new one is needed.
+
         """
-        prop = tprop.TensorPropagator(self, t_step, n_steps, device,
-                                      time='real',
-                                      is_sampling=is_sampling,
-                                      n_samples=n_samples)
+        self._pull()
+        session = self._session
+        if session is None:
+            return None
+        grids = self._session_grids()
+        if (session['key'] != self._session_key(device, precision)
+                or len(grids) != len(session['grids'])
+                or any(new is not old for new, old
+                       in zip(grids, session['grids']))):
+            self.release_session()
+            return None
+        if not session['synced']:
+            session['prop'].load_psik(self.psik)
+            session['synced'] = True
+        return session['prop']
+
+    def release_session(self):
+        """Free the grids and wavefunction kept on the device.
+
+        Successive propagations reuse the tensors of the previous one when
+        the device, precision and grids are unchanged; this releases them,
+        e.g. before switching to a different `PSpinor` on a GPU.
+
+        """
+        self._pull()
+        self._session = None
+
+    def _propagate(self, time, t_step, n_steps, device, is_sampling,
+                   n_samples, **kwargs):
+        """Run a propagation and collect its result; see `real`."""
+        prop = self._prepare(time, t_step, n_steps, device, is_sampling,
+                             n_samples, **kwargs)
+        # Until it completes, the host holds the last consistent state.
+        self._session['synced'] = False
         result = prop.prop_loop(prop.n_steps)
 
         # Include PSpinor attributes with the result object
@@ -957,6 +1350,126 @@ class PSpinor:
         result.time_scale = self.time_scale
         result.space = self.space
 
-        self.psik = result.psik
-        self.psi = result.psi
+        # The final wavefunction stays on the device for the next call;
+        # `psi` is computed from the host copy of `psik` on first access.
+        self._psik, self._psi = result.psik, None
+        self._session['synced'] = True
         return result, prop
+
+    def _prepare(self, time, t_step, n_steps, device, is_sampling,
+                 n_samples, **kwargs):
+        """Check the memory, and configure the session's propagator."""
+        precision = kwargs.get('precision', 'double')
+        prop = self._resume_session(device, precision)
+        sampler = smtools.Sampler.from_kwargs(
+            self.space['mesh_points'][::-1], self.space['dr'], kwargs)
+        n_stored = smtools.max_samples(n_samples, sampler.nbytes, kwargs)
+        estimate = self.estimate_memory(device, n_stored * is_sampling,
+                                        precision, sampler.nbytes)
+        # The grids of this PSpinor are already allocated.
+        host = estimate['host'] - estimate['breakdown']['pspinor']
+        if self.mem_budget is not None:
+            host = estimate['host']
+        what = f"Propagating {self.space['mesh_points'].tolist()} points"
+        mtools.check_memory(host, self._mem_available('cpu'), self.mem_check,
+                            what + " (host)")
+        # A resumed session already holds its device memory.
+        if estimate['device'] and prop is None:
+            mtools.check_memory(estimate['device'],
+                                self._mem_available(device),
+                                self.mem_check, what + f" ({device})")
+        if prop is None:
+            prop = tprop.TensorPropagator(self, t_step, n_steps, device,
+                                          time=time,
+                                          is_sampling=is_sampling,
+                                          n_samples=n_samples, **kwargs)
+            self._session = {'prop': prop,
+                             'key': self._session_key(device, precision),
+                             'grids': self._session_grids()}
+        else:
+            prop.configure(self, t_step, n_steps, time, is_sampling,
+                           n_samples, **kwargs)
+        return prop
+
+    def stream_imaginary(self, t_step, n_steps=None, every=1, device='cpu',
+                         **kwargs):
+        """Perform imaginary-time propagation lazily, as a stream of views.
+
+        See `stream_real`.
+
+        """
+        return self._stream('imag', t_step, n_steps, every, device,
+                            **kwargs)
+
+    def stream_real(self, t_step, n_steps=None, every=1, device='cpu',
+                    **kwargs):
+        """Perform real-time propagation lazily, as a stream of views.
+
+        The propagation advances only as the views are consumed, e.g. by a
+        ``for`` loop, which may stop at any view. The wavefunction of this
+        `PSpinor` is then that of the last view consumed, and the next
+        propagation or stream resumes from it. The options of a stream are
+        those of `real`, except that it is not sampled to disk; see
+        ``tensor_propagator.TensorPropagator.iterate``.
+
+        The stream runs on the grids and options with which it was started:
+        changes to this `PSpinor` within the loop, e.g. of its potentials,
+        are not applied to it. A wavefunction set within the loop is kept
+        in place of that of the stream, and the stream continues from its
+        own.
+
+        Parameters
+        ----------
+        t_step : :obj:`float`
+            The propagation time step.
+        n_steps : :obj:`int`, optional
+            The total number of propagation steps. By default, the stream
+            does not end.
+        every : :obj:`int`, default=1
+            The number of time steps between views.
+        device : :obj:`str`, optional
+            {'cpu', 'cuda'}
+
+        Other Parameters
+        ----------------
+        **kwargs
+            Additional propagation options passed on to the
+            `TensorPropagator`, e.g. `observables` and `precision`.
+
+        Yields
+        ------
+        view : :obj:`StateView`
+            The state after every `every` time steps; see
+            ``stream_tools.StateView``.
+
+        """
+        return self._stream('real', t_step, n_steps, every, device,
+                            **kwargs)
+
+    def _stream(self, time, t_step, n_steps, every, device, **kwargs):
+        """Stream a propagation; see `stream_real`."""
+        # Configuring for `every` steps sets the default rates of the checks.
+        prop = self._prepare(time, t_step, n_steps or every, device, False, 1,
+                             **kwargs)
+        # The device is ahead of the host until the stream is pulled.
+        self._session['ahead'] = True
+        try:
+            for view in prop.iterate(n_steps, every):
+                yield view
+                # Reading `psi` or `psik` in the loop pulls the state of this
+                # view; the device moves ahead of the host again from here.
+                session = self._session
+                if (session is not None and session['prop'] is prop
+                        and session['synced']):
+                    session['ahead'] = True
+        finally:
+            self._pull()
+
+    def _pull(self):
+        """Copy the wavefunction of a stream from the device to the host."""
+        session = self._session
+        if session is not None and session.get('ahead'):
+            session['ahead'] = False
+            self._psik = ttools.to_numpy(session['prop'].psik)
+            self._psi = None
+            session['synced'] = True
@@ -0,0 +1,312 @@
+"""pyramid_tools.py module.
+
+Multi-resolution tile pyramids of sampled archives, for browsing the frames
+of large runs interactively.
+
+A pyramid is built once, streaming over the archive in batches of frames:
+the densities and phases of each frame are stored at full resolution
+(level 0) and at successive 2x area-averaged downsamplings, until a level
+fits in a single tile. Each level of each quantity is a separate .npy file
+of shape (n_frames, n_tiles_y, n_tiles_x, 2, tile, tile), so that a tile of
+both spin components is contiguous on disk; tiles at the grid boundary are
+padded with NaN. A :obj:`Pyramid` memory-maps these files, and a view of a
+frame reads only the tiles of the level that resolves the viewport.
+
+The pyramid of the archive `name`.npz is the directory `name`_pyramid/,
+which also holds the sampled 'times' and a meta.json description.
+
+"""
+import itertools
+import json
+import os
+
+import numpy as np
+import torch
+
+from spinor_gpe.pspinor import archive_tools as atools
+from spinor_gpe.pspinor import tensor_tools as ttools
+
+#: The default tile size, along each axis.
+TILE = 256
+
+
+def pyramid_path(path):
+    """Get the directory of the pyramid of an archive."""
+    return os.path.splitext(path)[0] + '_pyramid'
+
+
+def halve(grids):
+    """Area-average the last two axes of `grids` over 2x2 blocks.
+
+    A trailing odd row or column is averaged on its own.
+
+    Parameters
+    ----------
+    grids : PyTorch :obj:`Tensor`
+        Real (..., Ny, Nx) grids.
+
+    """
+    shape = grids.shape
+    flat = grids.reshape(-1, 1, *shape[-2:])
+    averaged = torch.nn.functional.avg_pool2d(flat, 2, ceil_mode=True)
+    return averaged.reshape(*shape[:-2], *averaged.shape[-2:])
+
+
+def _tiles(grids, tile):
+    """Split (batch, 2, Ny, Nx) grids into (batch, n_ty, n_tx, 2, t, t)."""
+    n_ty, n_tx = [-(-size // tile) for size in grids.shape[-2:]]
+    padded = torch.full((*grids.shape[:2], n_ty * tile, n_tx * tile),
+                        np.nan, dtype=grids.dtype, device=grids.device)
+    padded[..., :grids.shape[-2], :grids.shape[-1]] = grids
+    padded = padded.reshape(*grids.shape[:2], n_ty, tile, n_tx, tile)
+    return padded.permute(0, 2, 4, 1, 3, 5)
+
+
+def _grids(batch, info, delta_r):
+    """Get the densities and the phasors of a batch of sampled frames.
+
+    Returns
+    -------
+    grids : :obj:`dict` of PyTorch :obj:`Tensor`
+        The real 'dens' and the complex phasors 'phase', whose area average
+        gives the density-weighted average phase; either may be missing.
+
+    """
+    grids = {}
+    if info['quantity'] == 'field':
+        field = batch
+        if info['space'] == 'k' and 'extent' not in info:
+            # Full momentum-space wavefunctions, shown in real space
+            normalization = ttools.prod(delta_r) / (2 * np.pi)
+            field = torch.fft.ifftn(torch.fft.ifftshift(batch, dim=(-2, -1)),
+                                    dim=(-2, -1)) / normalization
+        grids['dens'] = ttools.norm_sq(field)
+        grids['phase'] = field
+    elif info['quantity'] == 'dens':
+        grids['dens'] = batch.real
+    else:
+        grids['phase'] = torch.exp(1.0j * batch.real)
+    return grids
+
+
+def build(path, delta_r, extent, tile=TILE, device='cpu', batch_size=4):
+    """Build the tile pyramid of a sampled archive.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        Path to the .npz archive.
+    delta_r : NumPy :obj:`array`
+        The real-space x- and y-mesh spacings, to transform full
+        momentum-space wavefunctions to real space.
+    extent : :obj:`iterable` of :obj:`float`
+        The extent of the frames, [x_min, x_max, y_min, y_max].
+    tile : :obj:`int`, default=256
+        The size of the tiles along each axis.
+    device : :obj:`str`, default='cpu'
+        The device on which the frames are transformed and downsampled.
+    batch_size : :obj:`int`, default=4
+        The number of frames processed at once.
+
+    Returns
+    -------
+    pyramid : :obj:`Pyramid`
+
+    """
+    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-locals
+    key = atools.sample_key(path)
+    info = atools.sample_info(path)
+    shape = atools.sample_shape(path, key)
+    assert len(shape) == 4, "Pyramids are only built of 2D frames."
+    n_frames = shape[0]
+
+    sizes = [tuple(shape[-2:])]
+    while max(sizes[-1]) > tile:
+        sizes.append(tuple(-(-size // 2) for size in sizes[-1]))
+
+    folder = pyramid_path(path)
+    os.makedirs(folder, exist_ok=True)
+    quantities = {'field': ['dens', 'phase'], 'dens': ['dens'],
+                  'phase': ['phase']}[str(info['quantity'])]
+    files = {}
+    for name in quantities:
+        for level, size in enumerate(sizes):
+            shape = (n_frames, -(-size[0] // tile), -(-size[1] // tile), 2,
+                     tile, tile)
+            files[(name, level)] = np.lib.format.open_memmap(
+                os.path.join(folder, f'{name}_{level}.npy'), mode='w+',
+                dtype=np.float32, shape=shape)
+
+    samples = atools.iter_samples(path, key)
+    start = 0
+    while True:
+        batch = list(itertools.islice(samples, batch_size))
+        if not batch:
+            break
+        stop = start + len(batch)
+        grids = _grids(torch.as_tensor(np.stack(batch), device=device), info,
+                       delta_r)
+        for level in range(len(sizes)):
+            if level > 0:
+                grids = {name: (halve(grid) if not grid.is_complex() else
+                                torch.complex(halve(grid.real),
+                                              halve(grid.imag)))
+                         for name, grid in grids.items()}
+            for name, grid in grids.items():
+                if name == 'phase':
+                    grid = torch.angle(grid)
+                files[name, level][start:stop] = ttools.to_numpy(
+                    _tiles(grid.float(), tile))
+        start = stop
+
+    for memmap in files.values():
+        memmap.flush()
+    with np.load(path) as archive:
+        np.save(os.path.join(folder, 'times.npy'), archive['times'])
+    meta = {'tile': tile, 'sizes': sizes, 'extent': list(map(float, extent)),
+            'n_frames': n_frames, 'quantities': quantities}
+    with open(os.path.join(folder, 'meta.json'), 'w',
+              encoding='utf-8') as file:
+        json.dump(meta, file)
+    return Pyramid(folder)
+
+
+class Pyramid:
+    """Reads the tiles of a pyramid that are needed for a view of a frame.
+
+    Attributes
+    ----------
+    folder : :obj:`str`
+        The directory of the pyramid.
+    tile : :obj:`int`
+        The size of the tiles along each axis.
+    sizes : :obj:`list` of :obj:`tuple`
+        The (Ny, Nx) grid size of each level; level 0 is the full resolution.
+    extent : NumPy :obj:`array`
+        The extent of the frames, [x_min, x_max, y_min, y_max].
+    n_frames : :obj:`int`
+        The number of frames.
+    quantities : :obj:`list` of :obj:`str`
+        The stored quantities, 'dens' and/or 'phase'.
+    times : NumPy :obj:`array`
+        The times of the frames.
+
+    """
+
+    def __init__(self, folder):
+        """Open a pyramid; the tiles are memory-mapped on first use."""
+        self.folder = folder
+        with open(os.path.join(folder, 'meta.json'),
+                  encoding='utf-8') as file:
+            meta = json.load(file)
+        self.tile = meta['tile']
+        self.sizes = [tuple(size) for size in meta['sizes']]
+        self.extent = np.array(meta['extent'])
+        self.n_frames = meta['n_frames']
+        self.quantities = meta['quantities']
+        self.times = np.load(os.path.join(folder, 'times.npy'))
+        self._levels = {}
+
+    def level_for(self, region=None, size=512):
+        """Get the coarsest level that resolves `region` with `size` pixels.
+
+        Parameters
+        ----------
+        region : :obj:`iterable` of :obj:`float`, optional
+            The viewport, [x_min, x_max, y_min, y_max]. Defaults to `extent`.
+        size : :obj:`int`, default=512
+            The number of display pixels along the longer axis of the
+            viewport.
+
+        Returns
+        -------
+        level : :obj:`int`
+
+        """
+        fractions = self._fractions(region)
+        for level in reversed(range(len(self.sizes))):
+            n_y, n_x = self.sizes[level]
+            if max((fractions[1] - fractions[0]) * n_x,
+                   (fractions[3] - fractions[2]) * n_y) >= size:
+                return level
+        return 0
+
+    def view(self, frame, quantity='dens', region=None, size=512,
+             level=None):
+        """Get a frame's quantity within a viewport, from the fewest tiles.
+
+        Parameters
+        ----------
+        frame : :obj:`int`
+            The index of the frame.
+        quantity : :obj:`str`, default='dens'
+            'dens' or 'phase'.
+        region : :obj:`iterable` of :obj:`float`, optional
+            The viewport, [x_min, x_max, y_min, y_max]. Defaults to `extent`.
+        size : :obj:`int`, default=512
+            The number of display pixels along the longer axis of the
+            viewport, which selects the level; see `level_for`.
+        level : :obj:`int`, optional
+            Overrides the level.
+
+        Returns
+        -------
+        image : NumPy :obj:`array`
+            The (2, ny, nx) grids of both spin components.
+        extent : NumPy :obj:`array`
+            The extent of the returned grids, which are aligned to the grid
+            points of the level and so may slightly exceed `region`.
+
+        """
+        # pylint: disable=too-many-arguments
+        # pylint: disable=too-many-locals
+        assert quantity in self.quantities, (
+            f"The pyramid stores {self.quantities}, not '{quantity}'.")
+        if level is None:
+            level = self.level_for(region, size)
+        n_y, n_x = self.sizes[level]
+        fractions = self._fractions(region)
+        col0, col1 = (int(np.floor(fractions[0] * n_x)),
+                      int(np.ceil(fractions[1] * n_x)))
+        row0, row1 = (int(np.floor(fractions[2] * n_y)),
+                      int(np.ceil(fractions[3] * n_y)))
+        # At least one grid point, even for an empty viewport
+        col0, row0 = min(col0, n_x - 1), min(row0, n_y - 1)
+        col1, row1 = max(col1, col0 + 1), max(row1, row0 + 1)
+
+        tiles = self._tiles(quantity, level)
+        tile = self.tile
+        ty0, ty1 = row0 // tile, -(-row1 // tile)
+        tx0, tx1 = col0 // tile, -(-col1 // tile)
+        # Only the tiles overlapping the viewport are read.
+        block = np.asarray(tiles[frame, ty0:ty1, tx0:tx1])
+        image = block.transpose(2, 0, 3, 1, 4).reshape(
+            2, (ty1 - ty0) * tile, (tx1 - tx0) * tile)
+        image = image[:, row0 - ty0 * tile:row1 - ty0 * tile,
+                      col0 - tx0 * tile:col1 - tx0 * tile]
+
+        x_min, x_max, y_min, y_max = self.extent
+        extent = np.array([x_min + (x_max - x_min) * col0 / n_x,
+                           x_min + (x_max - x_min) * col1 / n_x,
+                           y_min + (y_max - y_min) * row0 / n_y,
+                           y_min + (y_max - y_min) * row1 / n_y])
+        return image, extent
+
+    def _tiles(self, quantity, level):
+        """Memory-map the tiles of a level of a quantity."""
+        if (quantity, level) not in self._levels:
+            self._levels[quantity, level] = np.load(
+                os.path.join(self.folder, f'{quantity}_{level}.npy'),
+                mmap_mode='r')
+        return self._levels[quantity, level]
+
+    def _fractions(self, region):
+        """Get the viewport as fractions of the extent, clipped to [0, 1]."""
+        if region is None:
+            return np.array([0.0, 1.0, 0.0, 1.0])
+        x_min, x_max, y_min, y_max = self.extent
+        scale = np.array([x_max - x_min] * 2 + [y_max - y_min] * 2)
+        offset = np.array([x_min] * 2 + [y_min] * 2)
+        return np.clip((np.asarray(region, dtype=float) - offset) / scale,
+                       0.0, 1.0)
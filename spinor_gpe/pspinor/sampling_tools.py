@@ -0,0 +1,373 @@
+"""sampling_tools.py module.
+
+Reduction of the wavefunctions sampled during propagation, on the device
+and before they are transferred to the host.
+
+By default the full, complex momentum-space wavefunction is sampled. A
+:obj:`Sampler` can instead sample the real-space wavefunction, only its
+density or phase, a cropped window of the grid, and an area-averaged grid
+with fewer points.
+
+Samples are taken at a fixed stride of time steps, or, with a
+:obj:`Trigger`, whenever the wavefunction has changed enough since the last
+sample.
+
+"""
+import warnings
+
+import numpy as np
+import torch
+
+from spinor_gpe.pspinor import tensor_tools as ttools
+
+#: The sampled quantities, and their host dtypes.
+QUANTITIES = {'field': np.complex128, 'dens': np.float64,
+              'phase': np.float64}
+
+
+def block_mean(grids, factors):
+    """Average the trailing axes of `grids` over blocks of points.
+
+    Parameters
+    ----------
+    grids : PyTorch :obj:`Tensor`
+        Real or complex grids; the trailing axes must be multiples of the
+        corresponding `factors`.
+    factors : :obj:`iterable` of :obj:`int`
+        The block size along each of the trailing axes.
+
+    Returns
+    -------
+    averaged : PyTorch :obj:`Tensor`
+        The block-averaged grids.
+
+    """
+    factors = tuple(factors)
+    if all(factor == 1 for factor in factors):
+        return grids
+    n_axes = len(factors)
+    blocks = []
+    for size, factor in zip(grids.shape[-n_axes:], factors):
+        blocks += [size // factor, factor]
+    grids = grids.reshape(*grids.shape[:-n_axes], *blocks)
+    return grids.mean(dim=tuple(range(-1, -2 * n_axes, -2)))
+
+
+class Sampler:
+    """Reduces sampled wavefunctions on the device.
+
+    Attributes
+    ----------
+    grid_shape : :obj:`tuple` of :obj:`int`
+        The (Ny, Nx) shape of the wavefunction grids.
+    space : :obj:`str`
+        The sampled space, {'r', 'k'}.
+    quantity : :obj:`str`
+        The sampled quantity, {'field', 'dens', 'phase'}.
+    slices : :obj:`tuple` of :obj:`slice`
+        The slices of the cropped window, along the (y-, x-) grid axes.
+    factors : :obj:`tuple` of :obj:`int`
+        The decimation factors along the (y-, x-) grid axes.
+    extent : NumPy :obj:`array`
+        The extent of the sampled window, [x_min, x_max, y_min, y_max], in
+        [a_x] or [1/a_x].
+    shape : :obj:`tuple` of :obj:`int`
+        The shape of a sample, (2, ...) for the two spin components.
+
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, grid_shape, delta_r, space='k', quantity='field',
+                 window=None, decimate=1):
+        """Set up the reduction of samples on a grid.
+
+        Parameters
+        ----------
+        grid_shape : :obj:`iterable` of :obj:`int`
+            The (Ny, Nx) shape of the wavefunction grids.
+        delta_r : :obj:`iterable` of :obj:`float`
+            The real-space x- and y-mesh spacings, respectively.
+        space : :obj:`str`, default='k'
+            Sample the real- ('r') or the momentum-space ('k') wavefunction.
+        quantity : :obj:`str`, default='field'
+            Sample the complex wavefunction ('field'), its density ('dens')
+            or its phase ('phase').
+        window : :obj:`iterable`, optional
+            The ((x_min, x_max), (y_min, y_max)) window of the grid to keep,
+            in [a_x] for real space and [1/a_x] for momentum space, e.g.
+            around a Raman recoil peak. By default, the whole grid is kept.
+        decimate : :obj:`int` or :obj:`iterable` of :obj:`int`, default=1
+            Average over blocks of `decimate` points along each (x, y) axis.
+            The phase is that of the block-averaged wavefunction.
+
+        """
+        assert space in ('r', 'k'), f"Unknown sampled space `{space}`."
+        assert quantity in QUANTITIES, (f"The sampled quantity must be one "
+                                        f"of {set(QUANTITIES)}.")
+        self.space = space
+        self.quantity = quantity
+
+        grid_shape = tuple(int(size) for size in grid_shape)
+        self.grid_shape = grid_shape
+        n_dims = len(grid_shape)
+        delta_r = np.asarray(delta_r, dtype=float)
+        # Mesh spacings in the sampled space, along the grid axes
+        spacing = (delta_r if space == 'r'
+                   else 2 * np.pi / (grid_shape[::-1] * delta_r))[::-1]
+        if window is None:
+            window = [(-np.inf, np.inf)] * n_dims
+        window = list(window)[:n_dims][::-1]
+        decimate = np.broadcast_to(decimate, (n_dims,))[::-1]
+
+        slices, factors, extent = [], [], []
+        for size, step, (low, high), factor in zip(grid_shape, spacing,
+                                                   window, decimate):
+            # Grid points are at (index - size / 2) * step.
+            start = int(np.clip(np.ceil(low / step + size / 2), 0, size))
+            stop = int(np.clip(np.floor(high / step + size / 2) + 1, start,
+                               size))
+            stop -= (stop - start) % int(factor)
+            assert stop > start, (f"The sampling window {(low, high)} is "
+                                  "smaller than the decimation blocks.")
+            slices.append(slice(start, stop))
+            factors.append(int(factor))
+            extent = [(start - size / 2) * step,
+                      (stop - size / 2) * step] + extent
+        self.slices = tuple(slices)
+        self.factors = tuple(factors)
+        self.extent = np.array(extent)
+        self.shape = (2, *[(sl.stop - sl.start) // factor for sl, factor
+                           in zip(self.slices, self.factors)])
+
+    @classmethod
+    def from_kwargs(cls, grid_shape, delta_r, kwargs):
+        """Create a `Sampler` from the `sample_*` propagation options.
+
+        See ``tensor_propagator.TensorPropagator``.
+
+        """
+        return cls(grid_shape, delta_r, kwargs.get('sample_space', 'k'),
+                   kwargs.get('sample_quantity', 'field'),
+                   kwargs.get('sample_window', None),
+                   kwargs.get('sample_decimate', 1))
+
+    @property
+    def is_full(self):
+        """Whether the full, complex momentum-space wavefunction is kept."""
+        return (self.space == 'k' and self.quantity == 'field'
+                and self.shape[1:] == self.grid_shape)
+
+    @property
+    def dtype(self):
+        """The NumPy dtype of the samples on the host."""
+        return QUANTITIES[self.quantity]
+
+    @property
+    def nbytes(self):
+        """The size of one sample on the host [bytes]."""
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+    def __call__(self, psik, delta_r):
+        """Reduce a wavefunction to a sample.
+
+        Parameters
+        ----------
+        psik : :obj:`list` of PyTorch :obj:`Tensor`
+            The centered momentum-space wavefunction components.
+        delta_r : PyTorch :obj:`Tensor`
+            The real-space mesh spacings.
+
+        Returns
+        -------
+        sample : PyTorch :obj:`Tensor`
+            The reduced sample, on the device, of shape `shape`.
+
+        """
+        if self.space == 'r':
+            psik = ttools.ifft_nd(psik, delta_r)
+        grids = torch.stack(psik)[(slice(None), *self.slices)]
+        if self.quantity == 'dens':
+            grids = ttools.norm_sq(grids)
+        grids = block_mean(grids, self.factors)
+        if self.quantity == 'phase':
+            grids = torch.angle(grids)
+        return grids
+
+    def meta(self):
+        """Get the description of the samples, to store with them."""
+        return {'space': self.space, 'quantity': self.quantity,
+                'extent': self.extent, 'decimate': np.array(self.factors)}
+
+
+def _dens_snapshot(prop):
+    """Get the real-space densities of the propagator's wavefunction."""
+    psi = ttools.ifft_nd(prop.psik, prop.space['dr'])
+    return torch.stack(ttools.density(psi))
+
+
+def _dens_change(prop, snapshot):
+    """Get the relative L2 change of the densities since `snapshot`."""
+    change = _dens_snapshot(prop) - snapshot
+    return (torch.linalg.vector_norm(change)
+            / torch.linalg.vector_norm(snapshot))
+
+
+def _pops_snapshot(prop):
+    """Get the population fractions of the propagator's wavefunction."""
+    dens = ttools.density(prop.psik)
+    return torch.stack([d.sum() for d in dens]) * (prop.space['dv_k']
+                                                   / prop.atom_num)
+
+
+def _pops_change(prop, snapshot):
+    """Get the largest change of the population fractions since `snapshot`."""
+    # pylint: disable=protected-access
+    return torch.max(torch.abs(prop._pops / prop.atom_num - snapshot))
+
+
+#: The change metrics of adaptive sampling: functions taking a snapshot of
+#: the propagator's state, and measuring the change since a snapshot.
+METRICS = {'dens': (_dens_snapshot, _dens_change),
+           'pops': (_pops_snapshot, _pops_change)}
+
+
+class Trigger:
+    """Decides when to sample, from the change of the wavefunction.
+
+    A sample is due when a change metric, evaluated on the device, crosses
+    `threshold` since the last sample, subject to minimum and maximum
+    intervals, and to a maximum number of samples.
+
+    Attributes
+    ----------
+    metric : :obj:`str`
+        The change metric, one of `METRICS`: the relative L2 change of the
+        real-space densities ('dens'), or the largest change of the
+        population fractions ('pops').
+    threshold : :obj:`float`
+        The change that triggers a sample.
+    min_interval : :obj:`int`
+        The fewest time steps between samples.
+    check_rate : :obj:`int`
+        The metric is evaluated every `check_rate` time steps from
+        `min_interval` steps after the last sample, since the 'dens' metric
+        costs an inverse FFT.
+    max_interval : :obj:`int` or None
+        The most time steps between samples.
+    max_samples : :obj:`int`
+        The most samples that are stored.
+    steps : :obj:`list` of :obj:`int`
+        The time steps of the samples taken.
+
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, threshold, metric='dens', min_interval=1,
+                 max_interval=None, max_samples=None, check_rate=None):
+        """Set up the sampling policy; see the class attributes.
+
+        `check_rate` defaults to `min_interval`.
+
+        """
+        assert metric in METRICS, (f"The sampling metric must be one of "
+                                   f"{set(METRICS)}.")
+        self.threshold = threshold
+        self.metric = metric
+        self.min_interval = max(int(min_interval), 1)
+        self.check_rate = max(int(check_rate or self.min_interval), 1)
+        self.max_interval = max_interval
+        self.max_samples = max_samples
+        self.steps = []
+        self._snapshot = None
+
+    @classmethod
+    def from_kwargs(cls, n_samples, sample_bytes, kwargs):
+        """Create a `Trigger` from the `sample_*` propagation options.
+
+        Returns None if `sample_threshold` is not given, i.e. for
+        fixed-stride sampling. See ``tensor_propagator.TensorPropagator``.
+
+        """
+        threshold = kwargs.get('sample_threshold', None)
+        if threshold is None:
+            return None
+        return cls(threshold, kwargs.get('sample_metric', 'dens'),
+                   kwargs.get('sample_min_interval', 1),
+                   kwargs.get('sample_max_interval', None),
+                   max_samples(n_samples, sample_bytes, kwargs),
+                   kwargs.get('sample_check_rate', None))
+
+    @property
+    def n_samples(self):
+        """The number of samples taken."""
+        return len(self.steps)
+
+    def is_due(self, step, prop):
+        """Check whether a sample is due at `step`.
+
+        The metric is only evaluated once `min_interval` steps have passed
+        since the last sample, and then every `check_rate` steps.
+
+        Parameters
+        ----------
+        step : :obj:`int`
+            The current time step.
+        prop : :obj:`TensorPropagator`
+            The propagator.
+
+        Returns
+        -------
+        is_due : :obj:`bool`
+
+        """
+        if self.n_samples >= self.max_samples:
+            return False
+        if self._snapshot is None:
+            return True
+        elapsed = step - self.steps[-1]
+        if elapsed < self.min_interval:
+            return False
+        if self.max_interval is not None and elapsed >= self.max_interval:
+            return True
+        if (elapsed - self.min_interval) % self.check_rate:
+            return False
+        change = METRICS[self.metric][1](prop, self._snapshot)
+        return change.item() >= self.threshold
+
+    def record(self, step, prop):
+        """Take the reference snapshot of a sample at `step`."""
+        self.steps.append(step)
+        self._snapshot = METRICS[self.metric][0](prop)
+        if self.n_samples == self.max_samples:
+            warnings.warn(f"At step {step}, the sampling budget of "
+                          f"{self.max_samples} samples is used up; no more "
+                          "samples are taken.", RuntimeWarning)
+
+    def rewind(self, step):
+        """Forget the samples from `step` on; the next sample is due now."""
+        del self.steps[sum(s < step for s in self.steps):]
+        self._snapshot = None
+
+
+def max_samples(n_samples, sample_bytes, kwargs):
+    """Get the most samples stored by adaptive sampling.
+
+    Parameters
+    ----------
+    n_samples : :obj:`int`
+        The number of samples requested of the propagation.
+    sample_bytes : :obj:`int`
+        The size of each sample [bytes].
+    kwargs : :obj:`dict`
+        The propagation options; `sample_budget`, in bytes, overrides
+        `n_samples`.
+
+    Returns
+    -------
+    n_max : :obj:`int`
+
+    """
+    budget = kwargs.get('sample_budget', None)
+    if budget is None or kwargs.get('sample_threshold', None) is None:
+        return n_samples
+    return max(int(budget // sample_bytes), 1)
@@ -0,0 +1,364 @@
+"""separable_tools.py module.
+
+Separable representations of grids and of their evolution operators.
+
+The harmonic potential, the free-particle kinetic energy, and the linear or
+uniform coupling and detuning profiles are each a sum of terms that depend
+on only one axis of the grid. A :obj:`SepSum` keeps such a grid as its
+one-dimensional terms, stored as NumPy arrays or PyTorch tensors with the
+other axes of length one, as in ``numpy.meshgrid(..., sparse=True)``. The
+exponential of a :obj:`SepSum` is the :obj:`SepProd` of the exponentials
+of its terms, and multiplies a wavefunction by broadcasting each factor in
+turn. The memory of these grids is then O(Nx + Ny) rather than O(Nx * Ny).
+
+Adding, subtracting, and scaling keeps a grid separable; adding an
+arbitrary full grid adds it as a full term. Any other operation, including
+NumPy functions and ufuncs, comparisons, and the other attributes and
+methods of arrays, such as ``sum`` or ``T``, acts on the materialized full
+grid, so that a :obj:`SepSum` can be used in place of the equivalent NumPy
+array.
+
+"""
+import numbers
+import operator
+
+import numpy as np
+import torch
+
+
+def _is_scalar(value):
+    """Check whether `value` is a scalar, or a 0-d array or tensor."""
+    return isinstance(value, numbers.Number) or np.ndim(value) == 0
+
+
+def _signature(term):
+    """Get the axes along which a broadcastable `term` varies."""
+    return tuple(size != 1 for size in term.shape)
+
+
+def _broadcast(total, shape):
+    """Materialize a broadcastable array or tensor with the full `shape`."""
+    if isinstance(total, torch.Tensor):
+        return total.expand(shape).clone()
+    return np.array(np.broadcast_to(total, shape))
+
+
+class SepSum:
+    """A grid that is a sum of terms along separate axes.
+
+    Attributes
+    ----------
+    terms : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+        The terms, which all have the number of dimensions of the grid and
+        length one along the axes on which they do not depend. There is at
+        most one term for each combination of axes.
+    shape : :obj:`tuple` of :obj:`int`
+        The shape of the full grid.
+
+    """
+
+    def __init__(self, terms, shape):
+        """Combine broadcastable terms into a separable grid.
+
+        Parameters
+        ----------
+        terms : :obj:`iterable`
+            NumPy arrays or PyTorch tensors broadcastable to `shape`, or
+            scalars; the terms that vary along the same axes are summed.
+        shape : :obj:`iterable` of :obj:`int`
+            The shape of the full grid.
+
+        """
+        self.shape = tuple(int(size) for size in shape)
+        combined = {}
+        for term in terms:
+            if _is_scalar(term) and not hasattr(term, 'reshape'):
+                term = np.array(term)
+            term = term.reshape(*[1] * (len(self.shape) - term.ndim),
+                                *term.shape)
+            key = _signature(term)
+            combined[key] = combined[key] + term if key in combined else term
+        # Constant terms last, so that `terms[0]` sets the array type
+        self.terms = sorted(combined.values(), key=lambda t: not any(
+            _signature(t)))
+
+    @property
+    def ndim(self):
+        """The number of dimensions of the grid."""
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        """The dtype of the full grid."""
+        if isinstance(self.terms[0], torch.Tensor):
+            return self.terms[0].dtype
+        return np.result_type(*self.terms)
+
+    @property
+    def size(self):
+        """The number of elements of the full grid."""
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        """The memory held by the terms [bytes]."""
+        return sum(term.nbytes if isinstance(term, np.ndarray)
+                   else term.element_size() * term.numel()
+                   for term in self.terms)
+
+    def full(self):
+        """Materialize the full grid.
+
+        Returns
+        -------
+        grid : NumPy :obj:`array` or PyTorch :obj:`Tensor`
+            A new grid of shape `shape`.
+
+        """
+        return _broadcast(sum(self.terms[1:], self.terms[0]), self.shape)
+
+    def compact(self):
+        """Get the smallest array that broadcasts to the grid.
+
+        Returns
+        -------
+        grid : NumPy :obj:`array` or PyTorch :obj:`Tensor`
+            The sum of the terms, if they vary along at most one common set
+            of axes; otherwise the full grid.
+
+        """
+        varying = [term for term in self.terms if any(_signature(term))]
+        if len(varying) <= 1:
+            return sum(self.terms[1:], self.terms[0])
+        return self.full()
+
+    def map(self, func):
+        """Apply `func` to each term, e.g. to convert them to tensors."""
+        return SepSum([func(term) for term in self.terms], self.shape)
+
+    def exp(self, coef=1.0):
+        """Compute the exponential of `coef` times the grid.
+
+        Returns
+        -------
+        oper : :obj:`SepProd`, NumPy :obj:`array` or PyTorch :obj:`Tensor`
+            The product of the exponentials of the terms, or a single
+            broadcastable grid if there is only one term.
+
+        """
+        exp = (torch.exp if isinstance(self.terms[0], torch.Tensor)
+               else np.exp)
+        factors = [exp(coef * term) for term in self.terms]
+        if len(factors) > 1 and not any(_signature(factors[-1])):
+            # Absorb the constant factor
+            factors = [factors[0] * factors[-1]] + factors[1:-1]
+        if len(factors) == 1:
+            return factors[0]
+        return SepProd(factors, self.shape)
+
+    def min(self, axis=None, out=None, **kwargs):
+        """Get the minimum of the full grid; see ``numpy.amin``."""
+        return self._extremum('min', axis, out, **kwargs)
+
+    def max(self, axis=None, out=None, **kwargs):
+        """Get the maximum of the full grid; see ``numpy.amax``."""
+        return self._extremum('max', axis, out, **kwargs)
+
+    def _extremum(self, name, axis, out, **kwargs):
+        """Reduce over terms that vary along separate axes."""
+        signatures = [_signature(term) for term in self.terms]
+        disjoint = all(not any(a and b for a, b in zip(sig, other))
+                       for i, sig in enumerate(signatures)
+                       for other in signatures[i + 1:])
+        if axis is None and out is None and not kwargs and disjoint:
+            return sum(getattr(np, name)(np.asarray(term))
+                       for term in self.terms)
+        return getattr(np, name)(self.full(), axis=axis, out=out, **kwargs)
+
+    def __array__(self, dtype=None, copy=None):
+        """Materialize the full grid as a NumPy array."""
+        # pylint: disable=unused-argument
+        grid = self.full()
+        if isinstance(grid, torch.Tensor):
+            grid = grid.cpu().numpy()
+        return grid if dtype is None else grid.astype(dtype)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """Keep sums and scalings separable; materialize otherwise."""
+        if method == '__call__' and not kwargs and ufunc in _UFUNCS:
+            result = _UFUNCS[ufunc](*inputs)
+            if result is not NotImplemented:
+                return result
+        inputs = [np.asarray(arg) if isinstance(arg, SepSum) else arg
+                  for arg in inputs]
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def __getattr__(self, name):
+        """Get any other array attribute or method of the full grid."""
+        if name.startswith('_'):
+            # Private and special names, e.g. those looked up by `copy`
+            raise AttributeError(name)
+        return getattr(np.asarray(self), name)
+
+    def __getitem__(self, key):
+        """Index the full grid."""
+        return self.full()[key]
+
+    def __len__(self):
+        """The length of the first axis of the grid."""
+        return self.shape[0]
+
+    def __repr__(self):
+        """Describe the grid and its terms."""
+        return (f"SepSum(shape={self.shape}, "
+                f"terms={[tuple(term.shape) for term in self.terms]})")
+
+    def __add__(self, other):
+        """Add a scalar, a broadcastable grid, or a `SepSum`."""
+        if isinstance(other, SepSum):
+            return SepSum(self.terms + other.terms, self.shape)
+        if _is_scalar(other) or np.ndim(other) <= self.ndim:
+            try:
+                np.broadcast_shapes(np.shape(other), self.shape)
+            except ValueError:
+                return NotImplemented
+            if _is_scalar(other) and isinstance(self.terms[0], torch.Tensor):
+                other = torch.as_tensor(other, device=self.terms[0].device)
+            return SepSum(self.terms + [other], self.shape)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        """Negate each term."""
+        return self.map(operator.neg)
+
+    def __sub__(self, other):
+        """Subtract a scalar, a broadcastable grid, or a `SepSum`."""
+        return self + (-other)
+
+    def __rsub__(self, other):
+        """Subtract from a scalar or a broadcastable grid."""
+        return (-self) + other
+
+    def __mul__(self, other):
+        """Scale each term, or multiply the full grid by an array."""
+        if _is_scalar(other) and not isinstance(other, SepSum):
+            return self.map(lambda term: term * other)
+        if isinstance(other, SepSum):
+            other = other.full()
+        return self.full() * other
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        """Scale each term, or divide the full grid by an array."""
+        if _is_scalar(other):
+            return self.map(lambda term: term / other)
+        return self.full() / other
+
+    def __rtruediv__(self, other):
+        """Divide by the full grid."""
+        return other / self.full()
+
+    def __pow__(self, other):
+        """Raise the full grid to a power."""
+        return self.full()**other
+
+    def __abs__(self):
+        """Get the absolute value of the full grid."""
+        return abs(self.full())
+
+    def _compare(self, other, func):
+        """Compare the full grid elementwise with `other`."""
+        if isinstance(other, SepSum):
+            other = other.full()
+        return func(self.full(), other)
+
+    def __lt__(self, other):
+        """Compare the full grid elementwise."""
+        return self._compare(other, operator.lt)
+
+    def __le__(self, other):
+        """Compare the full grid elementwise."""
+        return self._compare(other, operator.le)
+
+    def __gt__(self, other):
+        """Compare the full grid elementwise."""
+        return self._compare(other, operator.gt)
+
+    def __ge__(self, other):
+        """Compare the full grid elementwise."""
+        return self._compare(other, operator.ge)
+
+    def __eq__(self, other):
+        """Compare the full grid elementwise."""
+        return self._compare(other, operator.eq)
+
+    def __ne__(self, other):
+        """Compare the full grid elementwise."""
+        return self._compare(other, operator.ne)
+
+    # Unhashable, like arrays, since `__eq__` is elementwise
+    __hash__ = None
+
+
+#: NumPy ufuncs that are evaluated with the operators of :obj:`SepSum`.
+_UFUNCS = {np.add: lambda a, b: (a.__add__(b) if isinstance(a, SepSum)
+                                 else b.__radd__(a)),
+           np.subtract: lambda a, b: (a.__sub__(b) if isinstance(a, SepSum)
+                                      else b.__rsub__(a)),
+           np.multiply: lambda a, b: (a.__mul__(b) if isinstance(a, SepSum)
+                                      else b.__rmul__(a)),
+           np.negative: operator.neg}
+
+
+class SepProd:
+    """An evolution operator that is a product of broadcastable factors.
+
+    Attributes
+    ----------
+    factors : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+        The factors, broadcastable to `shape`.
+    shape : :obj:`tuple` of :obj:`int`
+        The shape of the full operator.
+
+    """
+
+    def __init__(self, factors, shape):
+        """Instantiate a SepProd object; see the class attributes."""
+        self.factors = list(factors)
+        self.shape = tuple(shape)
+
+    def map(self, func):
+        """Apply `func` to each factor, e.g. ``torch.fft.ifftshift``."""
+        return SepProd([func(factor) for factor in self.factors], self.shape)
+
+    def full(self):
+        """Materialize the full operator."""
+        total = self.factors[0]
+        for factor in self.factors[1:]:
+            total = total * factor
+        return _broadcast(total, self.shape)
+
+
+def uniform(value, shape):
+    """Create a uniform :obj:`SepSum` grid of `value`."""
+    return SepSum([value], shape)
+
+
+def mul_(target, oper):
+    """Multiply `target` in place by an operator or a :obj:`SepProd`."""
+    if isinstance(oper, SepProd):
+        for factor in oper.factors:
+            target.mul_(factor)
+    else:
+        target.mul_(oper)
+    return target
+
+
+def materialize(grid):
+    """Get the full grid of a :obj:`SepSum` or :obj:`SepProd`."""
+    if isinstance(grid, (SepSum, SepProd)):
+        return grid.full()
+    return grid
@@ -0,0 +1,77 @@
+"""stream_tools.py module.
+
+Views of the state of a streaming propagation; see
+``tensor_propagator.TensorPropagator.iterate`` and
+``pspinor.PSpinor.stream_real``.
+
+A stream advances only when the consumer asks for the next view, so that a
+feedback loop or an analysis pipeline is a plain Python loop, which may
+stop at any step. Each view holds device copies of the wavefunction, the
+populations, and the observables, and is transferred to the host only on
+request.
+
+"""
+from spinor_gpe.pspinor import tensor_tools as ttools
+
+
+class StateView:
+    """A snapshot of the state of a propagation at a time step.
+
+    Attributes
+    ----------
+    step : :obj:`int`
+        The number of time steps taken since the start of the stream.
+    time : :obj:`float`
+        The propagation time since the start of the stream, [1/omeg_x].
+    psik : :obj:`list` of PyTorch :obj:`Tensor`
+        A device copy of the centered momentum-space wavefunction.
+    pops : PyTorch :obj:`Tensor`
+        The populations of the spin components.
+    observables : :obj:`dict` of PyTorch :obj:`Tensor`
+        The observables of the propagation, evaluated at this step; see
+        ``observable_tools``.
+    space : :obj:`dict` of PyTorch :obj:`Tensor`
+        See ``tensor_propagator.TensorPropagator``.
+
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, step, time, psik, pops, observables, space):
+        """Instantiate a StateView object; see the class attributes."""
+        self.step = step
+        self.time = time
+        self.psik = psik
+        self.pops = pops
+        self.observables = observables
+        self.space = space
+
+    @property
+    def psi(self):
+        """Get the real-space wavefunction, on the device."""
+        return ttools.ifft_nd(self.psik, delta_r=self.space['dr'])
+
+    @property
+    def dens(self):
+        """Get the real-space densities, on the device."""
+        return ttools.density(self.psi)
+
+    def to_numpy(self):
+        """Transfer the view to the host.
+
+        Returns
+        -------
+        state : :obj:`dict`
+            The 'step', 'time', 'psik' and 'pops', and the observables keyed
+            by name, as NumPy arrays.
+
+        """
+        state = {'step': self.step, 'time': self.time,
+                 'psik': ttools.to_numpy(self.psik),
+                 'pops': ttools.to_numpy(self.pops)}
+        state.update({name: ttools.to_numpy(val)
+                      for name, val in self.observables.items()})
+        return state
+
+    def __repr__(self):
+        """Describe the view."""
+        return f"StateView(step={self.step}, time={self.time:.6g})"
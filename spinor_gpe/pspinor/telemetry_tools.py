@@ -0,0 +1,318 @@
+"""telemetry_tools.py module.
+
+Live telemetry of running propagations, and a monitor of many of them.
+
+A :obj:`Publisher` sends a small JSON record every `rate` time steps: the
+run, host and process, the step and simulation time, the steps per second,
+the populations, the energy, the norm relative to that of the first record
+(which drifts in real time), and the host and device memory. The
+propagation loop only queues the record, with its values still on the
+device; a background thread transfers them to the host and writes the
+record, so that the loop is never blocked by I/O. Records that do not fit
+in the queue are dropped.
+
+The target of the records is either an append-only JSONL file, shared by
+any number of runs, or a UDP socket, given as 'udp://host:port'. A
+:obj:`Monitor` follows such files and sockets, and keeps the latest record
+of each run; ``python -m spinor_gpe watch`` shows them as a table.
+
+"""
+import glob
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import warnings
+
+import torch
+
+from spinor_gpe.pspinor import memory_tools as mtools
+
+#: The prefix of UDP targets and sources, as in 'udp://localhost:9999'.
+UDP = 'udp://'
+
+
+def _address(target):
+    """Split a 'udp://host:port' target into a (host, port) address."""
+    host, _, port = target[len(UDP):].rpartition(':')
+    return host or 'localhost', int(port)
+
+
+class Publisher:
+    """Publishes the telemetry records of a propagation.
+
+    Attributes
+    ----------
+    target : :obj:`str`
+        The path of the JSONL file, or the 'udp://host:port' socket.
+    rate : :obj:`int`
+        How often, in time steps, a record is published.
+    run : :obj:`str`
+        The name of the run, in every record.
+    device : :obj:`str`
+        The device of the propagation, whose memory is reported.
+    dropped : :obj:`int`
+        The number of records dropped because the queue was full.
+
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, target, rate, run, device='cpu', max_queue=256):
+        """Set up the publisher; the writer thread starts on first use.
+
+        Parameters
+        ----------
+        target : :obj:`str`
+            The path of a JSONL file, to which records are appended, or a
+            'udp://host:port' socket, to which they are sent as datagrams.
+        rate : :obj:`int`
+            Publish a record every `rate` time steps.
+        run : :obj:`str`
+            The name of the run.
+        device : :obj:`str`, default='cpu'
+            The device of the propagation.
+        max_queue : :obj:`int`, default=256
+            The most records waiting to be written.
+
+        """
+        self.target = target
+        self.rate = max(int(rate), 1)
+        self.run = run
+        self.device = device
+        self.dropped = 0
+        self._header = {'run': run, 'host': socket.gethostname(),
+                        'pid': os.getpid()}
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._norm = None
+
+    @classmethod
+    def from_kwargs(cls, n_steps, run, device, kwargs):
+        """Create a `Publisher` from the `telemetry*` propagation options.
+
+        Returns None if `telemetry` is not given. See
+        ``tensor_propagator.TensorPropagator``.
+
+        """
+        target = kwargs.get('telemetry', None)
+        if target is None:
+            return None
+        return cls(target, kwargs.get('telemetry_rate',
+                                      max(n_steps // 100, 1)),
+                   kwargs.get('telemetry_run', run), device)
+
+    def publish(self, record):
+        """Queue a record, without blocking.
+
+        Parameters
+        ----------
+        record : :obj:`dict`
+            The values of the record; PyTorch tensors are transferred to the
+            host by the writer thread. They must not be modified in place
+            afterwards.
+
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write, daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, record=None):
+        """Write a last record, if given, and the queued records."""
+        if record is not None:
+            self.publish(record)
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _write(self):
+        """Write the queued records until `close`; runs in its own thread."""
+        is_udp = self.target.startswith(UDP)
+        try:
+            if is_udp:
+                sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sink.setblocking(False)
+                address = _address(self.target)
+            else:
+                sink = open(self.target, 'a', encoding='utf-8')
+        except OSError as error:
+            warnings.warn(f"Cannot publish telemetry to {self.target}: "
+                          f"{error}.", RuntimeWarning)
+            sink = None
+
+        if sink is None:
+            while self._queue.get() is not None:
+                pass
+            return
+        with sink:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return
+                line = json.dumps(self._complete(record))
+                try:
+                    if is_udp:
+                        sink.sendto(line.encode(), address)
+                    else:
+                        sink.write(line + '\n')
+                        sink.flush()
+                except OSError:
+                    # Telemetry never interrupts the propagation.
+                    self.dropped += 1
+
+    def _complete(self, record):
+        """Transfer the tensors of a record, and add the header and memory."""
+        values = {key: (val.tolist() if isinstance(val, torch.Tensor)
+                        else val) for key, val in record.items()}
+        if values.get('norm') is not None:
+            self._norm = self._norm or values['norm']
+            values['norm'] /= self._norm
+        return {**self._header, 'wall': time.time(), **values,
+                'memory': mtools.current_memory(self.device),
+                'dropped': self.dropped}
+
+
+class Monitor:
+    """Follows the telemetry of many runs, and keeps their latest records.
+
+    Attributes
+    ----------
+    sources : :obj:`list` of :obj:`str`
+        JSONL files, glob patterns, directories (all their .jsonl files),
+        and 'udp://host:port' sockets to listen on.
+    runs : :obj:`dict` of :obj:`dict`
+        The latest record of each run, keyed by (run, host, pid).
+
+    """
+
+    def __init__(self, sources):
+        """Open the sources; files are read from their start."""
+        if isinstance(sources, str):
+            sources = [sources]
+        self.sources = list(sources)
+        self.runs = {}
+        self._offsets = {}
+        self._sockets = []
+        for source in self.sources:
+            if source.startswith(UDP):
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.bind(_address(source))
+                sock.setblocking(False)
+                self._sockets.append(sock)
+
+    def poll(self):
+        """Read the new records of all the sources.
+
+        Returns
+        -------
+        runs : :obj:`dict` of :obj:`dict`
+            The latest record of each run.
+
+        """
+        for path in self._files():
+            with open(path, encoding='utf-8') as file:
+                file.seek(self._offsets.get(path, 0))
+                for line in iter(file.readline, ''):
+                    if not line.endswith('\n'):
+                        # A partially written record; read it next time.
+                        break
+                    self._offsets[path] = file.tell()
+                    self._update(line)
+        for sock in self._sockets:
+            while True:
+                try:
+                    self._update(sock.recv(65536).decode())
+                except (BlockingIOError, InterruptedError):
+                    break
+        return self.runs
+
+    def table(self):
+        """Format the latest record of each run as a text table."""
+        header = (f"{'run':<24} {'host':<12} {'status':<8} {'step':>15} "
+                  f"{'time':>9} {'steps/s':>9} {'energy':>11} {'norm':>9} "
+                  f"{'pops':>15} {'RSS MB':>8} {'age s':>6}")
+        lines = [header, '-' * len(header)]
+        now = time.time()
+        for record in sorted(self.runs.values(),
+                             key=lambda r: (r['run'], r['host'], r['pid'])):
+            pops = record.get('pops') or [float('nan')] * 2
+            total = sum(pops) or 1.0
+            rss = (record.get('memory') or {}).get('host')
+            lines.append(
+                f"{record['run'][:24]:<24} {record['host'][:12]:<12} "
+                f"{record.get('status', ''):<8} "
+                f"{record['step']:>7}/{record.get('n_steps', 0):<7} "
+                f"{record.get('time', 0.0):>9.4g} "
+                f"{record.get('steps_per_s', 0.0):>9.1f} "
+                f"{_number(record.get('energy')):>11.6g} "
+                f"{_number(record.get('norm')):>9.6f} "
+                f"{pops[0] / total:>7.4f}/{pops[1] / total:<7.4f} "
+                f"{(rss or 0) / 2**20:>8.0f} "
+                f"{now - record.get('wall', now):>6.0f}")
+        return '\n'.join(lines)
+
+    def close(self):
+        """Close the sockets."""
+        for sock in self._sockets:
+            sock.close()
+        self._sockets = []
+
+    def _files(self):
+        """Expand the file sources; new files are picked up as they appear."""
+        paths = []
+        for source in self.sources:
+            if source.startswith(UDP):
+                continue
+            if os.path.isdir(source):
+                source = os.path.join(source, '*.jsonl')
+            paths += sorted(glob.glob(source))
+        return paths
+
+    def _update(self, line):
+        """Keep a record if it is the latest of its run."""
+        try:
+            record = json.loads(line)
+            key = (record['run'], record['host'], record['pid'])
+        except (ValueError, KeyError, TypeError):
+            return
+        self.runs[key] = record
+
+
+def _number(value):
+    """Format missing values as NaN."""
+    return float('nan') if value is None else value
+
+
+def watch(sources, interval=1.0, once=False):
+    """Show the latest telemetry of many runs, refreshed every `interval`.
+
+    Parameters
+    ----------
+    sources : :obj:`iterable` of :obj:`str`
+        See :obj:`Monitor`.
+    interval : :obj:`float`, default=1.0
+        The refresh interval [s].
+    once : :obj:`bool`, default=False
+        Print the table once, rather than refreshing it until interrupted.
+
+    """
+    monitor = Monitor(sources)
+    try:
+        while True:
+            monitor.poll()
+            if once:
+                print(monitor.table())
+                return
+            # Clear the terminal, then draw the table
+            print('\033[2J\033[H' + monitor.table(), flush=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.close()
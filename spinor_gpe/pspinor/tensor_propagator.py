@@ -1,11 +1,39 @@
 """Placeholder for the tensor_propagator.py module."""
+import contextlib
+import os
+import time as tm
+import warnings
+
 import numpy as np
 import torch
 from tqdm import tqdm
 
 from spinor_gpe.pspinor import tensor_tools as ttools
+from spinor_gpe.pspinor import grid_tools as gtools
+from spinor_gpe.pspinor import health_tools as htools
+from spinor_gpe.pspinor import memory_tools as mtools
 from spinor_gpe.pspinor.plotting_tools import next_available_path
 from spinor_gpe.pspinor import prop_result
+from spinor_gpe.pspinor import observable_tools as otools
+from spinor_gpe.pspinor import profiling_tools as pftools
+from spinor_gpe.pspinor import sampling_tools as smtools
+from spinor_gpe.pspinor import separable_tools as sptools
+from spinor_gpe.pspinor import stream_tools as sttools
+from spinor_gpe.pspinor import telemetry_tools as tmtools
+
+#: Complex and real tensor dtypes for each floating-point precision.
+PRECISIONS = {'double': (torch.complex128, torch.float64),
+              'single': (torch.complex64, torch.float32)}
+
+#: The names of the propagation options; see `TensorPropagator`.
+OPTIONS = frozenset([
+    'lean', 'observables', 'obs_rate', 'precision', 'progress', 'profile',
+    'trace', 'reset_peak', 'sample_space', 'sample_quantity', 'sample_window',
+    'sample_decimate', 'sample_threshold', 'sample_metric',
+    'sample_min_interval', 'sample_max_interval', 'sample_check_rate',
+    'sample_budget', 'grid_tol', 'grid_rate', 'health_action', 'health_rate',
+    'health_tol', 'health_retries', 'telemetry', 'telemetry_rate',
+    'telemetry_run'])
 
 
 class TensorPropagator:
@@ -22,7 +50,7 @@ class TensorPropagator:
     t_step : :obj:`float` or :obj:`complex`
         Duration of the full time step.
     dt_out : :obj:`float` or :obj:`complex`
-        Duration of the outer time sub-step.
+        Duration of the outer time sub-step of each substep.
     dt_in : :obj:`float` or :obj:`complex`
         Duration of the inner time sub-step.
     rand_seed : :obj:`int`
@@ -35,17 +63,27 @@ class TensorPropagator:
         See ``pspinor.Pspinor``.
     g_sc : :obj:`dict` of :obj:`Tensor`
         See `pspinor.Pspinor`.
-    kin_eng_spin : :obj:`list` of :obj:`Tensor`
-        See ``pspinor.Pspinor``.
-    pot_eng_spin : :obj:`list` of :obj:`Tensor`
+    kin_eng_spin : :obj:`list` of :obj:`Tensor` or :obj:`SepSum`
+        See ``pspinor.Pspinor``. Separable grids are kept as their terms.
+    pot_eng_spin : :obj:`list` of :obj:`Tensor` or :obj:`SepSum`
         See ``pspinor.Pspinor``.
     psik : :obj:`list` of :obj:`Tensor`
-        See `pspinor.Pspinor`.
+        See `pspinor.Pspinor`. Internally the propagator keeps the
+        momentum-space wavefunction in unshifted FFT order; this property
+        returns a centered copy.
+    precision : :obj:`str`
+        The floating-point precision, {'double', 'single'}.
+    dtype : :obj:`torch.dtype`
+        The complex dtype of the wavefunction tensors.
+    real_dtype : :obj:`torch.dtype`
+        The real dtype of the energy grids and densities.
     space : :obj:`dict` of :obj:`Tensor`
         See `pspinor.Pspinor`. Contains only keys:
-            {'dr', 'dk', 'x_mesh', 'y_mesh', 'dv_r', 'dv_k'}
+            {'dr', 'dk', 'x_mesh', 'y_mesh', 'dv_r', 'dv_k'}; 'y_mesh' is
+            absent for a quasi-1D `PSpinor`.
     coupling : :obj:`Tensor`
-        See `pspinor.Pspinor`.
+        See `pspinor.Pspinor`. A separable coupling is kept as the smallest
+        tensor that broadcasts to the grid.
     kL_recoil : :obj:`float`
         See ``pspinor.Pspinor``.
     expon : :obj:`Tensor`
@@ -53,10 +91,54 @@ class TensorPropagator:
         the coupling is in a rotated reference frame, then `expon`=0.0.
     sample_rate : :obj:`int`
         How often wavefunctions are sampled.
+    sampler : :obj:`Sampler`
+        Reduces the sampled wavefunctions on the device; see
+        ``sampling_tools.Sampler``.
+    trigger : :obj:`Trigger` or None
+        Decides when to sample, for adaptive sampling; see
+        ``sampling_tools.Trigger``.
     eng_out : :obj:`dict` of :obj:`Tensor`
         Pre-computed energy evolution operators for the outer time sub-step.
+        The kinetic operators are stored in unshifted FFT order. Operators
+        of separable grids are :obj:`SepProd` products of 1D factors.
     eng_in : :obj:`dict` of :obj:`Tensor`
         Pre-computed energy evolution operators for the inner time sub-step.
+    work : :obj:`dict`
+        Workspace buffers, allocated once and reused by every time step:
+        the real-space wavefunction 'psi', the densities 'dens', the
+        interaction operator 'int_op', and a coupling scratch grid 'tmp'.
+    observables : :obj:`dict` of callable
+        Observables evaluated on the device during propagation. See
+        ``observable_tools``.
+    obs_rate : :obj:`int`
+        How often, in time steps, the observables are evaluated.
+    timer : :obj:`PhaseTimer` or :obj:`NullTimer`
+        Accumulates the time spent in each phase of the propagation loop
+        when profiling is enabled. See ``profiling_tools``.
+    trace : :obj:`bool`
+        Option to export a Chrome trace of the propagation loop.
+    reset_peak : :obj:`bool`
+        Option to reset the peak memory counters of the process at the start
+        of the propagation.
+    grid_tol : :obj:`float` or None
+        The threshold of the boundary and spectral-tail weights, above which
+        a warning is raised; None disables the check.
+    grid_rate : :obj:`int`
+        How often, in time steps, the grid weights are checked.
+    grid_weights : :obj:`dict` of :obj:`float`
+        The largest checked 'edge' and 'tail' weights; see ``grid_tools``.
+    watchdog : :obj:`Watchdog` or None
+        Checks the numerical health of the propagation; see
+        ``health_tools.Watchdog``.
+    substeps : :obj:`int`
+        The number of full steps taken per time step; more than one after
+        the watchdog has halved the time step.
+    norm_factor : :obj:`Tensor` or None
+        The norm before the last renormalization, relative to `atom_num`;
+        constant in real time, up to the unnormalized FFTs.
+    telemetry : :obj:`Publisher` or None
+        Publishes live telemetry of the propagation; see
+        ``telemetry_tools.Publisher``.
 
     """
 
@@ -65,7 +147,7 @@ class TensorPropagator:
 
     # pylint: disable=too-many-instance-attributes
     def __init__(self, spin, t_step, n_steps, device='cpu', time='imag',
-                 is_sampling=False, n_samples=1):
+                 is_sampling=False, n_samples=1, **kwargs):
         """Begin a propagation loop.
 
         Parameters
@@ -85,41 +167,167 @@ class TensorPropagator:
         is_sampling : :obj:`bool`, default=False
             Option to sample and save wavefunctions throughout the propagation.
         n_samples : :obj:`int`, default=1
-            The number of samples to save.
+            The number of samples to save; with adaptive sampling, the most
+            samples that are saved.
+
+        Other Parameters
+        ----------------
+        lean : :obj:`bool`, optional
+            Option to return a lean `PropResult`, which holds only the final
+            `psik` and recomputes the real-space quantities on every access,
+            rather than caching them. Default is False.
+        observables : :obj:`list` or :obj:`dict`, optional
+            Observables to evaluate on the device during propagation. Either
+            a :obj:`list` of built-in names, e.g. ['com', 'width',
+            'peak_dens', 'separation', 'polarization'], or a :obj:`dict`
+            mapping names to built-in names or to callables
+            ``func(psi, psik, space)``. See ``observable_tools``.
+        obs_rate : :obj:`int`, optional
+            Evaluate the observables every `obs_rate` time steps; the
+            default is every step.
+        precision : :obj:`str`, optional
+            Floating-point precision of the propagation, {'double',
+            'single'}. Default is 'double'.
+        progress : :obj:`bool`, optional
+            Option to display a progress bar. Default is True.
+        profile : :obj:`bool`, optional
+            Option to time each phase of the split-step loop (FFTs, operator
+            multiplies, normalization, sampling). The per-phase breakdown,
+            steps per second, and effective memory bandwidth are stored in
+            `PropResult.profile`. Default is False.
+        trace : :obj:`bool`, optional
+            Option to record the propagation with ``torch.profiler`` and
+            export it as a Chrome trace to
+            `data/prop_trace%s-`folder_name`.json`. Implies `profile`.
+            Default is False.
+        reset_peak : :obj:`bool`, optional
+            Option to reset the peak memory counters of the whole process at
+            the start of the propagation, so that `PropResult.metrics`
+            reports the peak of this run rather than of the process; see
+            ``memory_tools.reset_peak_memory``. Default is False.
+        sample_space : :obj:`str`, optional
+            Sample the real- ('r') or momentum-space ('k') wavefunction.
+            Default is 'k'.
+        sample_quantity : :obj:`str`, optional
+            Sample the complex wavefunction ('field'), its density ('dens'),
+            or its phase ('phase'). Default is 'field'.
+        sample_window : :obj:`iterable`, optional
+            The ((x_min, x_max), (y_min, y_max)) window of the grid to
+            sample, in the units of `sample_space`. Default is the full grid.
+        sample_decimate : :obj:`int` or :obj:`iterable` of :obj:`int`, optional
+            Average the samples over blocks of this many points along each
+            axis. Default is 1.
+        sample_threshold : :obj:`float`, optional
+            Enables adaptive sampling: a sample is taken whenever the change
+            metric since the last sample reaches this threshold, rather than
+            at a fixed stride, and `n_steps` need not be a multiple of
+            `n_samples`. The exact step of each sample is saved with it. See
+            ``sampling_tools.Trigger``.
+        sample_metric : :obj:`str`, optional
+            The change metric of adaptive sampling: the relative L2 change of
+            the real-space densities ('dens'), or the largest change of the
+            population fractions ('pops'). Default is 'dens'.
+        sample_min_interval : :obj:`int`, optional
+            The fewest time steps between adaptive samples. Default is 1.
+        sample_check_rate : :obj:`int`, optional
+            Evaluate the change metric of adaptive sampling every
+            `sample_check_rate` time steps, once `sample_min_interval` steps
+            have passed since the last sample. Default is
+            `sample_min_interval`.
+        sample_max_interval : :obj:`int`, optional
+            The most time steps between adaptive samples. By default there is
+            no limit.
+        sample_budget : :obj:`int`, optional
+            The storage budget of adaptive sampling [bytes], which replaces
+            `n_samples` as the limit on the number of samples.
+        grid_tol : :obj:`float`, optional
+            Warn when the fraction of atoms in the outer 10% of the
+            real-space grid (boundary weight), or of the momentum-space grid
+            (spectral-tail weight), exceeds this threshold, i.e. when the
+            grid is too small or too coarse. By default there is no check.
+        grid_rate : :obj:`int`, optional
+            Check the grid weights every `grid_rate` time steps. Default is
+            every 1% of `n_steps`.
+        health_action : :obj:`str`, optional
+            Enables a watchdog of the numerical health of the propagation;
+            see ``health_tools``. On a failed check, 'warn' and continue;
+            'abort' at the last healthy checkpoint, which is saved to
+            `trial_data/checkpoint%s_`folder_name`.npz`; or rewind to it and
+            'halve' the time step. The outcome is stored in
+            `PropResult.health`. By default there is no watchdog.
+        health_rate : :obj:`int`, optional
+            Run the health checks every `health_rate` time steps. Default is
+            every 1% of `n_steps`.
+        health_tol : :obj:`dict` of :obj:`float`, optional
+            Thresholds of the relative 'norm' and 'energy' drifts (in real
+            time), and of the 'edge' and 'tail' weights, replacing those in
+            ``health_tools.TOLERANCES``.
+        health_retries : :obj:`int`, optional
+            The most times the time step is halved. Default is 3.
+        telemetry : :obj:`str`, optional
+            Publishes live telemetry to this append-only JSONL file, or to a
+            'udp://host:port' socket; see ``telemetry_tools``. By default
+            there is no telemetry.
+        telemetry_rate : :obj:`int`, optional
+            Publish a record every `telemetry_rate` time steps; evaluating
+            the energy of a record costs about one time step. Default is
+            every 1% of `n_steps`.
+        telemetry_run : :obj:`str`, optional
+            The name of the run in the records. Default is the folder name.
 
         """
-        self.n_steps = n_steps
         self.device = device
-        self.paths = spin.paths
+        self.precision = kwargs.get('precision', 'double')
+        self.dtype, self.real_dtype = PRECISIONS[self.precision]
+        # The substeps and their evolution operators; see `set_substeps`
+        self.substeps, self.dt_out, self.dt_in = 1, None, None
+        self.eng_out, self.eng_in = None, None
+        self._op_step = None
+        self.load(spin)
+        self.configure(spin, t_step, n_steps, time, is_sampling, n_samples,
+                       **kwargs)
 
-        # Calculate the time step intervals
-        if time == 'imag':
-            self.t_step = -1.0j * t_step
-        elif time == 'real':
-            self.t_step = t_step
+    def load(self, spin):
+        """Upload the grids and the wavefunction of a `PSpinor` to the device.
 
-        magic_gamma = 1 / (2 + 2**(1 / 3))
-        self.dt_out = self.t_step * magic_gamma
-        self.dt_in = self.t_step * (1 - 2 * magic_gamma)
+        On the CPU, grids with a matching dtype share their memory with the
+        NumPy arrays of `spin`, rather than being copied.
 
-        self.rand_seed = spin.rand_seed
-        if self.rand_seed is not None:
-            torch.manual_seed(self.rand_seed)
-        self.is_sampling = is_sampling
+        Parameters
+        ----------
+        spin :  :obj:`PSpinor`
+            The energy and spatial grids are taken from this object and
+            converted to PyTorch :obj:`Tensor` objects.
 
-        # Load in data from PSpinor object as tensors
+        """
+        real_dtype = self.real_dtype
         self.atom_num = spin.atom_num
         self.is_coupling = spin.is_coupling
         self.g_sc = spin.g_sc
         self.kin_eng_spin = ttools.to_tensor(spin.kin_eng_spin,
-                                             dev=self.device)
+                                             dev=self.device, dtype=real_dtype)
         self.pot_eng_spin = ttools.to_tensor(spin.pot_eng_spin,
-                                             dev=self.device)
-        self.psik = ttools.to_tensor(spin.psik, dev=self.device, dtype=128)
+                                             dev=self.device, dtype=real_dtype)
+        self.load_psik(spin.psik)
+        self.work = {'psi': [torch.empty_like(pk) for pk in self._psik],
+                     'dens': [torch.empty(pk.shape, dtype=real_dtype,
+                                          device=self.device)
+                              for pk in self._psik],
+                     'int_op': [torch.empty_like(pk) for pk in self._psik],
+                     'tmp': torch.empty_like(self._psik[0])}
+        self._pops = torch.zeros(2, dtype=real_dtype, device=self.device)
         keys_space = ['dr', 'dk', 'x_mesh', 'y_mesh', 'dv_r', 'dv_k']
+        # A quasi-1D `PSpinor` has no y-axis
         self.space = {k: torch.tensor(spin.space[k], device=self.device)
-                      for k in keys_space}
-        self.coupling = ttools.to_tensor(spin.coupling, dev=self.device)
+                      for k in keys_space if k in spin.space}
+        for key in ['x_mesh', 'y_mesh']:
+            if key in self.space:
+                self.space[key] = self.space[key].to(real_dtype)
+        self.coupling = ttools.to_tensor(spin.coupling, dev=self.device,
+                                         dtype=real_dtype)
+        if isinstance(self.coupling, sptools.SepSum):
+            # Broadcasts in the 2x2 coupling operator
+            self.coupling = self.coupling.compact()
 
         # pylint: disable=invalid-name
         self.kL_recoil = spin.kL_recoil
@@ -127,14 +335,105 @@ class TensorPropagator:
             self.expon = torch.tensor(0.0)
         else:
             self.expon = 2 * self.kL_recoil * self.space['x_mesh']
+        # The time step of the evolution operators
+        self._op_step = None
+
+    def load_psik(self, psik):
+        """Upload a centered momentum-space wavefunction to the device.
+
+        Parameters
+        ----------
+        psik : :obj:`list` of NumPy :obj:`array`
+            The centered momentum-space wavefunction components.
+
+        """
+        self.psik = ttools.to_tensor(psik, dev=self.device, dtype=self.dtype)
+
+    # pylint: disable=too-many-arguments
+    def configure(self, spin, t_step, n_steps, time='imag', is_sampling=False,
+                  n_samples=1, **kwargs):
+        """Set up a propagation on the loaded grids and wavefunction.
+
+        A propagator can be configured for any number of successive
+        propagations; the wavefunction on the device carries over from one
+        to the next. See `TensorPropagator` for the parameters.
+
+        Raises
+        ------
+        TypeError
+            If an option is not one of `OPTIONS`, e.g. a misspelled name.
+
+        """
+        unknown = sorted(set(kwargs) - OPTIONS)
+        if unknown:
+            raise TypeError(f"Unknown propagation options {unknown}; the "
+                            f"options are {sorted(OPTIONS)}.")
+        assert kwargs.get('precision', 'double') == self.precision, (
+            f"The propagator was loaded in {self.precision} precision.")
+        self.n_steps = n_steps
+        self.paths = spin.paths
+
+        # Calculate the time step intervals
+        if time == 'imag':
+            self.t_step = -1.0j * t_step
+        elif time == 'real':
+            self.t_step = t_step
+
+        self.rand_seed = spin.rand_seed
+        if self.rand_seed is not None:
+            torch.manual_seed(self.rand_seed)
+        self.is_sampling = is_sampling
+
+        self.sampler = smtools.Sampler.from_kwargs(self._psik[0].shape,
+                                                   spin.space['dr'], kwargs)
+        self.trigger = smtools.Trigger.from_kwargs(n_samples,
+                                                   self.sampler.nbytes, kwargs)
         # Calculate the sampling and annealing rates, as needed.
-        if self.is_sampling:
+        if self.is_sampling and self.trigger is None:
             assert self.n_steps % n_samples == 0, (
                 f"The number of samples requested {n_samples} does not evenly "
                 f"divide the total number of steps {self.n_steps}.")
 
         self.sample_rate = self.n_steps / n_samples
-        # Pre-compute several evolution operators
+        self.observables = otools.parse_observables(kwargs.get('observables'))
+        self.obs_rate = kwargs.get('obs_rate', 1)
+        self.trace = kwargs.get('trace', False)
+        self.reset_peak = kwargs.get('reset_peak', False)
+        self.progress = kwargs.get('progress', True)
+        self.lean = kwargs.get('lean', False)
+        self.grid_tol = kwargs.get('grid_tol', None)
+        self.grid_rate = kwargs.get('grid_rate', max(n_steps // 100, 1))
+        self.grid_weights = {'edge': 0.0, 'tail': 0.0}
+        self.watchdog = htools.Watchdog.from_kwargs(n_steps, time == 'real',
+                                                    kwargs)
+        self.norm_factor = None
+        self.telemetry = tmtools.Publisher.from_kwargs(
+            n_steps, self.paths['folder'], self.device, kwargs)
+        if kwargs.get('profile', False) or self.trace:
+            self.timer = pftools.PhaseTimer(self.device, record=self.trace)
+        else:
+            self.timer = pftools.NullTimer()
+        self.set_substeps(1)
+
+    def set_substeps(self, substeps):
+        """Divide each time step into a number of equal substeps.
+
+        Parameters
+        ----------
+        substeps : :obj:`int`
+            The number of full steps taken per time step.
+
+        """
+        self.substeps = substeps
+        step = self.t_step / substeps
+        magic_gamma = 1 / (2 + 2**(1 / 3))
+        self.dt_out = step * magic_gamma
+        self.dt_in = step * (1 - 2 * magic_gamma)
+
+        # Pre-compute several evolution operators, unless already loaded
+        if step == self._op_step:
+            return
+        self._op_step = step
         self.eng_out = {'kin': ttools.evolution_op(self.dt_out / 2,
                                                    self.kin_eng_spin),
                         'pot': ttools.evolution_op(self.dt_out,
@@ -147,6 +446,20 @@ class TensorPropagator:
                                                   self.pot_eng_spin),
                        'coupl': ttools.coupling_op(self.dt_in / 2,
                                                    self.coupling, self.expon)}
+        for eng in [self.eng_out, self.eng_in]:
+            eng['kin'] = [op.map(torch.fft.ifftshift)
+                          if isinstance(op, sptools.SepProd)
+                          else torch.fft.ifftshift(op) for op in eng['kin']]
+
+    @property
+    def psik(self):
+        """Get the centered momentum-space wavefunction."""
+        return [torch.fft.fftshift(pk) for pk in self._psik]
+
+    @psik.setter
+    def psik(self, tensors):
+        """Set the momentum-space wavefunction from centered tensors."""
+        self._psik = [torch.fft.ifftshift(pk).contiguous() for pk in tensors]
 
     def prop_loop(self, n_steps):
         """Evaluate the propagation steps in a for-loop.
@@ -154,6 +467,8 @@ class TensorPropagator:
         Saves the spin populations at every time step. If wavefunctions are
         sampled throughout the propagation, they are saved with the associated
         sampled times in `trial_data/psik_sampled%s_`folder_name`.npz.
+        Observables are evaluated every `obs_rate` steps and buffered on the
+        device until the end of the loop.
 
         Parameters
         ----------
@@ -170,47 +485,399 @@ class TensorPropagator:
         spinor_gpe.prop_results : Propagation results
 
         """
-        pop_times = np.linspace(0, self.n_steps * np.abs(self.t_step), n_steps)
-        pops = {'times': pop_times, 'vals': np.empty((n_steps, 2))}
+        timer = self.timer
+        run = self._start_run(n_steps)
+
+        # Main propagation loop
+        n_done = n_steps
+        progress_bar = tqdm(total=n_steps, disable=not self.progress)
+        with run['tracer']:
+            _i = 0
+            while _i < n_steps:
+                if self.watchdog is not None and _i % self.watchdog.rate == 0:
+                    resume, last = self._check_health(_i, run)
+                    if resume is not None and resume < 0:
+                        n_done = last
+                        break
+                    if resume is not None:
+                        _i = resume
+                        progress_bar.n = _i
+                        progress_bar.refresh()
+                        continue
+                if self.is_sampling:
+                    self._sample(_i, run)
+                self._evaluate(_i, run)
+                if (self.telemetry is not None
+                        and _i % self.telemetry.rate == 0):
+                    self._publish(_i, run)
+
+                for _ in range(self.substeps):
+                    self.full_step()
+
+                # Store the populations on the device
+                timer.switch('pops')
+                run['pops'][_i] = self._pops
+                _i += 1
+                progress_bar.update()
+            timer.stop()
+        progress_bar.close()
+        return self._finish_result(run, n_done)
+
+    def _start_run(self, n_steps):
+        """Set up the tracer, the clock, and the buffers of `prop_loop`.
+
+        Returns
+        -------
+        run : :obj:`dict`
+            The state of the loop: the 'n_steps', the profiler 'tracer', the
+            'start' time, whether the peak memory 'is_reset', the device
+            buffer of the populations 'pops', the host buffer of the
+            'samples' and their 'sample_times' (None if not sampling), the
+            device buffers of the observables 'obs', and the steps at which
+            they were evaluated, 'obs_steps'.
+
+        """
+        if self.trace:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.device(self.device).type == 'cuda':
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            tracer = torch.profiler.profile(activities=activities)
+        else:
+            tracer = contextlib.nullcontext()
+        run = {'n_steps': n_steps, 'tracer': tracer,
+               'is_reset': (self.reset_peak
+                            and mtools.reset_peak_memory(self.device)),
+               'start': tm.perf_counter(),
+               'pops': torch.empty((n_steps, 2), dtype=self._pops.dtype,
+                                   device=self.device),
+               'samples': None, 'sample_times': None,
+               'obs': {name: [] for name in self.observables},
+               'obs_steps': []}
 
         # Pre-allocate arrays for efficient sampling.
         if self.is_sampling:
             n_samples = int(n_steps / self.sample_rate)
-            sampled_psik = np.empty((n_samples, 2, *self.psik[0].shape),
-                                    dtype=np.complex128)
-            sampled_times = np.linspace(0, self.n_steps * np.abs(self.t_step),
-                                        n_samples)
+            if self.trigger is not None:
+                n_samples = self.trigger.max_samples
+            run['samples'] = np.empty((n_samples, *self.sampler.shape),
+                                      dtype=self.sampler.dtype)
+            run['sample_times'] = np.linspace(
+                0, self.n_steps * np.abs(self.t_step), n_samples)
+        return run
 
-        # Main propagation loop
-        for _i in tqdm(range(n_steps)):
-            if self.is_sampling:
-                if _i % self.sample_rate == 0:
-                    idx = int(_i / self.sample_rate)
-                    sampled_psik[idx] = np.array(ttools.to_numpy(self.psik))
+    def _check_health(self, step, run):
+        """Run the watchdog, and discard what followed a failed check.
+
+        Returns
+        -------
+        resume : :obj:`int` or None
+            None if the propagation is healthy; otherwise the step to resume
+            from, or a negative value if the propagation is aborted. See
+            ``health_tools.Watchdog.check``.
+        last : :obj:`int`
+            The last healthy step.
 
-            self.full_step()
+        """
+        self.timer.switch('health')
+        resume = self.watchdog.check(self, step)
+        if resume is None:
+            return None, step
+        # Discard what followed the healthy checkpoint
+        checkpoint = self.watchdog.checkpoint
+        last = step if checkpoint is None else checkpoint['step']
+        self._truncate(run['obs'], run['obs_steps'], last + (resume < 0))
+        if self.trigger is not None:
+            self.trigger.rewind(last + (resume < 0))
+        return resume, last
 
-            # Calculate and store populations
-            pops['vals'][_i] = ttools.calc_pops(self.psik, self.space['dv_k'])
+    def _sample(self, step, run):
+        """Sample the wavefunction, if it is due at `step`."""
+        # Reduced on the device; a single transfer
+        if self.trigger is not None:
+            self.timer.switch('sample')
+            if self.trigger.is_due(step, self):
+                run['samples'][self.trigger.n_samples] = ttools.to_numpy(
+                    self.sampler(self.psik, self.space['dr']))
+                self.trigger.record(step, self)
+        elif step % self.sample_rate == 0:
+            self.timer.switch('sample')
+            run['samples'][int(step / self.sample_rate)] = ttools.to_numpy(
+                self.sampler(self.psik, self.space['dr']))
 
-        energy = self.eng_expect(self.psik)
+    def _evaluate(self, step, run):
+        """Evaluate the observables, and check the grid, when due."""
+        if self.observables and step % self.obs_rate == 0:
+            self.timer.switch('observables')
+            self.eval_observables(run['obs'])
+            run['obs_steps'].append(step)
+        if self.grid_tol is not None and step % self.grid_rate == 0:
+            self.timer.switch('grid_check')
+            self.check_grid(step)
 
-        if self.is_sampling:
-            # Saves sampled wavefunctions to file; times are in dimensionless
-            # time units
-            test_name = self.paths['trial'] + 'psik_sampled'
-            file_name = next_available_path(test_name,
-                                            self.paths['folder'], '.npz')
-            np.savez(file_name, psiks=sampled_psik, times=sampled_times)
+    def _publish(self, step, run):
+        """Publish a telemetry record at `step`."""
+        self.timer.switch('telemetry')
+        self.telemetry.publish(self.telemetry_record(step, run['n_steps'],
+                                                     run['start']))
+
+    def _save_samples(self, run, n_done):
+        """Save the sampled wavefunctions of `prop_loop`.
+
+        Returns
+        -------
+        file_name : :obj:`str`
+            The path of the .npz archive; times are in dimensionless time
+            units.
+
+        """
+        test_name = self.paths['trial'] + 'psik_sampled'
+        file_name = next_available_path(test_name, self.paths['folder'],
+                                        '.npz')
+        samples, times = run['samples'], run['sample_times']
+        extra = {}
+        if self.trigger is not None:
+            # The exact times of the adaptive samples
+            extra['steps'] = np.array(self.trigger.steps, dtype=int)
+            samples = samples[:self.trigger.n_samples]
+            times = extra['steps'] * np.abs(self.t_step)
+        elif n_done < run['n_steps']:
+            n_kept = min(int(n_done / self.sample_rate) + 1, len(samples))
+            samples = samples[:n_kept]
+            times = times[:n_kept]
+        if self.sampler.is_full:
+            np.savez(file_name, psiks=samples, times=times, **extra)
         else:
-            file_name = None
+            np.savez(file_name, samples=samples, times=times, **extra,
+                     **self.sampler.meta())
+        return file_name
 
+    def _profile(self, run, n_done):
+        """Report the phase timings, and export the trace, if recorded."""
+        grid_bytes = self.psik[0].element_size() * self.psik[0].numel()
+        profile = self.timer.report(n_done, tm.perf_counter() - run['start'],
+                                    grid_bytes, len(self.psik))
+        if self.trace:
+            trace_name = next_available_path(
+                self.paths['data'] + 'prop_trace', self.paths['folder'],
+                '.json')
+            run['tracer'].export_chrome_trace(trace_name)
+            profile['trace'] = trace_name
+        return profile
+
+    def _finish_result(self, run, n_done):
+        """Assemble the `PropResult` of `prop_loop` after `n_done` steps."""
+        timer, n_steps, start_time = self.timer, run['n_steps'], run['start']
+        if self.telemetry is not None:
+            status = 'aborted' if n_done < n_steps else 'done'
+            self.telemetry.close(self.telemetry_record(n_done, n_steps,
+                                                       start_time, status))
+
+        timer.switch('eng_expect')
+        energy = self.eng_expect(self.psik)
+
+        timer.switch('io')
+        file_name = None
+        if self.is_sampling:
+            file_name = self._save_samples(run, n_done)
         psik = ttools.to_numpy(self.psik)
-        psi = ttools.ifft_2d(psik, ttools.to_numpy(self.space['dr']))
+        pops = {'times': np.linspace(0, self.n_steps * np.abs(self.t_step),
+                                     n_steps)[:n_done],
+                'vals': ttools.to_numpy(run['pops'][:n_done]).astype(float)}
+        if self.watchdog is not None:
+            health = self.watchdog.report
+            if health['status'] == 'aborted':
+                health['checkpoint'] = self.save_checkpoint(psik, n_done)
 
-        result = prop_result.PropResult(psi, psik, energy, pops, file_name)
+        # A single device-to-host transfer per observable
+        observables = {name: ttools.to_numpy(torch.stack(vals))
+                       for name, vals in run['obs'].items()}
+        if observables:
+            observables['times'] = (np.array(run['obs_steps'])
+                                    * np.abs(self.t_step))
+        timer.stop()
+
+        # The real-space wavefunction is computed on first access
+        result = prop_result.PropResult(None, psik, energy, pops, file_name,
+                                        observables, self.lean)
+        written = [file_name]
+        if self.watchdog is not None:
+            result.health = health
+            written.append(health['checkpoint'])
+        if isinstance(timer, pftools.PhaseTimer):
+            result.profile = self._profile(run, n_done)
+            written.append(result.profile.get('trace'))
+        result.metrics = pftools.run_metrics(
+            n_done, tm.perf_counter() - start_time, self._psik[0].shape,
+            self.device, self.dtype, peak=mtools.peak_memory(self.device),
+            is_reset=run['is_reset'],
+            written=sum(os.path.getsize(path) for path in written if path))
         return result
 
+    def iterate(self, n_steps=None, every=1):
+        """Propagate lazily, yielding a view of the state every few steps.
+
+        The propagation advances only when the next view is requested, and
+        may be stopped at any view; the wavefunction on the device is then
+        that of the last view, and a later `iterate` or `prop_loop` resumes
+        from it. Only the observables are evaluated, at each view; the
+        wavefunction is not sampled to disk, and neither the health watchdog
+        nor the telemetry run.
+
+        Parameters
+        ----------
+        n_steps : :obj:`int`, optional
+            The number of time steps. By default, the stream does not end.
+        every : :obj:`int`, default=1
+            The number of time steps between views. The last view is at
+            `n_steps`, even if it is not a multiple of `every`.
+
+        Yields
+        ------
+        view : :obj:`StateView`
+            The state after each `every` time steps; see
+            ``stream_tools.StateView``.
+
+        """
+        every = max(int(every), 1)
+        step = 0
+        while n_steps is None or step < n_steps:
+            n_next = every if n_steps is None else min(every, n_steps - step)
+            for _ in range(n_next * self.substeps):
+                self.full_step()
+            step += n_next
+            psik = self.psik
+            yield sttools.StateView(step, step * float(np.abs(self.t_step)),
+                                    psik, self._pops, self.observe(psik),
+                                    self.space)
+
+    def telemetry_record(self, step, n_steps, start_time, status='running'):
+        """Collect a telemetry record, with its values still on the device.
+
+        Parameters
+        ----------
+        step : :obj:`int`
+            The current time step.
+        n_steps : :obj:`int`
+            The number of time steps of the propagation.
+        start_time : :obj:`float`
+            The ``time.perf_counter`` at the start of the propagation.
+        status : :obj:`str`, default='running'
+            The status of the propagation, {'running', 'done', 'aborted'}.
+
+        Returns
+        -------
+        record : :obj:`dict`
+            See ``telemetry_tools.Publisher``.
+
+        """
+        psik = self.psik
+        psi = ttools.ifft_nd(psik, delta_r=self.space['dr'])
+        energy = htools.energy(psik, psi, self.space, self.kin_eng_spin,
+                               self.pot_eng_spin, self.coupling, self.g_sc,
+                               self.expon)
+        elapsed = tm.perf_counter() - start_time
+        # There are no populations before the first step
+        is_stepped = self.norm_factor is not None
+        return {'status': status, 'step': step, 'n_steps': n_steps,
+                'time': step * float(np.abs(self.t_step)),
+                'steps_per_s': step / elapsed if elapsed > 0 else 0.0,
+                'pops': self._pops if is_stepped else None,
+                'energy': energy.real, 'norm': self.norm_factor}
+
+    @staticmethod
+    def _truncate(buffer, steps, stop):
+        """Drop the observables evaluated at or after step `stop`."""
+        n_kept = sum(step < stop for step in steps)
+        del steps[n_kept:]
+        for vals in buffer.values():
+            del vals[n_kept:]
+
+    def save_checkpoint(self, psik, step):
+        """Save a wavefunction to resume an aborted propagation from.
+
+        The wavefunction is saved with its step and time to
+        `trial_data/checkpoint%s_`folder_name`.npz`.
+
+        Parameters
+        ----------
+        psik : :obj:`list` of NumPy :obj:`array`
+            The centered momentum-space wavefunction.
+        step : :obj:`int`
+            The time step of the wavefunction.
+
+        Returns
+        -------
+        file_name : :obj:`str`
+            The path to the checkpoint.
+
+        """
+        file_name = next_available_path(self.paths['trial'] + 'checkpoint',
+                                        self.paths['folder'], '.npz')
+        np.savez(file_name, psik=psik, step=step,
+                 time=step * np.abs(self.t_step))
+        return file_name
+
+    def eval_observables(self, buffer):
+        """Evaluate the observables and append them to the device buffer.
+
+        Parameters
+        ----------
+        buffer : :obj:`dict` of :obj:`list`
+            The device-resident buffers of previously evaluated values,
+            keyed by observable name.
+
+        """
+        for name, value in self.observe().items():
+            buffer[name].append(value)
+
+    def observe(self, psik=None):
+        """Evaluate the observables on the device.
+
+        Parameters
+        ----------
+        psik : :obj:`list` of PyTorch :obj:`Tensor`, optional
+            The centered momentum-space wavefunction. Defaults to `psik`.
+
+        Returns
+        -------
+        values : :obj:`dict` of PyTorch :obj:`Tensor`
+            The values of the observables, keyed by name.
+
+        """
+        if psik is None:
+            psik = self.psik
+        psi = ttools.ifft_nd(psik, delta_r=self.space['dr'])
+        return {name: torch.as_tensor(func(psi, psik, self.space),
+                                      device=self.device)
+                for name, func in self.observables.items()}
+
+    def check_grid(self, step=None):
+        """Check the boundary and spectral-tail weights of the wavefunction.
+
+        Warns the first time that either weight exceeds `grid_tol`, and
+        keeps the largest weights in `grid_weights`.
+
+        Parameters
+        ----------
+        step : :obj:`int`, optional
+            The current time step, for the warning message.
+
+        """
+        psik = self.psik
+        psi = ttools.ifft_nd(psik, delta_r=self.space['dr'])
+        weights = {'edge': gtools.edge_weight(psi).item(),
+                   'tail': gtools.tail_weight(psik).item()}
+        advice = {'edge': "increase `r_sizes`",
+                  'tail': "increase `mesh_points`"}
+        for key, weight in weights.items():
+            if (self.grid_tol is not None and weight > self.grid_tol
+                    and self.grid_weights[key] <= self.grid_tol):
+                warnings.warn(f"At step {step}, {weight:.2e} of the atoms "
+                              f"are at the {key} of the grid, above the "
+                              f"threshold of {self.grid_tol:.2e}; "
+                              f"{advice[key]}.", RuntimeWarning)
+            self.grid_weights[key] = max(self.grid_weights[key], weight)
+
     def full_step(self):
         """Full step forward in real or imaginary time.
 
@@ -228,6 +895,10 @@ class TensorPropagator:
         symmetrically split into two half-single steps around the full-single
         step potential energy operator.
 
+        The step runs in place on the workspace buffers, and allocates no new
+        grids. The FFTs are unnormalized and unshifted; the scale factors are
+        absorbed by the renormalization that follows each transform.
+
         Parameters
         ----------
         t_step : :obj:`float`
@@ -237,38 +908,91 @@ class TensorPropagator:
             to the given sub-time step.
 
         """
+        timer = self.timer
+        psik, psi = self._psik, self.work['psi']
+        dens, int_op = self.work['dens'], self.work['int_op']
         # First half step of the kinetic energy operator
-        # psik = self.psik
-        psik = [eng * pk for eng, pk in zip(eng['kin'], self.psik)]
-        psi = ttools.ifft_2d(psik, delta_r=self.space['dr'])
-        psi, dens = ttools.norm(psi, self.space['dv_r'], self.atom_num)
+        timer.switch('kin')
+        for op, pk in zip(eng['kin'], psik):
+            sptools.mul_(pk, op)
+        timer.switch('ifft')
+        for pk, p in zip(psik, psi):
+            torch.fft.ifftn(pk, out=p)
+        timer.switch('norm')
+        self._norm(psi, self.space['dv_r'])
 
         # First half step of the interaction energy operator
-        int_eng = [self.g_sc['uu'] * dens[0] + self.g_sc['ud'] * dens[1],
-                   self.g_sc['dd'] * dens[1] + self.g_sc['ud'] * dens[0]]
-        int_op = ttools.evolution_op(t_step / 2, int_eng)
-        psi = [op * p for op, p in zip(int_op, psi)]
+        timer.switch('int')
+        torch.mul(dens[0], self.g_sc['uu'], out=int_op[0])
+        int_op[0].add_(dens[1], alpha=self.g_sc['ud'])
+        torch.mul(dens[1], self.g_sc['dd'], out=int_op[1])
+        int_op[1].add_(dens[0], alpha=self.g_sc['ud'])
+        for op, p in zip(int_op, psi):
+            op.mul_(-1.0j * (t_step / 2)).exp_()
+            p.mul_(op)
         # First half step of the coupling energy operator
         if self.is_coupling:
-            psi = [sum([elem * p for elem, p in zip(row, psi)])
-                   for row in eng['coupl']]
+            timer.switch('coupl')
+            self._couple(psi, eng['coupl'])
         # Full step of the potential energy operator
-        psi = [eng * p for eng, p in zip(eng['pot'], psi)]
+        timer.switch('pot')
+        for op, p in zip(eng['pot'], psi):
+            sptools.mul_(p, op)
         # Second half step of the coupling energy operator
         if self.is_coupling:
-            psi = [sum([elem * p for elem, p in zip(row, psi)])
-                   for row in eng['coupl']]
+            timer.switch('coupl')
+            self._couple(psi, eng['coupl'])
         # Second half step of the interaction energy operator
         # ??? Is renormalization needed? It's not in previous code versions.
-        # psi, dens = ttools.norm(psi, self.space['dv_r'], self.atom_num)
-        # int_eng = [self.g_sc['uu'] * dens[0] + self.g_sc['ud'] * dens[1],
-        #            self.g_sc['dd'] * dens[1] + self.g_sc['ud'] * dens[0]]
-        # int_op = ttools.evolution_op(t_step / 2, int_eng)
-        psi = [op * p for op, p in zip(int_op, psi)]
+        timer.switch('int')
+        for op, p in zip(int_op, psi):
+            p.mul_(op)
         # Second half step of the kintetic energy operator
-        psik = ttools.fft_2d(psi, delta_r=self.space['dr'])
-        psik = [eng * pk for eng, pk in zip(eng['kin'], psik)]
-        self.psik, _ = ttools.norm(psik, self.space['dv_k'], self.atom_num)
+        timer.switch('fft')
+        for p, pk in zip(psi, psik):
+            torch.fft.fftn(p, out=pk)
+        timer.switch('kin')
+        for op, pk in zip(eng['kin'], psik):
+            sptools.mul_(pk, op)
+        timer.switch('norm')
+        self._pops = self._norm(psik, self.space['dv_k'], scale_dens=False)
+
+    def _couple(self, psi, coupl_op):
+        """Apply the 2x2 coupling operator to `psi` in place."""
+        tmp = self.work['tmp']
+        torch.mul(coupl_op[0][0], psi[0], out=tmp)
+        tmp.addcmul_(coupl_op[0][1], psi[1])
+        psi[1].mul_(coupl_op[1][1]).addcmul_(coupl_op[1][0], psi[0])
+        # Swap the buffers, rather than copying the new component.
+        self.work['tmp'], psi[0] = psi[0], tmp
+
+    def _norm(self, psi, vol_elem, scale_dens=True):
+        """Normalize `psi` in place, as in ``tensor_tools.norm``.
+
+        The component densities are written into the 'dens' workspace, and,
+        if `scale_dens`, normalized as well.
+
+        Returns
+        -------
+        pops : :obj:`Tensor`
+            The populations of the normalized components.
+
+        """
+        dens = self.work['dens']
+        for p, d in zip(psi, dens):
+            torch.mul(p.real, p.real, out=d)
+            d.addcmul_(p.imag, p.imag)
+        sums = torch.stack([d.sum() for d in dens])
+        total = sums.sum()
+        norm_factor = total * vol_elem / self.atom_num
+        self.norm_factor = norm_factor
+        scale = torch.rsqrt(norm_factor)
+        for p in psi:
+            p.mul_(scale)
+        if scale_dens:
+            for d in dens:
+                d.div_(norm_factor)
+        return sums * (self.atom_num / total)
 
     def eng_expect(self, psik):
         """Compute the energy expectation value of the wavefunction.
@@ -297,12 +1021,12 @@ class TensorPropagator:
             psik = ttools.to_numpy(psik)
         delta_r = ttools.to_numpy(self.space['dr'])
 
-        psi = ttools.ifft_2d(psik, delta_r)
+        psi = ttools.ifft_nd(psik, delta_r)
         dens = ttools.density(psi)
         dens_sqrt = [np.sqrt(d) for d in dens]
 
         phase = ttools.phase(psi, uwrap=True, dens=dens)
-        phase_gradx = [ph_x for ph_x, _ in ttools.grad(phase, delta_r)]
+        phase_gradx = [grd[0] for grd in ttools.grad(phase, delta_r)]
         phase_gradsq = ttools.grad_sq(phase, delta_r)
 
         kin = (sum(ttools.grad_sq(dens_sqrt, delta_r))
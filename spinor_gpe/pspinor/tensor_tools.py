@@ -1,21 +1,55 @@
 """tensor_tools.py module."""
 import operator
+import os
 from functools import reduce
 
 import numpy as np
 import torch
+from scipy import fft as sfft
+from scipy.ndimage import maximum_filter
 from skimage import restoration as rest
 
+from spinor_gpe.pspinor import separable_tools as sptools
+
 # ??? How should the individual FFT operations be normalized? Should they
 # remain as norm="backward", or, because of the nature of our operations,
 # changed to norm="ortho"?
 
+#: Number of worker threads for the NumPy (``scipy.fft``) FFTs; -1 uses all
+#: the CPU cores. Set with `set_threads`.
+FFT_WORKERS = -1
+
+
+def set_threads(n_threads=None):
+    """Set the number of CPU threads used for host computations.
+
+    Applies to the ``scipy.fft`` transforms of NumPy arrays in this module,
+    and to PyTorch's intra-op parallelism on the CPU.
+
+    Parameters
+    ----------
+    n_threads : :obj:`int`, optional
+        The number of threads. By default, all the CPU cores are used.
+
+    """
+    global FFT_WORKERS  # pylint: disable=global-statement
+    if n_threads is None:
+        n_threads = os.cpu_count() or 1
+    FFT_WORKERS = n_threads
+    torch.set_num_threads(n_threads)
+
+
+def get_threads():
+    """Get the number of CPU threads used for host computations."""
+    return os.cpu_count() if FFT_WORKERS == -1 else FFT_WORKERS
+
 
 def to_numpy(input_tens):
     """Convert from PyTorch Tensor to NumPy arrays.
 
     Accepts a single PyTorch Tensor, or a :obj:`list` of PyTorch Tensor,
-    as in the wavefunction objects.
+    as in the wavefunction objects. The terms of a :obj:`SepSum` are
+    converted individually.
 
     Parameters
     ----------
@@ -30,7 +64,10 @@ def to_numpy(input_tens):
 
     """
     if isinstance(input_tens, list):
-        output_tens = [inp.cpu().numpy() for inp in input_tens]
+        output_tens = [to_numpy(inp) for inp in input_tens]
+
+    elif isinstance(input_tens, sptools.SepSum):
+        output_tens = input_tens.map(to_numpy)
 
     elif isinstance(input_tens, torch.Tensor):
         output_tens = input_tens.cpu().numpy()
@@ -42,7 +79,8 @@ def to_tensor(input_arr, dev='cpu', dtype=64):
     """Convert from NumPy arrays to Tensors.
 
     Accepts a single NumPy array, or a :obj:`list` of NumPy arrays, as in the
-    wavefunction objects.
+    wavefunction objects. The terms of a :obj:`SepSum` are converted
+    individually.
 
     Parameters
     ----------
@@ -52,13 +90,15 @@ def to_tensor(input_arr, dev='cpu', dtype=64):
     dev : :obj:`str`, default='cpu'
         The name of the device on which to store the tensor,
         e.g. {'cpu', 'cuda', 'cuda:0'}
-    dtype : :obj:`int`, default=64
+    dtype : :obj:`int` or :obj:`torch.dtype`, default=64
         Designator for the torch dtype -
 
         * 32  : :obj:`torch.float32`;
         * 64  : :obj:`torch.float64`;
         * 128 : :obj:`torch.complex128`
 
+        A :obj:`torch.dtype` may also be given directly.
+
     Returns
     -------
     output_tens : PyTorch :obj:`Tensor` or :obj:`list` of PyTorch :obj:`Tensor`
@@ -66,13 +106,20 @@ def to_tensor(input_arr, dev='cpu', dtype=64):
 
     """
     all_dtypes = {32: torch.float32, 64: torch.float64, 128: torch.complex128}
+    if not isinstance(dtype, torch.dtype):
+        dtype = all_dtypes[dtype]
     if isinstance(input_arr, list):
-        output_tens = [torch.as_tensor(inp, dtype=all_dtypes[dtype],
-                                       device=dev) for inp in input_arr]
+        output_tens = [to_tensor(inp, dev, dtype) for inp in input_arr]
+
+    elif isinstance(input_arr, sptools.SepSum):
+        # Only the terms of a separable grid are transferred
+        output_tens = input_arr.map(lambda arr: to_tensor(arr, dev, dtype))
 
     elif isinstance(input_arr, np.ndarray):
-        output_tens = torch.as_tensor(input_arr, dtype=all_dtypes[dtype],
-                                      device=dev)
+        if not input_arr.flags.writeable:
+            # Tensors cannot share the memory of read-only arrays.
+            input_arr = np.array(input_arr)
+        output_tens = torch.as_tensor(input_arr, dtype=dtype, device=dev)
 
     return output_tens
 
@@ -127,7 +174,7 @@ def to_gpu(input_tens, dev='cuda'):
     return output_tens
 
 
-def fft_1d(psi, delta_r=(1, 1), axis=0) -> list:
+def fft_1d(psi, delta_r=(1, 1), axis=0, workers=None) -> list:
     """Compute the forward 1D FFT of `psi` along a single axis.
 
     Parameters
@@ -140,6 +187,9 @@ def fft_1d(psi, delta_r=(1, 1), axis=0) -> list:
     axis : :obj:`int`, default=0
         The axis along which to transform; note that 0 -> y-axis, and
         1 -> x-axis.
+    workers : :obj:`int`, optional
+        Number of threads for transforming NumPy arrays. Defaults to
+        `FFT_WORKERS`.
 
     Returns
     -------
@@ -151,9 +201,10 @@ def fft_1d(psi, delta_r=(1, 1), axis=0) -> list:
     normalization = delta_r[axis] / np.sqrt(2 * np.pi)
 
     if isinstance(psi[0], np.ndarray):
-        psik_axis = [np.fft.fftn(p, axes=[true_ax[axis]]) * normalization
-                     for p in psi]
-        psik_axis = [np.fft.fftshift(pk, axes=true_ax[axis])
+        workers = FFT_WORKERS if workers is None else workers
+        psik_axis = [sfft.fft(p, axis=true_ax[axis], workers=workers)
+                     * normalization for p in psi]
+        psik_axis = [sfft.fftshift(pk, axes=true_ax[axis])
                      for pk in psik_axis]
     elif isinstance(psi[0], torch.Tensor):
         psik_axis = [torch.fft.fftn(p, dim=[true_ax[axis]]) * normalization
@@ -164,7 +215,7 @@ def fft_1d(psi, delta_r=(1, 1), axis=0) -> list:
     return psik_axis
 
 
-def ifft_1d(psik, delta_r=(1, 1), axis=0) -> list:
+def ifft_1d(psik, delta_r=(1, 1), axis=0, workers=None) -> list:
     """Compute the inverse 1D FFT of `psi` along a single axis.
 
     Parameters
@@ -177,6 +228,9 @@ def ifft_1d(psik, delta_r=(1, 1), axis=0) -> list:
     axis : :obj:`int`, default=0
         The axis along which to transform; note that 0 -> x-axis, and
         1 -> y-axis.
+    workers : :obj:`int`, optional
+        Number of threads for transforming NumPy arrays. Defaults to
+        `FFT_WORKERS`.
 
     Returns
     -------
@@ -187,8 +241,11 @@ def ifft_1d(psik, delta_r=(1, 1), axis=0) -> list:
     true_ax = [1, 0]  # Makes the x/y axes correspond to 0/1
     normalization = delta_r[axis] / np.sqrt(2 * np.pi)
     if isinstance(psik[0], np.ndarray):
-        psi_axis = [np.fft.ifftshift(pk, axes=true_ax[axis]) for pk in psik]
-        psi_axis = [np.fft.ifftn(p, axes=[true_ax[axis]]) / normalization
+        workers = FFT_WORKERS if workers is None else workers
+        psi_axis = [sfft.ifftshift(pk, axes=true_ax[axis]) for pk in psik]
+        # The shifted copies may be overwritten by the transform.
+        psi_axis = [sfft.ifft(p, axis=true_ax[axis], overwrite_x=True,
+                              workers=workers) / normalization
                     for p in psi_axis]
     elif isinstance(psik[0], torch.Tensor):
         psi_axis = [torch.fft.ifftshift(pk, dim=true_ax[axis]) for pk in psik]
@@ -198,16 +255,22 @@ def ifft_1d(psik, delta_r=(1, 1), axis=0) -> list:
     return psi_axis
 
 
-def fft_2d(psi, delta_r=(1, 1)) -> list:
-    """Compute the forward 2D FFT of `psi`.
+def fft_nd(psi, delta_r=(1, 1), workers=None) -> list:
+    """Compute the forward FFT of `psi` over all of its axes.
+
+    The transform is normalized for any number of dimensions, by the
+    real-space volume element and a factor of 1/sqrt(2 pi) per axis.
 
     Parameters
     ----------
     psi : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
         The input wavefunction.
     delta_r : NumPy :obj:`array`, default=(1,1)
-        A two-element list of the real-space x- and y-mesh spacings,
-        respectively. Typically, use `ps.space['dr']`.
+        The real-space mesh spacings, one per axis. Typically, use
+        `ps.space['dr']`.
+    workers : :obj:`int`, optional
+        Number of threads for transforming NumPy arrays. Defaults to
+        `FFT_WORKERS`.
 
     Returns
     -------
@@ -215,11 +278,13 @@ def fft_2d(psi, delta_r=(1, 1)) -> list:
         The k-space FFT of the input wavefunction.
 
     """
-    normalization = prod(delta_r) / (2 * np.pi)  #: FFT normalization factor
+    #: FFT normalization factor
+    normalization = prod(delta_r) / (2 * np.pi)**(len(delta_r) / 2)
 
     if isinstance(psi[0], np.ndarray):
-        psik = [np.fft.fftn(p) * normalization for p in psi]
-        psik = [np.fft.fftshift(pk) for pk in psik]
+        workers = FFT_WORKERS if workers is None else workers
+        psik = [sfft.fftn(p, workers=workers) for p in psi]
+        psik = [sfft.fftshift(pk) * normalization for pk in psik]
 
     elif isinstance(psi[0], torch.Tensor):
         psik = [torch.fft.fftn(p) * normalization for p in psi]
@@ -228,16 +293,19 @@ def fft_2d(psi, delta_r=(1, 1)) -> list:
     return psik
 
 
-def ifft_2d(psik, delta_r=(1, 1)) -> list:
-    """Compute the inverse 2D FFT of `psik`.
+def ifft_nd(psik, delta_r=(1, 1), workers=None) -> list:
+    """Compute the inverse FFT of `psik` over all of its axes.
 
     Parameters
     ----------
     psik : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
         The input wavefunction.
     delta_r : NumPy :obj:`array`, default=(1,1)
-        A two-element list of the real-sapce x- and y-mesh spacings,
-        respectively. Typically, use `ps.space['dr']`.
+        The real-space mesh spacings, one per axis. Typically, use
+        `ps.space['dr']`.
+    workers : :obj:`int`, optional
+        Number of threads for transforming NumPy arrays. Defaults to
+        `FFT_WORKERS`.
 
     Returns
     -------
@@ -245,11 +313,15 @@ def ifft_2d(psik, delta_r=(1, 1)) -> list:
         The real-space FFT of the input wavefunction.
 
     """
-    normalization = prod(delta_r) / (2 * np.pi)  #: FFT normalization factor
+    #: FFT normalization factor
+    normalization = prod(delta_r) / (2 * np.pi)**(len(delta_r) / 2)
 
     if isinstance(psik[0], np.ndarray):
-        psik = [np.fft.ifftshift(pk) for pk in psik]
-        psi = [np.fft.ifftn(p) / normalization for p in psik]
+        workers = FFT_WORKERS if workers is None else workers
+        psik = [sfft.ifftshift(pk) for pk in psik]
+        # The shifted copies may be overwritten by the transform.
+        psi = [sfft.ifftn(p, overwrite_x=True, workers=workers)
+               / normalization for p in psik]
 
     elif isinstance(psik[0], torch.Tensor):
         psik = [torch.fft.ifftshift(pk) for pk in psik]
@@ -258,6 +330,60 @@ def ifft_2d(psik, delta_r=(1, 1)) -> list:
     return psi
 
 
+def fft_2d(psi, delta_r=(1, 1), workers=None) -> list:
+    """Compute the forward 2D FFT of `psi`.
+
+    Parameters
+    ----------
+    psi : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+        The input wavefunction.
+    delta_r : NumPy :obj:`array`, default=(1,1)
+        A two-element list of the real-space x- and y-mesh spacings,
+        respectively. Typically, use `ps.space['dr']`.
+    workers : :obj:`int`, optional
+        Number of threads for transforming NumPy arrays. Defaults to
+        `FFT_WORKERS`.
+
+    Returns
+    -------
+    psik : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+        The k-space FFT of the input wavefunction.
+
+    See Also
+    --------
+    fft_nd : The FFT of any dimension.
+
+    """
+    return fft_nd(psi, delta_r, workers)
+
+
+def ifft_2d(psik, delta_r=(1, 1), workers=None) -> list:
+    """Compute the inverse 2D FFT of `psik`.
+
+    Parameters
+    ----------
+    psik : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+        The input wavefunction.
+    delta_r : NumPy :obj:`array`, default=(1,1)
+        A two-element list of the real-sapce x- and y-mesh spacings,
+        respectively. Typically, use `ps.space['dr']`.
+    workers : :obj:`int`, optional
+        Number of threads for transforming NumPy arrays. Defaults to
+        `FFT_WORKERS`.
+
+    Returns
+    -------
+    psi : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+        The real-space FFT of the input wavefunction.
+
+    See Also
+    --------
+    ifft_nd : The inverse FFT of any dimension.
+
+    """
+    return ifft_nd(psik, delta_r, workers)
+
+
 def norm(psi, vol_elem, atom_num, pop_frac=None):
     """
     Normalize spinor wavefunction to the expected atom numbers and populations.
@@ -340,6 +466,8 @@ def grad_comp(psi_comp, delta_r):
     if isinstance(psi_comp, np.ndarray):
         delta_r = np.array(delta_r)
         g_comp = np.gradient(psi_comp, *delta_r)
+        if psi_comp.ndim == 1:
+            g_comp = [g_comp]
     elif isinstance(psi_comp, torch.Tensor):
         raise NotImplementedError(("Spatial gradients for tensors are not yet "
                                   "implemented."))
@@ -352,9 +480,7 @@ def grad_comp(psi_comp, delta_r):
 
 def grad_sq_comp(psi_comp, delta_r):
     """Take a list of tensors or np arrays; checks type."""
-    grd_x, grd_y = grad_comp(psi_comp, delta_r)
-
-    return grd_x**2 + grd_y**2
+    return sum(grd**2 for grd in grad_comp(psi_comp, delta_r))
 
 
 def grad_sq(psi, delta_r):
@@ -539,6 +665,67 @@ def phase_comp(psi_comp, uwrap=False, dens=None):
     return ang
 
 
+def find_vortices(psi_comp, delta_r=(1, 1), origin=(0, 0), dens_cut=1e-2,
+                  mask_size=None):
+    """Locate the quantized vortices of a single wavefunction component.
+
+    The phase winding is summed around every elementary plaquette of the
+    real-space mesh; plaquettes with a non-zero winding contain a phase
+    singularity. Plaquettes where the local background density is below a
+    fraction `dens_cut` of the peak density are ignored, which suppresses the
+    ghost vortices in the low-density region outside the condensate.
+
+    Parameters
+    ----------
+    psi_comp : 2D NumPy :obj:`array` or PyTorch :obj:`Tensor`
+        A single real-space wavefunction component.
+    delta_r : NumPy :obj:`array`, default=(1, 1)
+        A two-element list of the real-space x- and y-mesh spacings,
+        respectively. Typically, use `ps.space['dr']`.
+    origin : :obj:`iterable` of :obj:`float`, default=(0, 0)
+        The (x, y) coordinates of the mesh point `psi_comp[0, 0]`.
+    dens_cut : :obj:`float`, default=1e-2
+        Relative density below which plaquettes are ignored.
+    mask_size : :obj:`int`, optional
+        Size, in mesh points, of the neighborhood over which the background
+        density is taken; it should exceed the vortex core size. Defaults to
+        1/16 of the smallest mesh dimension.
+
+    Returns
+    -------
+    positions : NumPy :obj:`array`
+        Array of shape (n_vortices, 2) with the (x, y) coordinates of the
+        plaquette centers containing a vortex.
+    windings : NumPy :obj:`array` of :obj:`int`
+        The winding number of each vortex, typically +1 or -1.
+
+    """
+    if isinstance(psi_comp, torch.Tensor):
+        psi_comp = psi_comp.cpu().numpy()
+    ang = np.angle(psi_comp)
+    dens = np.abs(psi_comp)**2
+
+    def wrap(diff):
+        return (diff + np.pi) % (2 * np.pi) - np.pi
+
+    # Phase differences along the four edges of each plaquette (y, x order).
+    circ = (wrap(ang[:-1, 1:] - ang[:-1, :-1])
+            + wrap(ang[1:, 1:] - ang[:-1, 1:])
+            + wrap(ang[1:, :-1] - ang[1:, 1:])
+            + wrap(ang[:-1, :-1] - ang[1:, :-1]))
+    winding = np.rint(circ / (2 * np.pi)).astype(int)
+
+    if mask_size is None:
+        mask_size = max(3, min(dens.shape) // 16)
+    background = maximum_filter(dens, size=mask_size)[:-1, :-1]
+    winding[background < dens_cut * dens.max()] = 0
+
+    idx_y, idx_x = np.nonzero(winding)
+    positions = np.stack([origin[0] + (idx_x + 0.5) * delta_r[0],
+                          origin[1] + (idx_y + 0.5) * delta_r[1]], axis=-1)
+    return positions, winding[idx_y, idx_x]
+
+
 def inner_prod():
     """Calculate the inner product of two wavefunctions."""
 
@@ -546,14 +733,26 @@ def inner_prod():
 def evolution_op(t_step, energy):
     """Compute the unitary time-evolution operator for the given energy.
 
+    The operator of a separable energy grid is the product of the
+    operators of its terms; see ``separable_tools``.
+
     Parameters
     ----------
-    energy :
-    time_step :
+    t_step : :obj:`float` or :obj:`complex`
+        The time step.
+    energy : PyTorch :obj:`Tensor`, :obj:`SepSum`, or :obj:`list` thereof
+        The energy grid, or the grids of each spin component.
+
+    Returns
+    -------
+    ev_op : PyTorch :obj:`Tensor`, :obj:`SepProd`, or :obj:`list` thereof
+        The evolution operator.
 
     """
     if isinstance(energy, list):
-        ev_op = [torch.exp(-1.0j * eng * t_step) for eng in energy]
+        ev_op = [evolution_op(t_step, eng) for eng in energy]
+    elif isinstance(energy, sptools.SepSum):
+        ev_op = energy.exp(-1.0j * t_step)
     else:
         ev_op = torch.exp(-1.0j * energy * t_step)
 
@@ -600,8 +799,42 @@ def prod(factors):
     return reduce(operator.mul, factors, 1)
 
 
-def expect_val(psi):
-    """Compute the expectation value of the supplied spatial operator."""
-    raise NotImplementedError(("Function for computing the expectation "
-                               "value of an arbitrary spatial operator "
-                               "is not implemented."))
+def expect_val(psi, oper, vol_elem=1.0, normalize=True):
+    """Compute the expectation value of the supplied spatial operator.
+
+    The operator is diagonal in the representation of `psi`, e.g. a function
+    of position for a real-space wavefunction or of momentum for a k-space
+    wavefunction.
+
+    Parameters
+    ----------
+    psi : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+        The input spinor wavefunction, or a single component.
+    oper : NumPy :obj:`array`, PyTorch :obj:`Tensor`, or :obj:`list` thereof
+        The operator grid. A :obj:`list` supplies a separate operator for
+        each spin component; otherwise the same operator is applied to all
+        components.
+    vol_elem : :obj:`float`, default=1.0
+        Volume element for either real- or k-space. It cancels out when
+        `normalize` is True.
+    normalize : :obj:`bool`, default=True
+        Option to divide by the norm of each component, giving the
+        per-particle expectation value.
+
+    Returns
+    -------
+    value : :obj:`float`, 0D PyTorch :obj:`Tensor`, or :obj:`list` thereof
+        The expectation value in each spin component. For PyTorch inputs the
+        values remain on the device of `psi`.
+
+    """
+    if not isinstance(psi, list):
+        return expect_val([psi], oper, vol_elem, normalize)[0]
+    if not isinstance(oper, list):
+        oper = [oper] * len(psi)
+
+    dens = density(psi)
+    value = [(d * op).sum() * vol_elem for d, op in zip(dens, oper)]
+    if normalize:
+        value = [val / (d.sum() * vol_elem) for val, d in zip(value, dens)]
+    return value
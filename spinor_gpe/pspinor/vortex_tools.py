@@ -0,0 +1,146 @@
+"""vortex_tools.py module.
+
+Linking of per-frame vortex detections into trajectories.
+
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class VortexTracker:
+    """Streaming nearest-neighbour linker of vortex positions into tracks.
+
+    Frames are supplied one at a time with :meth:`update`. The positions of
+    the currently active vortices are stored in a k-d tree, so each frame is
+    assigned in O(n log n) time rather than by comparing all pairs of
+    vortices. Unassigned detections start new tracks (creation events), and
+    active tracks without a partner in the new frame are terminated
+    (annihilation events). Only the compact per-detection records are kept in
+    memory, never the frames themselves.
+
+    Attributes
+    ----------
+    max_dist : :obj:`float`
+        The largest distance a vortex may move between consecutive frames
+        and still be linked to its previous position.
+    n_tracks : :obj:`int`
+        The number of tracks created so far.
+
+    """
+
+    def __init__(self, max_dist):
+        """Instantiate a VortexTracker object.
+
+        Parameters
+        ----------
+        max_dist : :obj:`float`
+            The maximum linking distance between consecutive frames.
+
+        """
+        self.max_dist = max_dist
+        self.n_tracks = 0
+
+        self._n_frames = 0
+        self._active = {'ids': np.empty(0, dtype=int),
+                        'pos': np.empty((0, 2)),
+                        'wind': np.empty(0, dtype=int)}
+        self._records = []
+        self._events = []
+        self._track_wind = []
+        self._track_start = []
+        self._track_stop = []
+
+    def update(self, positions, windings):
+        """Link the vortices of the next frame to the active tracks.
+
+        Parameters
+        ----------
+        positions : NumPy :obj:`array`
+            Array of shape (n_vortices, 2) of the (x, y) vortex positions.
+        windings : NumPy :obj:`array` of :obj:`int`
+            The winding number of each vortex.
+
+        Returns
+        -------
+        ids : NumPy :obj:`array` of :obj:`int`
+            The track id assigned to each of the supplied vortices.
+
+        """
+        frame = self._n_frames
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        windings = np.asarray(windings, dtype=int)
+        ids = np.full(len(positions), -1, dtype=int)
+        matched_old = np.zeros(len(self._active['ids']), dtype=bool)
+
+        if len(positions) and len(self._active['ids']):
+            tree = cKDTree(self._active['pos'])
+            n_near = min(3, len(self._active['ids']))
+            dists, near = tree.query(positions, k=n_near,
+                                     distance_upper_bound=self.max_dist)
+            dists = dists.reshape(len(positions), n_near)
+            near = near.reshape(len(positions), n_near)
+
+            # Greedy assignment of the closest candidate pairs first.
+            new_idx, cand = np.nonzero(np.isfinite(dists))
+            order = np.argsort(dists[new_idx, cand], kind='stable')
+            for i, j in zip(new_idx[order], near[new_idx, cand][order]):
+                if ids[i] >= 0 or matched_old[j]:
+                    continue
+                if windings[i] != self._active['wind'][j]:
+                    continue
+                ids[i] = self._active['ids'][j]
+                matched_old[j] = True
+
+        # Active tracks without a partner are annihilated in this frame.
+        for track in self._active['ids'][~matched_old]:
+            self._track_stop[track] = frame
+            self._events.append((frame, track, -1))
+
+        # Unmatched detections are created in this frame.
+        for i in np.nonzero(ids < 0)[0]:
+            ids[i] = self.n_tracks
+            self.n_tracks += 1
+            self._track_wind.append(windings[i])
+            self._track_start.append(frame)
+            self._track_stop.append(-1)
+            if frame > 0:
+                self._events.append((frame, ids[i], 1))
+
+        self._active = {'ids': ids, 'pos': positions, 'wind': windings}
+        self._records.append(np.column_stack([np.full(len(ids), frame),
+                                              ids, positions]))
+        self._n_frames += 1
+        return ids
+
+    def result(self):
+        """Compact trajectory arrays of all the frames processed so far.
+
+        Returns
+        -------
+        tracks : :obj:`dict` of NumPy :obj:`array`
+            Per-detection records {'frame', 'track', 'x', 'y'}, sorted by
+            track and then by frame; per-track summaries {'ids', 'winding',
+            'start', 'stop'}, where a `stop` value of -1 marks a track that
+            survives to the last frame; and the creation (+1) and
+            annihilation (-1) events {'event_frame', 'event_track',
+            'event_kind'}.
+
+        """
+        if self._records:
+            records = np.concatenate(self._records)
+        else:
+            records = np.empty((0, 4))
+        records = records[np.lexsort((records[:, 0], records[:, 1]))]
+        events = np.array(self._events, dtype=int).reshape(-1, 3)
+
+        tracks = {'frame': records[:, 0].astype(int),
+                  'track': records[:, 1].astype(int),
+                  'x': records[:, 2], 'y': records[:, 3],
+                  'ids': np.arange(self.n_tracks),
+                  'winding': np.array(self._track_wind, dtype=int),
+                  'start': np.array(self._track_start, dtype=int),
+                  'stop': np.array(self._track_stop, dtype=int),
+                  'event_frame': events[:, 0],
+                  'event_track': events[:, 1],
+                  'event_kind': events[:, 2]}
+        return tracks
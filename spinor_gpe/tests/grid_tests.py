@@ -0,0 +1,56 @@
+"""Test script for automatic grid sizing.
+
+For the default trap, `PSpinor.suggest_grid` should give a 64x64 grid
+without coupling, and a 120x120 grid once the Raman recoil momentum must
+also be resolved. A ground state found on the suggested grid should then
+pass the grid check of the propagator.
+
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+import warnings
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import pspinor as spin  # noqa: E402
+
+DATA_PATH = tempfile.mkdtemp()
+GRID_TOL = 1e-3
+
+
+def suggested_sizes():
+    """Pin the suggested grids of the default trap."""
+    ps = spin.PSpinor(DATA_PATH, overwrite=True)
+    mesh_points, r_sizes = ps.suggest_grid()
+    assert mesh_points == (64, 64), mesh_points
+    ps.coupling_setup()
+    mesh_points, coupled_sizes = ps.suggest_grid()
+    assert mesh_points == (120, 120), mesh_points
+    assert np.allclose(r_sizes, coupled_sizes)
+    mesh_points, _ = ps.suggest_grid(pow2=True)
+    assert mesh_points == (128, 128), mesh_points
+    print("Test `suggested_sizes` passed.")
+
+
+def suggested_ground_state():
+    """Find a coupled ground state on the suggested grid."""
+    ps = spin.PSpinor(DATA_PATH, overwrite=True)
+    ps.coupling_setup()
+    mesh_points, r_sizes = ps.suggest_grid()
+    ps = spin.PSpinor(DATA_PATH, overwrite=True, mesh_points=mesh_points,
+                      r_sizes=r_sizes)
+    ps.coupling_setup()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        _, prop = ps.imaginary(1/50, 200, 'cpu', grid_tol=GRID_TOL,
+                               grid_rate=20, progress=False)
+    assert max(prop.grid_weights.values()) <= GRID_TOL, prop.grid_weights
+    print("Test `suggested_ground_state` passed.")
+
+
+if __name__ == "__main__":
+    suggested_sizes()  # The grids suggested for the default trap
+    suggested_ground_state()  # The grid check on the suggested grid
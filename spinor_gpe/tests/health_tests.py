@@ -0,0 +1,71 @@
+"""Test script for the numerical health watchdog.
+
+The watchdog should not mistake the renormalization of a momentum-shifted
+wavefunction for an energy drift. When its first check already fails,
+'abort' and 'halve' should abort at once, while 'warn' continues.
+
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+import warnings
+sys.path.insert(0, os.path.abspath('../..'))
+
+from spinor_gpe.pspinor import pspinor as spin  # noqa: E402
+
+DATA_PATH = tempfile.mkdtemp()
+N_STEPS = 100
+
+
+def ground_state():
+    """Converge a small coupled ground state."""
+    ps = spin.PSpinor(DATA_PATH, overwrite=True, atom_num=1e4,
+                      mesh_points=(64, 64), r_sizes=(8, 8),
+                      pop_frac=(0.5, 0.5))
+    ps.coupling_setup(kin_shift=True)
+    ps.imaginary(1/50, 200, 'cpu', progress=False)
+    return ps
+
+
+def shifted_momentum():
+    """Propagate a momentum-shifted state, whose norm is halved."""
+    ps = ground_state()
+    ps.shift_momentum(scale=1.0, frac=(0.5, 0.5))
+    # Before the split components reach the edge of the grid
+    n_steps = 40
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        res, _ = ps.real(1/500, n_steps, 'cpu', progress=False,
+                         health_action='abort', health_rate=10)
+    assert res.health['status'] == 'ok', res.health
+    assert not res.health['failures']
+    assert len(res.pops['vals']) == n_steps
+    print("Test `shifted_momentum` passed.")
+
+
+def failed_first_check():
+    """Abort, or warn and continue, when the first check fails."""
+    for action, status, n_done in [('abort', 'aborted', 0),
+                                   ('halve', 'aborted', 0),
+                                   ('warn', 'ok', N_STEPS)]:
+        ps = ground_state()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            # Any weight in the spectral tail fails the check
+            res, _ = ps.real(1/500, N_STEPS, 'cpu', progress=False,
+                             health_action=action, health_rate=10,
+                             health_tol={'tail': 0.0})
+        assert res.health['status'] == status, (action, res.health)
+        assert res.health['failures'][0]['step'] == 0
+        assert res.health['failures'][0]['checks'] == ['tail']
+        assert len(res.pops['vals']) == n_done, (action,
+                                                 len(res.pops['vals']))
+        assert len([w for w in caught
+                    if issubclass(w.category, RuntimeWarning)]) == 1
+    print("Test `failed_first_check` passed.")
+
+
+if __name__ == "__main__":
+    shifted_momentum()  # No false energy drift after `shift_momentum`
+    failed_first_check()  # The actions on a failed first check
@@ -0,0 +1,88 @@
+"""Test script for the observables evaluated during propagation.
+
+The observables should be evaluated every `obs_rate` time steps, with the
+shapes of the built-in observables, and the values of the initial
+wavefunction at the first step. Unknown built-in names, and unknown
+propagation options, should be refused.
+
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import observable_tools as otools  # noqa: E402
+from spinor_gpe.pspinor import pspinor as spin  # noqa: E402
+from spinor_gpe.pspinor import tensor_tools as ttools  # noqa: E402
+
+DATA_PATH = tempfile.mkdtemp()
+N_STEPS = 40
+OBS_RATE = 10
+
+
+def evaluated_observables():
+    """Evaluate built-in and custom observables during propagation."""
+    ps = spin.PSpinor(DATA_PATH, overwrite=True, atom_num=1e4,
+                      mesh_points=(64, 64), r_sizes=(8, 8),
+                      pop_frac=(0.6, 0.4))
+    ps.coupling_setup(kin_shift=True)
+    psi = [np.array(comp) for comp in ps.psi]
+    dens = ttools.density(psi)
+    pops = [np.sum(d) for d in ttools.density(ps.psik)]
+    x_mesh = np.broadcast_to(ps.space['x_mesh'], dens[0].shape)
+
+    observables = {'com': 'com', 'width': 'width', 'pol': 'polarization',
+                   'x2': lambda psi, psik, space: ttools.expect_val(
+                       psi, space['x_mesh']**2)[0]}
+    res, _ = ps.imaginary(1/50, N_STEPS, 'cpu', observables=observables,
+                          obs_rate=OBS_RATE, progress=False)
+    obs = res.observables
+
+    n_evals = N_STEPS // OBS_RATE
+    assert np.allclose(obs['times'], np.arange(n_evals) * OBS_RATE / 50)
+    assert obs['com'].shape == (n_evals, 2, 2)
+    assert obs['width'].shape == (n_evals, 2, 2)
+    assert obs['pol'].shape == (n_evals,)
+    assert obs['x2'].shape == (n_evals,)
+
+    # The first evaluation is of the initial wavefunction.
+    assert np.isclose(obs['pol'][0], (pops[0] - pops[1]) / sum(pops))
+    com_x = [np.sum(x_mesh * d) / np.sum(d) for d in dens]
+    assert np.allclose(obs['com'][0, :, 0], com_x, atol=1e-10)
+    x2_up = np.sum(x_mesh**2 * dens[0]) / np.sum(dens[0])
+    assert np.isclose(obs['x2'][0], x2_up)
+    assert np.allclose(obs['width'][0, 0, 0]**2, x2_up - com_x[0]**2)
+    print("Test `evaluated_observables` passed.")
+
+
+def unknown_observable():
+    """Refuse an unknown built-in observable."""
+    try:
+        otools.parse_observables(['no_such_observable'])
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("Accepted an unknown observable.")
+    print("Test `unknown_observable` passed.")
+
+
+def unknown_option():
+    """Refuse a misspelled propagation option."""
+    ps = spin.PSpinor(DATA_PATH, overwrite=True, atom_num=1e4,
+                      mesh_points=(64, 64), r_sizes=(8, 8))
+    try:
+        ps.imaginary(1/50, 1, 'cpu', obs_rte=OBS_RATE, progress=False)
+    except TypeError as error:
+        assert 'obs_rte' in str(error)
+    else:
+        raise AssertionError("Accepted an unknown option.")
+    print("Test `unknown_option` passed.")
+
+
+if __name__ == "__main__":
+    evaluated_observables()  # Rates, shapes and initial values
+    unknown_observable()  # Unknown built-in names
+    unknown_option()  # Misspelled propagation options
@@ -0,0 +1,81 @@
+"""Test script for saving and reloading propagation results.
+
+A `PropResult` reloaded with `PropResult.load` should hold the same
+wavefunction, populations, observables, energy and metadata as the saved
+one, whether its arrays are memory-mapped or read into memory. Results in a
+newer format should be refused.
+
+"""
+# pylint: disable=wrong-import-position
+import json
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import pspinor as spin  # noqa: E402
+from spinor_gpe.pspinor.prop_result import PropResult  # noqa: E402
+
+DATA_PATH = tempfile.mkdtemp()
+
+
+def propagate():
+    """Propagate a small coupled state, with observables and sampling."""
+    ps = spin.PSpinor(DATA_PATH, overwrite=True, atom_num=1e4,
+                      mesh_points=(64, 64), r_sizes=(8, 8),
+                      pop_frac=(0.6, 0.4))
+    ps.coupling_setup(kin_shift=True)
+    res, _ = ps.imaginary(1/50, 40, 'cpu', is_sampling=True, n_samples=4,
+                          observables=['com', 'width'], obs_rate=10,
+                          health_action='warn',
+                          health_tol={'edge': 1.0, 'tail': 1.0},
+                          progress=False)
+    return res
+
+
+def round_trip(res):
+    """Reload a saved result, memory-mapped and in memory."""
+    path = res.save(os.path.join(DATA_PATH, 'saved'))
+    for mmap in [True, False]:
+        loaded = PropResult.load(path, mmap=mmap)
+        assert np.array_equal(np.array(loaded.psik), np.array(res.psik))
+        assert np.allclose(np.array(loaded.psi), np.array(res.psi))
+        assert np.allclose(loaded.dens, res.dens)
+        assert np.allclose(loaded.eng_final, res.eng_final)
+        for key, val in res.pops.items():
+            assert np.array_equal(loaded.pops[key], val)
+        assert set(loaded.observables) == set(res.observables)
+        for key, val in res.observables.items():
+            assert np.array_equal(loaded.observables[key], val)
+        assert loaded.sampled_path == os.path.abspath(res.sampled_path)
+        assert loaded.health['status'] == res.health['status']
+        assert loaded.metrics['n_steps'] == res.metrics['n_steps']
+        assert loaded.paths == res.paths
+        assert np.allclose(loaded.space['x_mesh'], res.space['x_mesh'])
+        assert np.allclose(loaded.space['ky_mesh'], res.space['ky_mesh'])
+    print("Test `round_trip` passed.")
+
+
+def newer_format(res):
+    """Refuse to load a result saved in a newer format."""
+    path = res.save(os.path.join(DATA_PATH, 'newer'))
+    with open(os.path.join(path, 'meta.json')) as file:
+        meta = json.load(file)
+    meta['format'] += 1
+    with open(os.path.join(path, 'meta.json'), 'w') as file:
+        json.dump(meta, file)
+    try:
+        PropResult.load(path)
+    except ValueError as error:
+        assert 'newer' in str(error)
+    else:
+        raise AssertionError("Loaded a result in a newer format.")
+    print("Test `newer_format` passed.")
+
+
+if __name__ == "__main__":
+    RESULT = propagate()
+    round_trip(RESULT)  # Reloading the saved arrays and metadata
+    newer_format(RESULT)  # Refusing unknown formats
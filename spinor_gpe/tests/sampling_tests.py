@@ -0,0 +1,91 @@
+"""Test script for event-driven adaptive sampling.
+
+A converged ground state is stationary in real time, so that it should only
+be sampled at the first step and every `sample_max_interval` steps. A state
+whose momentum components are split by `shift_momentum` oscillates, and
+should be sampled whenever its density has changed by the threshold, as
+checked every `sample_check_rate` steps.
+
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import pspinor as spin  # noqa: E402
+
+DATA_PATH = tempfile.mkdtemp()
+N_STEPS = 100
+MAX_INTERVAL = 60
+
+
+def ground_state():
+    """Converge a small coupled ground state."""
+    ps = spin.PSpinor(DATA_PATH, overwrite=True, atom_num=1e4,
+                      mesh_points=(64, 64), r_sizes=(8, 8),
+                      pop_frac=(0.5, 0.5))
+    ps.coupling_setup(kin_shift=True)
+    ps.imaginary(1/50, 500, 'cpu', progress=False)
+    return ps
+
+
+def stationary_state():
+    """Sample a stationary state only at step 0 and at `max_interval`."""
+    ps = ground_state()
+    res, _ = ps.real(1/500, N_STEPS, 'cpu', is_sampling=True,
+                     n_samples=N_STEPS, progress=False, sample_threshold=1e-2,
+                     sample_max_interval=MAX_INTERVAL)
+    with np.load(res.sampled_path) as archive:
+        steps = archive['steps']
+        assert len(archive['psiks']) == len(steps)
+    assert list(steps) == [0, MAX_INTERVAL], (
+        f"Sampled the stationary state at steps {list(steps)}.")
+    print("Test `stationary_state` passed.")
+
+
+def changing_state():
+    """Sample an oscillating state whenever its density changes."""
+    ps = ground_state()
+    ps.shift_momentum(scale=0.03, frac=(0.5, 0.5))
+    threshold = 0.01
+    res, _ = ps.real(1/500, N_STEPS, 'cpu', is_sampling=True,
+                     n_samples=N_STEPS, progress=False,
+                     sample_threshold=threshold)
+    with np.load(res.sampled_path) as archive:
+        steps, psiks = archive['steps'], archive['psiks']
+    assert 2 < len(steps) < N_STEPS, f"Took {len(steps)} samples."
+    assert steps[0] == 0 and np.all(np.diff(steps) > 0)
+
+    # Consecutive samples differ by about the threshold, after the first
+    # step renormalizes the shifted wavefunction.
+    dens = [np.abs(np.fft.ifftn(np.fft.ifftshift(psik, axes=(-2, -1)),
+                                axes=(-2, -1)))**2 for psik in psiks]
+    changes = [np.linalg.norm(new - old) / np.linalg.norm(old)
+               for old, new in zip(dens[1:-1], dens[2:])]
+    assert min(changes) >= threshold * 0.99, f"Changes {changes}."
+    assert max(changes) < threshold * 3, f"Changes {changes}."
+    print("Test `changing_state` passed.")
+
+
+def check_rate():
+    """Evaluate the change metric only every `sample_check_rate` steps."""
+    ps = ground_state()
+    ps.shift_momentum(scale=0.03, frac=(0.5, 0.5))
+    res, _ = ps.real(1/500, N_STEPS, 'cpu', is_sampling=True,
+                     n_samples=N_STEPS, progress=False, sample_threshold=0.01,
+                     sample_min_interval=2, sample_check_rate=5)
+    with np.load(res.sampled_path) as archive:
+        steps = archive['steps']
+    assert len(steps) > 2, f"Took {len(steps)} samples."
+    assert np.all((np.diff(steps) - 2) % 5 == 0), (
+        f"Sampled at steps {list(steps)}.")
+    print("Test `check_rate` passed.")
+
+
+if __name__ == "__main__":
+    stationary_state()  # No samples triggered by a stationary state
+    changing_state()  # Samples triggered by the changing density
+    check_rate()  # The metric evaluated every `sample_check_rate` steps
@@ -0,0 +1,110 @@
+"""Test script for separable grids and quasi-1D propagation.
+
+Propagating with the separable energy, coupling and detuning grids should
+give the same wavefunction, to round-off, as propagating with the same
+grids materialized in full, in 2D and in the quasi-1D mode. The separable
+grids should also stand in for the full arrays in array code.
+
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import pspinor as spin  # noqa: E402
+from spinor_gpe.pspinor import separable_tools as sptools  # noqa: E402
+
+DATA_PATH = tempfile.mkdtemp()
+
+
+def setup(mesh_points, r_sizes, is_dense):
+    """Create a coupled `PSpinor`, with separable or full grids."""
+    ps = spin.PSpinor(DATA_PATH, overwrite=True, atom_num=1e4,
+                      mesh_points=mesh_points, r_sizes=r_sizes,
+                      pop_frac=(0.6, 0.4))
+    ps.coupling_setup(kin_shift=True)
+    ps.coupling_grad(2.0, 10.0, axis=len(mesh_points) - 1)
+    ps.detuning_grad(1.0, 0.5, axis=len(mesh_points) - 1)
+    assert isinstance(ps.pot_eng, sptools.SepSum)
+    assert isinstance(ps.coupling, sptools.SepSum)
+    if is_dense:
+        detuning = sptools.materialize(ps.detuning)
+        ps.pot_eng = sptools.materialize(ps.pot_eng)
+        ps.detuning = detuning
+        ps.kin_eng_spin = [sptools.materialize(k) for k in ps.kin_eng_spin]
+        ps.coupling = sptools.materialize(ps.coupling)
+    return ps
+
+
+def is_close(sep, dense):
+    """Compare two wavefunctions to round-off, relative to their peak."""
+    sep, dense = np.array(sep), np.array(dense)
+    return np.max(np.abs(sep - dense)) < 1e-9 * np.max(np.abs(dense))
+
+
+def propagate(mesh_points, r_sizes, is_dense, t_step):
+    """Propagate in imaginary, then in real time."""
+    ps = setup(mesh_points, r_sizes, is_dense)
+    ps.imaginary(t_step, 50, 'cpu', progress=False)
+    res, _ = ps.real(t_step / 10, 50, 'cpu', progress=False)
+    return res
+
+
+def separable_vs_dense():
+    """Compare separable and full 2D grids."""
+    sep = propagate((64, 64), (8, 8), False, 1/50)
+    dense = propagate((64, 64), (8, 8), True, 1/50)
+    assert is_close(sep.psik, dense.psik)
+    assert np.allclose(sep.eng_final, dense.eng_final)
+    print("Test `separable_vs_dense` passed.")
+
+
+def quasi_1d():
+    """Compare separable and full quasi-1D grids."""
+    # The stronger quasi-1D interactions need a shorter time step.
+    sep = propagate((256,), (16,), False, 1/500)
+    dense = propagate((256,), (16,), True, 1/500)
+    assert np.shape(sep.psik) == (2, 256)
+    assert is_close(sep.psik, dense.psik)
+    assert np.allclose(sep.eng_final, dense.eng_final)
+
+    # Imaginary time converges to a ground state of the 1D trap.
+    ps = setup((256,), (16,), False)
+    res, _ = ps.imaginary(1/500, 400, 'cpu', progress=False)
+    assert np.all(np.isfinite(res.psik))
+    assert np.isclose(res.pops['vals'][-1].sum(), ps.atom_num)
+    assert res.dens[0][0] < 1e-6 * res.dens[0].max()
+    print("Test `quasi_1d` passed.")
+
+
+def array_stand_in():
+    """Use the separable grids in place of the full arrays."""
+    ps = setup((64, 64), (8, 8), False)
+    for grid in [ps.pot_eng, ps.kin_eng, ps.coupling, ps.detuning]:
+        assert isinstance(grid, sptools.SepSum)
+        full = np.asarray(grid)
+        copied = grid.copy()
+        assert isinstance(copied, np.ndarray)
+        assert np.array_equal(copied, full)
+        assert np.isclose(grid.sum(), full.sum())
+        assert np.isclose(grid.mean(), full.mean())
+        assert np.array_equal(grid.real, full.real)
+        assert np.array_equal(grid.T, full.T)
+        assert grid.reshape(-1).shape == (full.size,)
+        assert grid.astype(np.float32).dtype == np.float32
+        assert grid.size == full.size
+        assert np.array_equal(grid > 1, full > 1)
+        assert np.array_equal(grid <= full, np.ones(full.shape, bool))
+        assert np.array_equal(np.where(grid > 1, 1, grid),
+                              np.where(full > 1, 1, full))
+        assert np.array_equal(abs(grid), abs(full))
+    print("Test `array_stand_in` passed.")
+
+
+if __name__ == "__main__":
+    separable_vs_dense()  # Separable and full 2D grids
+    quasi_1d()  # Separable and full quasi-1D grids
+    array_stand_in()  # Array attributes, methods and comparisons
@@ -0,0 +1,87 @@
+"""Test script for streaming propagation.
+
+A stream that is read, stopped, or resumed should leave the `PSpinor` with
+exactly the wavefunction of an uninterrupted propagation of the same number
+of time steps.
+
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import pspinor as spin  # noqa: E402
+
+DATA_PATH = tempfile.mkdtemp()
+N_STEPS = 30
+T_STEP = 1/500
+
+
+def ground_state():
+    """Converge a small coupled ground state."""
+    ps = spin.PSpinor(DATA_PATH, overwrite=True, atom_num=1e4,
+                      mesh_points=(64, 64), r_sizes=(8, 8),
+                      pop_frac=(0.6, 0.4))
+    ps.coupling_setup(kin_shift=True)
+    ps.imaginary(1/50, 20, 'cpu', progress=False)
+    return ps
+
+
+def reference():
+    """Propagate `N_STEPS` time steps without streaming."""
+    res, _ = ground_state().real(T_STEP, N_STEPS, 'cpu', progress=False)
+    return np.array(res.psik)
+
+
+def views(psik_ref):
+    """Yield views at every `every` steps, and at the last step."""
+    ps = ground_state()
+    stream = list(ps.stream_real(T_STEP, N_STEPS, every=7,
+                                 observables=['com']))
+    assert [view.step for view in stream] == [7, 14, 21, 28, 30]
+    assert np.isclose(stream[-1].time, N_STEPS * T_STEP)
+    state = stream[-1].to_numpy()
+    assert set(state) == {'step', 'time', 'psik', 'pops', 'com'}
+    assert np.array_equal(state['psik'], psik_ref)
+    assert np.array_equal(np.array(ps.psik), psik_ref)
+    print("Test `views` passed.")
+
+
+def read_then_finish(psik_ref):
+    """Read the wavefunction within the loop, then finish the stream."""
+    ps = ground_state()
+    for view in ps.stream_real(T_STEP, N_STEPS, every=5):
+        if view.step == 10:
+            assert np.array_equal(np.array(ps.psik),
+                                  view.to_numpy()['psik'])
+    assert np.array_equal(np.array(ps.psik), psik_ref), (
+        "The wavefunction is stale after the stream.")
+    print("Test `read_then_finish` passed.")
+
+
+def break_then_resume(psik_ref):
+    """Stop an endless stream, and resume with a propagation or a stream."""
+    ps = ground_state()
+    for view in ps.stream_real(T_STEP, every=4):
+        if view.step >= 12:
+            break
+    res, _ = ps.real(T_STEP, N_STEPS - 12, 'cpu', progress=False)
+    assert np.array_equal(np.array(res.psik), psik_ref)
+
+    ps = ground_state()
+    for view in ps.stream_real(T_STEP, 10):
+        pass
+    for view in ps.stream_real(T_STEP, N_STEPS - 10, every=5):
+        pass
+    assert np.array_equal(np.array(ps.psik), psik_ref)
+    print("Test `break_then_resume` passed.")
+
+
+if __name__ == "__main__":
+    PSIK_REF = reference()
+    views(PSIK_REF)  # The steps and contents of the views
+    read_then_finish(PSIK_REF)  # Reading `psik` within the loop
+    break_then_resume(PSIK_REF)  # Continuing from a stopped stream
@@ -0,0 +1,67 @@
+"""Test script for vortex detection and tracking.
+
+A synthetic vortex-antivortex pair approaches and annihilates. The detected
+vortices should be linked into two tracks of opposite winding, which both
+terminate in the same frame.
+
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import tensor_tools as ttools  # noqa: E402
+from spinor_gpe.pspinor.vortex_tools import VortexTracker  # noqa: E402
+
+N_FRAMES = 10
+X_LIN = np.linspace(-8, 8, 128, endpoint=False)
+X_MESH, Y_MESH = np.meshgrid(X_LIN, X_LIN)
+DELTA_R = np.array([X_LIN[1] - X_LIN[0]] * 2)
+
+
+def vortex_pair(sep, y_pos=1.03):
+    """Gaussian wavefunction with a vortex pair separated by 2 * `sep`."""
+    psi = np.exp(-(X_MESH**2 + Y_MESH**2) / 30).astype(complex)
+    if sep > 0.3:
+        for x_pos, wind in [(-sep, 1), (sep, -1)]:
+            dist = np.hypot(X_MESH - x_pos, Y_MESH - y_pos)
+            psi *= (dist / np.sqrt(dist**2 + 0.3)
+                    * np.exp(1j * wind * np.arctan2(Y_MESH - y_pos,
+                                                    X_MESH - x_pos)))
+    return psi
+
+
+def find_pair():
+    """Detect both vortices of a pair at the correct positions."""
+    pos, wind = ttools.find_vortices(vortex_pair(2.0), DELTA_R,
+                                     (X_LIN[0], X_LIN[0]))
+    assert len(wind) == 2, f"Found {len(wind)} vortices, expected 2."
+    assert sorted(wind) == [-1, 1]
+    assert np.all(np.abs(np.abs(pos[:, 0]) - 2.0) < DELTA_R[0])
+    assert np.all(np.abs(pos[:, 1] - 1.03) < DELTA_R[1])
+    print("Test `find_pair` passed.")
+
+
+def track_annihilation():
+    """Track an approaching pair through its annihilation."""
+    tracker = VortexTracker(max_dist=1.0)
+    for frame in range(N_FRAMES):
+        psi = vortex_pair(3 - 0.35 * frame)
+        tracker.update(*ttools.find_vortices(psi, DELTA_R,
+                                             (X_LIN[0], X_LIN[0])))
+    tracks = tracker.result()
+
+    assert tracker.n_tracks == 2, f"Created {tracker.n_tracks} tracks."
+    assert sorted(tracks['winding']) == [-1, 1]
+    assert np.all(tracks['start'] == 0)
+    assert np.all(tracks['stop'] == 8)
+    assert np.all(tracks['event_kind'] == -1)
+    assert len(tracks['frame']) == 16
+    print("Test `track_annihilation` passed.")
+
+
+if __name__ == "__main__":
+    find_pair()  # Detection of a single vortex-antivortex pair
+    track_annihilation()  # Linking of the pair across frames